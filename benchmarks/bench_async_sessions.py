@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from benchmarks.common import FakeChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+
+
+async def run_session(waiter: OpenWaiterAI, turns: int, latencies: list):
+    for _ in range(turns):
+        start_time = time.perf_counter()
+        async for _ in waiter.ainvoke("I'd like the House Burger, please."):
+            pass
+        latencies.append(time.perf_counter() - start_time)
+
+
+async def run_level(waiters, turns: int):
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(run_session(waiter, turns, latencies) for waiter in waiters))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return wall, cpu, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Concurrent OpenWaiterAI sessions on one event loop with a stubbed LLM."
+    )
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="LLM latency in seconds")
+    parser.add_argument(
+        "--think-time", type=float, default=10.0, help="Seconds between guest messages"
+    )
+    args = parser.parse_args()
+
+    engine = create_seeded_engine()
+    model = FakeChatModel(latency=args.latency)
+
+    print(
+        f"{'sessions':>8} {'wall s':>8} {'turns/s':>8} {'p50 ms':>8} "
+        f"{'p99 ms':>8} {'cpu ms/turn':>11} {'sessions/core':>13}"
+    )
+    for level in args.sessions:
+        waiters = [
+            OpenWaiterAI(
+                model_name="fake",
+                system_instructions=SYSTEM_INSTRUCTIONS,
+                engine=engine,
+                model=model,
+            )
+            for _ in range(level)
+        ]
+        wall, cpu, latencies = asyncio.run(run_level(waiters, args.turns))
+        latencies.sort()
+        turns = len(latencies)
+        cpu_per_turn = cpu / turns
+        # Sessions one core can keep busy if every guest speaks once per think time
+        sessions_per_core = args.think_time / cpu_per_turn if cpu_per_turn else 0.0
+        print(
+            f"{level:>8} {wall:>8.2f} {turns / wall:>8.1f} "
+            f"{statistics.median(latencies) * 1000:>8.1f} "
+            f"{latencies[int(0.99 * (turns - 1))] * 1000:>8.1f} "
+            f"{cpu_per_turn * 1000:>11.2f} {sessions_per_core:>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
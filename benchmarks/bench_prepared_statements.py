@@ -0,0 +1,99 @@
+import os
+import sys
+import ast
+import time
+import argparse
+
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine, text
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.Database import execute_query
+from openwaiterai.Tools.QuestionCoalescer import GET_ANSWER, SUBMIT_QUESTION
+from benchmarks.common import create_seeded_engine
+
+QUESTION = "Is the patio dog-friendly? We'd like to sit outside."
+
+
+def create_queries_table(engine):
+    id_column = "SERIAL PRIMARY KEY" if engine.dialect.name == "postgresql" else "INTEGER PRIMARY KEY"
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS CustomerManagementQueries (id {id_column}, "
+                "question_text TEXT, answer_text TEXT)"
+            )
+        )
+
+
+def string_path(database: SQLDatabase):
+    # The previous path: f-string SQL, SQLDatabase.run and literal_eval
+    safe_question = QUESTION.replace("'", "''")
+    inserted = ast.literal_eval(
+        database.run(
+            f"INSERT INTO CustomerManagementQueries (question_text) "
+            f"VALUES ('{safe_question}') RETURNING id;"
+        )
+    )[0][0]
+    answer = database.run(
+        f"SELECT answer_text FROM CustomerManagementQueries WHERE id = {inserted};"
+    )
+    return ast.literal_eval(answer)[0][0] if answer else None
+
+
+def bound_path(engine):
+    inserted = execute_query(
+        engine, SUBMIT_QUESTION.sql, {"question_text": QUESTION}
+    ).scalar()
+    return execute_query(engine, GET_ANSWER.sql, {"id": inserted}).scalar()
+
+
+def prepared_path(engine):
+    inserted = SUBMIT_QUESTION.execute(engine, {"question_text": QUESTION}).scalar()
+    return GET_ANSWER.execute(engine, {"id": inserted}).scalar()
+
+
+def measure(function, repeat: int):
+    latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-call latency of the CustomerQueryTool statements: f-string + "
+        "SQLDatabase.run, bound parameters and server-side prepared statements."
+    )
+    parser.add_argument(
+        "--dsn",
+        default=None,
+        help="Scratch database to benchmark on (questions are inserted), "
+        "defaults to an in-memory SQLite database",
+    )
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = create_engine(args.dsn) if args.dsn else create_seeded_engine()
+    create_queries_table(engine)
+    database = SQLDatabase(engine, lazy_table_reflection=True)
+
+    print(f"{engine.dialect.name}+{engine.dialect.driver}, {args.repeat} submit + fetch calls")
+    print(f"{'path':<12} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, function in [
+        ("string", lambda: string_path(database)),
+        ("bound", lambda: bound_path(engine)),
+        ("prepared", lambda: prepared_path(engine)),
+    ]:
+        function()  # Warm up the pool and prepare the statements
+        p50, p95 = measure(function, args.repeat)
+        print(f"{name:<12} {p50:>8.3f} {p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
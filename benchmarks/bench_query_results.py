@@ -0,0 +1,117 @@
+import os
+import sys
+import ast
+import time
+import argparse
+
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine, text
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.Database import execute_query
+from benchmarks.common import create_seeded_engine
+
+QUERY = (
+    "SELECT n.id, n.menu_item_id, n.calories, n.protein, n.fats, n.salt "
+    "FROM nutritionalvalues n ORDER BY n.id"
+)
+
+
+def seed_nutritional_values(engine, rows: int):
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS nutritionalvalues"))
+        connection.execute(
+            text(
+                "CREATE TABLE nutritionalvalues (id INT PRIMARY KEY, menu_item_id INT, "
+                "calories NUMERIC(6,2), protein NUMERIC(6,2), fats NUMERIC(6,2), "
+                "salt NUMERIC(6,2))"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO nutritionalvalues VALUES "
+                "(:id, :menu_item_id, :calories, :protein, :fats, :salt)"
+            ),
+            [
+                {
+                    "id": index,
+                    "menu_item_id": index % 50,
+                    "calories": "512.25",
+                    "protein": "21.50",
+                    "fats": "18.75",
+                    "salt": "1.20",
+                }
+                for index in range(rows)
+            ],
+        )
+
+
+def run_string_path(database: SQLDatabase):
+    # The previous path: stringify the rows, then parse them back
+    rows_string = database.run(QUERY)
+    try:
+        rows = ast.literal_eval(rows_string)
+    except (SyntaxError, ValueError):
+        return None
+    return rows
+
+
+def run_structured_path(engine, max_rows: int):
+    result = execute_query(engine, QUERY)
+    result.to_markdown(max_rows=max_rows)
+    return result.rows
+
+
+def measure(function, repeat: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start_time) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Structured query results compared with SQLDatabase.run + literal_eval."
+    )
+    parser.add_argument(
+        "--dsn",
+        default=None,
+        help="Database to benchmark on, defaults to a seeded in-memory SQLite database",
+    )
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--max-rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(args.dsn) if args.dsn else create_seeded_engine()
+    seed_nutritional_values(engine, args.rows)
+    database = SQLDatabase(engine, lazy_table_reflection=True)
+
+    parsed = run_string_path(database)
+    if parsed is None:
+        print("string path: literal_eval failed to parse the NUMERIC columns")
+    else:
+        print(
+            f"string path:     {measure(lambda: run_string_path(database), args.repeat):8.2f} ms"
+        )
+    print(
+        f"structured path: "
+        f"{measure(lambda: run_structured_path(engine, args.max_rows), args.repeat):8.2f} ms"
+    )
+
+    # What the model sees from the SQLQueryTool
+    structured = execute_query(engine, QUERY, max_rows=args.max_rows)
+    print(
+        f"capped fetch:    "
+        f"{measure(lambda: execute_query(engine, QUERY, max_rows=args.max_rows), args.repeat):8.2f} ms"
+    )
+    print(
+        f"rendered bytes:  {len(structured.to_markdown(max_rows=args.max_rows).encode('utf-8'))} "
+        f"(string path {len(database.run(QUERY).encode('utf-8'))})"
+    )
+
+
+if __name__ == "__main__":
+    main()
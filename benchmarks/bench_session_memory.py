@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.SessionManager import SessionManager
+from benchmarks.common import FakeChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Memory of one OpenWaiterAI instance serving many simulated sessions."
+    )
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--max-sessions", type=int, default=500)
+    parser.add_argument("--report-every", type=int, default=1000)
+    args = parser.parse_args()
+
+    waiter = OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=FakeChatModel(latency=0),
+    )
+    waiter.sessions = SessionManager(
+        history_factory=waiter._create_session_history,
+        max_sessions=args.max_sessions,
+    )
+    waiter.set_order_slip_tool.session_manager = waiter.sessions
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+
+    print(f"{'sessions':>8} {'live':>6} {'evicted':>8} {'traced MB':>10} {'turns/s':>8}")
+    for index in range(1, args.sessions + 1):
+        session_id = f"table-{index}"
+        for _ in range(args.turns):
+            for _ in waiter.invoke("I'd like the House Burger, please.", session_id=session_id):
+                pass
+
+        if index % args.report_every == 0:
+            current = tracemalloc.get_traced_memory()[0] - baseline
+            stats = waiter.sessions.stats()
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"{index:>8} {stats['sessions']:>6} {stats['evictions']:>8} "
+                f"{current / 1024 / 1024:>10.1f} {index * args.turns / elapsed:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
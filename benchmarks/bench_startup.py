@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+from statistics import median
+from typing import Dict, List
+
+# Dynamically add the project root directory to sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Every sample runs in a fresh interpreter, so nothing is imported or cached yet
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+import openwaiterai
+metrics = {"import_package_ms": (time.perf_counter() - start) * 1000}
+if sys.argv[1] != "package":
+    from openwaiterai import OpenWaiterAI
+    metrics["import_class_ms"] = (time.perf_counter() - start) * 1000
+if sys.argv[1] == "construct":
+    from benchmarks.common import ScriptedChatModel, create_seeded_engine
+    from benchmarks.bench_turns import QueryCounter
+
+    engine = create_seeded_engine()
+    counter = QueryCounter(engine)
+    start = time.perf_counter()
+    waiter = OpenWaiterAI(
+        model_name="fake",
+        system_instructions=sys.argv[2],
+        engine=engine,
+        model=ScriptedChatModel(latency=0),
+        context_snapshot=sys.argv[3] or None,
+    )
+    metrics["construct_ms"] = (time.perf_counter() - start) * 1000
+    metrics["startup_queries"] = counter.count
+    waiter.system_message
+    metrics["first_prompt_ms"] = (time.perf_counter() - start) * 1000
+metrics["modules"] = len(sys.modules)
+metrics["openai_imported"] = "openai" in sys.modules
+print(json.dumps(metrics))
+"""
+
+
+def sample(stage: str, snapshot: str = "") -> Dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, stage, os.path.join(ROOT, "system_instructions.txt"), snapshot],
+        cwd=ROOT,
+        env={
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])),
+            "OPENWAITERAI_ORDER_BACKEND": "database",
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def write_snapshot(path: str):
+    from openwaiterai import OpenWaiterAI
+    from benchmarks.common import ScriptedChatModel, create_seeded_engine
+
+    waiter = OpenWaiterAI(
+        model_name="fake",
+        system_instructions=os.path.join(ROOT, "system_instructions.txt"),
+        engine=create_seeded_engine(),
+        model=ScriptedChatModel(latency=0),
+    )
+    waiter.save_context_snapshot(path)
+
+
+def summarize(samples: List[Dict]) -> Dict:
+    # Medians of the timings, the counts are the same in every sample
+    return {
+        key: median(item[key] for item in samples) if key.endswith("_ms") else samples[0][key]
+        for key in samples[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import time and cold start of OpenWaiterAI, each sample in a fresh "
+        "interpreter, with and without a context snapshot."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per stage")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, "context.snapshot")
+        write_snapshot(snapshot)
+        stages = {
+            "import package": ("package", ""),
+            "import class": ("class", ""),
+            "cold start": ("construct", ""),
+            "cold start, snapshot": ("construct", snapshot),
+        }
+        results = {
+            name: summarize([sample(stage, path) for _ in range(args.repeat)])
+            for name, (stage, path) in stages.items()
+        }
+
+    print(
+        f"{'stage':<22} {'import ms':>9} {'init ms':>8} {'prompt ms':>9} "
+        f"{'init q':>6} {'modules':>7} {'openai':>6}"
+    )
+    for name, result in results.items():
+        import_ms = result.get("import_class_ms", result["import_package_ms"])
+        print(
+            f"{name:<22} {import_ms:>9.1f} {result.get('construct_ms', 0):>8.1f} "
+            f"{result.get('first_prompt_ms', 0):>9.1f} {result.get('startup_queries', 0):>6} "
+            f"{result['modules']:>7} {'yes' if result['openai_imported'] else 'no':>6}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+from langchain_core.messages import AIMessage
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from benchmarks.common import FakeChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+
+
+def measure_turn(messages):
+    # Time until the first text the guest can read, and until the turn is done
+    start_time = time.perf_counter()
+    first_text = None
+    for message in messages:
+        if first_text is None and isinstance(message, AIMessage) and message.content:
+            first_text = time.perf_counter() - start_time
+    return first_text, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time to first token of OpenWaiterAI.invoke and OpenWaiterAI.stream "
+        "with a stubbed streaming LLM."
+    )
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds until the first chunk")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds per chunk")
+    args = parser.parse_args()
+
+    waiter = OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=FakeChatModel(latency=args.latency, token_latency=args.token_latency),
+    )
+
+    print(f"{'mode':<8} {'ttft p50 ms':>12} {'turn p50 ms':>12}")
+    for mode in ("invoke", "stream"):
+        first_texts, totals = [], []
+        for turn in range(args.turns):
+            prompt = "I'd like the House Burger, please."
+            session_id = f"{mode}-{turn}"
+            if mode == "invoke":
+                first_text, total = measure_turn(waiter.invoke(prompt, session_id=session_id))
+            else:
+                first_text, total = measure_turn(waiter.stream(prompt, session_id=session_id))
+            first_texts.append(first_text)
+            totals.append(total)
+        print(
+            f"{mode:<8} {statistics.median(first_texts) * 1000:>12.1f} "
+            f"{statistics.median(totals) * 1000:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
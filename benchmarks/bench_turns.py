@@ -0,0 +1,215 @@
+import os
+import gc
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from sqlalchemy import event
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.Tracing import get_tracer
+from benchmarks.common import DINNER_SCRIPT, ScriptedChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+# The async paths need an async driver for the same database, which an in-memory
+# SQLite database cannot share, so sessions run on threads
+MODES = ("invoke", "stream")
+
+# Metrics compared with a baseline, and whether higher values are better
+COMPARED_METRICS = {
+    "turns_per_sec": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "db_queries_per_turn": False,
+    "kb_per_session": False,
+}
+
+
+class QueryCounter:
+    """
+    Counts the statements an engine sends to the database.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(quantile * len(ordered)) - 1, 0)]
+
+
+def create_waiter(args) -> OpenWaiterAI:
+    return OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=ScriptedChatModel(latency=args.latency, token_latency=args.token_latency),
+    )
+
+
+def prompts(turns: int) -> List[str]:
+    return [DINNER_SCRIPT[turn % len(DINNER_SCRIPT)].prompt for turn in range(turns)]
+
+
+def run_session(waiter: OpenWaiterAI, session_id: str, mode: str, turns: int) -> List[float]:
+    latencies = []
+    run = waiter.invoke if mode == "invoke" else waiter.stream
+    for prompt in prompts(turns):
+        start_time = time.perf_counter()
+        for _ in run(prompt, session_id=session_id):
+            pass
+        latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+
+def run_sessions(waiter: OpenWaiterAI, sessions: int, mode: str, turns: int) -> List[float]:
+    """
+    Run ``sessions`` concurrent guest conversations of ``turns`` messages
+    each and return the latency of every turn.
+    """
+    session_ids = [f"table-{index}" for index in range(sessions)]
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        results = list(
+            executor.map(
+                lambda session_id: run_session(waiter, session_id, mode, turns), session_ids
+            )
+        )
+    return [latency for latencies in results for latency in latencies]
+
+
+def measure_level(args, sessions: int) -> Dict:
+    """
+    Measure throughput, latency and database queries of ``sessions``
+    concurrent sessions, then their memory in a second, traced run.
+    """
+    get_tracer().reset()
+    waiter = create_waiter(args)
+    counter = QueryCounter(waiter.engine)
+
+    # Warm up the caches that every process builds once
+    for _ in waiter.invoke(DINNER_SCRIPT[-1].prompt, session_id="warmup"):
+        pass
+    waiter.sessions.evict("warmup")
+    counter.count = 0
+
+    start_time = time.perf_counter()
+    latencies = run_sessions(waiter, sessions, args.mode, args.turns)
+    wall = time.perf_counter() - start_time
+
+    result = {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "turns_per_sec": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "db_queries_per_turn": counter.count / len(latencies),
+        "components": waiter.get_trace_stats(),
+    }
+    if args.memory:
+        result["kb_per_session"] = measure_memory(args, sessions) / 1024
+    return result
+
+
+def measure_memory(args, sessions: int) -> float:
+    # The bytes every live session adds to a warmed-up instance
+    waiter = create_waiter(args)
+    for _ in waiter.invoke(DINNER_SCRIPT[-1].prompt, session_id="warmup"):
+        pass
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    run_sessions(waiter, sessions, args.mode, args.turns)
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (current - baseline) / sessions
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """
+    Return the metrics that are worse than the baseline by more than
+    ``tolerance`` (a fraction).
+    """
+    regressions = []
+    baseline_levels = {level["sessions"]: level for level in baseline}
+    for level in results:
+        previous = baseline_levels.get(level["sessions"])
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in level or not previous.get(metric):
+                continue
+            change = (level[metric] - previous[metric]) / previous[metric]
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(
+                    f"{metric} at {level['sessions']} sessions: "
+                    f"{previous[metric]:.2f} -> {level[metric]:.2f} ({change:+.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="End-to-end OpenWaiterAI turns with a scripted LLM that calls tools "
+        "and an in-memory SQLite restaurant database."
+    )
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--turns", type=int, default=len(DINNER_SCRIPT), help="Messages per guest")
+    parser.add_argument("--mode", choices=MODES, default="invoke")
+    parser.add_argument("--latency", type=float, default=0.05, help="LLM latency in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per chunk")
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Fail on regressions against these results")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(
+        f"{'sessions':>8} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'db q/turn':>9} {'KB/session':>10}"
+    )
+    results = []
+    for sessions in args.sessions:
+        result = measure_level(args, sessions)
+        results.append(result)
+        print(
+            f"{sessions:>8} {result['turns_per_sec']:>8.1f} {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+            f"{result['db_queries_per_turn']:>9.2f} {result.get('kb_per_session', 0):>10.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"mode": args.mode, "latency": args.latency, "levels": results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file)["levels"], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
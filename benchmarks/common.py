@@ -0,0 +1,296 @@
+import json
+import time
+import uuid
+import asyncio
+from typing import Dict, List, NamedTuple, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+from openwaiterai.Tools.SQLQueryTool import SCHEMA_SQL
+
+SEED_SQL = [
+    "INSERT INTO restaurantinfo (category, description) VALUES "
+    "('summary', 'A cosy bistro serving seasonal dishes.'), "
+    "('opening hours', 'Every day from 12:00 to 23:00.'), "
+    "('parking', 'Free parking behind the building.')",
+    "INSERT INTO categories (id, name, description) VALUES "
+    "(1, 'Starters', ''), (2, 'Mains', ''), (3, 'Desserts', '')",
+    "INSERT INTO menuitems (id, category_id, name, description) VALUES "
+    "(1, 1, 'Tomato Soup', ''), (2, 1, 'Caesar Salad', ''), "
+    "(3, 2, 'House Burger', ''), (4, 2, 'Mushroom Risotto', ''), "
+    "(5, 3, 'Cheesecake', ''), (6, 2, 'Grilled Salmon', '')",
+    "INSERT INTO allergens (id, name) VALUES (1, 'Gluten'), (2, 'Milk'), (3, 'Egg'), (4, 'Fish')",
+    "INSERT INTO ingredients (id, name) VALUES "
+    "(1, 'Tomato'), (2, 'Romaine'), (3, 'Parmesan cheese'), (4, 'Beef'), (5, 'Bun'), "
+    "(6, 'Mushroom'), (7, 'Rice'), (8, 'Cream cheese'), (9, 'Salmon'), (10, 'Lemon')",
+    "INSERT INTO menuitemallergens (menu_item_id, allergen_id) VALUES "
+    "(2, 2), (2, 3), (3, 1), (3, 2), (4, 2), (5, 1), (5, 2), (5, 3), (6, 4)",
+    "INSERT INTO menuitemingredients (menu_item_id, ingredient_id) VALUES "
+    "(1, 1), (2, 2), (2, 3), (3, 4), (3, 5), (4, 6), (4, 7), (4, 3), (5, 8), (6, 9), (6, 10)",
+    "INSERT INTO nutritionalvalues (id, menu_item_id, calories, protein, carbohydrates, fats, "
+    "saturated_fats, sugar, salt, fiber) VALUES "
+    "(1, 1, 180, 4, 22, 8, 3, 9, 1.1, 3), (2, 2, 420, 12, 14, 34, 7, 3, 1.6, 4), "
+    "(3, 3, 850, 40, 55, 48, 19, 9, 2.4, 3), (4, 4, 620, 14, 78, 24, 13, 4, 1.3, 5), "
+    "(5, 5, 480, 7, 38, 33, 20, 29, 0.5, 1), (6, 6, 520, 38, 12, 30, 6, 2, 1.0, 2)",
+]
+
+
+def schema_statements(dialect: str = "sqlite") -> List[str]:
+    """
+    Return the CREATE TABLE statements of the schema SQLQueryTool describes
+    to the model, with Postgres types translated for SQLite.
+    """
+    statements = []
+    for statement in SCHEMA_SQL.split(";"):
+        lines = [line for line in statement.splitlines() if not line.startswith("--")]
+        statement = "\n".join(lines).strip()
+        if not statement:
+            continue
+        if dialect == "sqlite":
+            statement = statement.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY")
+            statement = statement.replace("TIMESTAMP WITH TIME ZONE", "TIMESTAMP")
+        statements.append(statement)
+    return statements
+
+
+def create_seeded_engine() -> Engine:
+    """
+    Create an in-memory SQLite database with the full restaurant schema, a
+    small menu and its allergens, ingredients and nutritional values.
+    """
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    with engine.begin() as connection:
+        for statement in schema_statements(engine.dialect.name) + SEED_SQL:
+            connection.execute(text(statement))
+    return engine
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    A stubbed chat model with a fixed latency.
+
+    For every guest message it first sets the order slip through
+    SetOrderSlipTool and then answers in plain text. When streamed, the first
+    chunk arrives after ``latency`` and every further chunk (a word of the
+    answer or a piece of the tool arguments) after ``token_latency``.
+    """
+
+    latency: float = 0.05
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "openwaiterai-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage("Your House Burger is on the order slip.")
+        return AIMessage(
+            "",
+            tool_calls=[
+                {
+                    "name": "SetOrderSlipTool",
+                    "args": {
+                        "order_slip": [{"id": 3, "name": "House Burger", "quantity": 1}]
+                    },
+                    "id": f"call_{uuid.uuid4().hex}",
+                    "type": "tool_call",
+                }
+            ],
+        )
+
+    def _chunks(self, message: AIMessage) -> List[AIMessageChunk]:
+        chunks = []
+        for index, tool_call in enumerate(message.tool_calls):
+            arguments = json.dumps(tool_call["args"])
+            pieces = [arguments[start : start + 16] for start in range(0, len(arguments), 16)]
+            for position, piece in enumerate(pieces):
+                chunks.append(
+                    AIMessageChunk(
+                        "",
+                        tool_call_chunks=[
+                            {
+                                "name": tool_call["name"] if position == 0 else None,
+                                "args": piece,
+                                "id": tool_call["id"] if position == 0 else None,
+                                "index": index,
+                                "type": "tool_call_chunk",
+                            }
+                        ],
+                    )
+                )
+        if message.content:
+            words = message.content.split(" ")
+            chunks += [AIMessageChunk(words[0])] + [AIMessageChunk(f" {word}") for word in words[1:]]
+        return chunks
+
+    def _generation_time(self, message: AIMessage) -> float:
+        # The same time a streamed response takes until its last chunk
+        return self.latency + self.token_latency * max(len(self._chunks(message)) - 1, 0)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for position, chunk in enumerate(self._chunks(self._respond(messages))):
+            if position:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for position, chunk in enumerate(self._chunks(self._respond(messages))):
+            if position:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=chunk)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._respond(messages)
+        time.sleep(self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._respond(messages)
+        await asyncio.sleep(self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ScriptedTurn(NamedTuple):
+    """
+    One guest message, the rounds of tool calls the model makes for it and
+    its final answer.
+    """
+
+    prompt: str
+    tool_rounds: List[List[Tuple[str, Dict]]]
+    answer: str
+
+
+DINNER_SCRIPT = [
+    ScriptedTurn(
+        "What can I eat without gluten or milk?",
+        [[("MenuLookupTool", {"exclude_allergens": ["gluten", "milk"]})]],
+        "The Tomato Soup and the Grilled Salmon contain neither gluten nor milk.",
+    ),
+    ScriptedTurn(
+        "How much protein is in the House Burger, and where can I park?",
+        [
+            [
+                ("MenuLookupTool", {"item": "House Burger"}),
+                (
+                    "SQLQueryTool",
+                    {"query": "SELECT description FROM restaurantinfo WHERE category = 'parking'"},
+                ),
+            ]
+        ],
+        "The House Burger has 40 g of protein, and there is free parking behind the building.",
+    ),
+    ScriptedTurn(
+        "Which mains do you have?",
+        [
+            [
+                (
+                    "SQLQueryTool",
+                    {
+                        "query": "SELECT m.id, m.name FROM menuitems m "
+                        "JOIN categories c ON c.id = m.category_id WHERE c.name = 'Mains'"
+                    },
+                )
+            ]
+        ],
+        "Our mains are the House Burger, the Mushroom Risotto and the Grilled Salmon.",
+    ),
+    ScriptedTurn(
+        "I'd like the House Burger and a Tomato Soup, please.",
+        [
+            [
+                (
+                    "SetOrderSlipTool",
+                    {
+                        "order_slip": [
+                            {"id": 3, "name": "House Burger", "quantity": 1},
+                            {"id": 1, "name": "Tomato Soup", "quantity": 1},
+                        ]
+                    },
+                )
+            ]
+        ],
+        "A House Burger and a Tomato Soup are on your order slip.",
+    ),
+    ScriptedTurn(
+        "Add a Cheesecake for dessert, with the sauce on the side.",
+        [
+            [
+                (
+                    "SetOrderSlipTool",
+                    {
+                        "changes": [
+                            {
+                                "op": "add",
+                                "id": 5,
+                                "name": "Cheesecake",
+                                "notes": "Sauce on the side",
+                            }
+                        ]
+                    },
+                )
+            ]
+        ],
+        "I added a Cheesecake with the sauce on the side.",
+    ),
+    ScriptedTurn("Thank you!", [], "You're welcome, enjoy your meal!"),
+]
+
+
+class ScriptedChatModel(FakeChatModel):
+    """
+    A stubbed chat model that plays a scripted conversation.
+
+    The last guest message selects the scripted turn. The model makes one
+    round of tool calls per scripted round that has no results yet, then
+    answers. Unknown guest messages get a plain answer.
+    """
+
+    script: List[ScriptedTurn] = Field(default_factory=lambda: list(DINNER_SCRIPT))
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        position = max(
+            index for index, message in enumerate(messages) if isinstance(message, HumanMessage)
+        )
+        prompt = messages[position].content
+        turn = next((turn for turn in self.script if turn.prompt == prompt), None)
+        if turn is None:
+            return AIMessage("How can I help you?")
+
+        rounds = sum(isinstance(message, AIMessage) for message in messages[position + 1 :])
+        if rounds >= len(turn.tool_rounds):
+            return AIMessage(turn.answer)
+        return AIMessage(
+            "",
+            tool_calls=[
+                {
+                    "name": name,
+                    "args": args,
+                    "id": f"call_{uuid.uuid4().hex}",
+                    "type": "tool_call",
+                }
+                for name, args in turn.tool_rounds[rounds]
+            ],
+        )
@@ -0,0 +1,311 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.engine import Engine
+
+from .Database.NotificationListener import NotificationListener
+
+MENU_CHANNEL = "menu_changed"
+MENU_TABLES = [
+    "restaurantinfo",
+    "categories",
+    "allergens",
+    "ingredients",
+    "menuitems",
+    "menuitemingredients",
+    "menuitemallergens",
+    "nutritionalvalues",
+]
+
+# Install once on the restaurant database to pick up menu edits immediately:
+#   python -c "from openwaiterai.ContextCache import MENU_TRIGGER_SQL; print(MENU_TRIGGER_SQL)" | psql "$DATABASE_URL"
+MENU_TRIGGER_SQL = (
+    f"""
+CREATE OR REPLACE FUNCTION notify_menu_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{MENU_CHANNEL}', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+    + "".join(
+        f"""
+DROP TRIGGER IF EXISTS {MENU_CHANNEL} ON {table};
+CREATE TRIGGER {MENU_CHANNEL}
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_menu_changed();
+"""
+        for table in MENU_TABLES
+    )
+)
+
+
+class RestaurantContext:
+    """
+    An immutable snapshot of the restaurant and menu descriptions.
+    """
+
+    def __init__(self, sections: Dict[str, str], version: int):
+        self.sections = dict(sections)
+        self.version = version
+        self.fingerprint = hashlib.sha256(
+            "\0".join(f"{name}={text}" for name, text in sorted(sections.items())).encode(
+                "utf-8"
+            )
+        ).hexdigest()[:16]
+        self.built_at = time.time()
+
+    def __getitem__(self, name: str) -> str:
+        return self.sections[name]
+
+
+class ContextCache:
+    """
+    Process-wide cache of the restaurant context built from the database.
+
+    The context is built once per database and shared by every OpenWaiterAI
+    instance. It is rebuilt after ``ttl`` seconds, or as soon as the database
+    signals a menu change on the ``menu_changed`` channel. Rebuilds run in a
+    background thread and replace the snapshot atomically, so sessions keep
+    using the previous snapshot until the new one is ready. A snapshot loaded
+    from a file with ``seed`` is served right away and rebuilt on first use.
+
+    The following environment variables are used:
+    - OPENWAITERAI_CONTEXT_TTL: Seconds after which the context is rebuilt.
+    - OPENWAITERAI_MENU_NOTIFY: Set to 0 to disable menu change notifications.
+    """
+
+    _shared: Dict[str, "ContextCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        builder: Callable[[], Dict[str, str]],
+        ttl: float = None,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            builder (Callable[[], Dict[str, str]]): Builds the context sections,
+                e.g. ``{"restaurant": ..., "menu": ...}``.
+            ttl (float): Seconds after which the context is rebuilt.
+            debug (bool): Enables debug logging.
+        """
+        self.builder = builder
+        if ttl is None:
+            ttl = float(os.getenv("OPENWAITERAI_CONTEXT_TTL", "300"))
+        self.ttl = ttl
+        self.debug = debug
+        self.listener: Optional[NotificationListener] = None
+        self._listen_factory: Optional[Callable] = None
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self._context: Optional[RestaurantContext] = None
+        self._stale = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _after_fork(cls):
+        # The listener threads of the parent do not exist in a forked child
+        cls._shared_lock = threading.Lock()
+        cls._shared = {}
+
+    @classmethod
+    def shared(
+        cls,
+        engine: Engine,
+        builder: Callable[[], Dict[str, str]],
+        debug: bool = False,
+    ) -> "ContextCache":
+        """
+        Return the process-wide context cache of a database.
+
+        The builder of the first caller is used for the lifetime of the cache.
+        Menu change notifications are listened to from the first ``get``.
+
+        Args:
+            engine (Engine): The restaurant database engine.
+            builder (Callable[[], Dict[str, str]]): Builds the context sections.
+            debug (bool): Enables debug logging.
+
+        Returns:
+            ContextCache: The shared cache.
+        """
+        key = engine.url.render_as_string(hide_password=False)
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls(builder, debug=debug)
+                cls._shared[key] = cache
+                if (
+                    engine.dialect.name == "postgresql"
+                    and os.getenv("OPENWAITERAI_MENU_NOTIFY", "1") != "0"
+                ):
+                    dsn = engine.url.set(drivername="postgresql").render_as_string(
+                        hide_password=False
+                    )
+                    cache._listen_factory = lambda: _connect(dsn)
+        return cache
+
+    @property
+    def version(self) -> int:
+        """
+        The version of the current snapshot, incremented whenever its content changes.
+        """
+        return self.get().version
+
+    def get(self) -> RestaurantContext:
+        """
+        Return the current snapshot, building it on first use.
+
+        A stale snapshot is returned as is while a rebuild runs in the background.
+
+        Returns:
+            RestaurantContext: The current snapshot.
+        """
+        if self._listen_factory is not None:
+            self._start_listening()
+
+        context = self._context
+        if context is None:
+            with self._lock:
+                if self._context is None:
+                    self._context = RestaurantContext(self._build(), version=1)
+                return self._context
+
+        if self._stale or time.time() - context.built_at > self.ttl:
+            self._refresh_in_background()
+        return context
+
+    def seed(self, context: RestaurantContext):
+        """
+        Serve a prebuilt snapshot, e.g. loaded from a file, until it is rebuilt.
+
+        The snapshot is marked stale, so the first ``get`` rebuilds it from the
+        database in the background. It is ignored if a snapshot was already built.
+
+        Args:
+            context (RestaurantContext): The prebuilt snapshot.
+        """
+        with self._lock:
+            if self._context is not None:
+                return
+            self._context = context
+            self._stale = True
+        if self.debug:
+            self.logger.debug(f"Restaurant context seeded ({context.fingerprint})")
+
+    def invalidate(self, reason: str = None):
+        """
+        Mark the snapshot as stale and start rebuilding it.
+
+        Args:
+            reason (str): Why the snapshot is stale, e.g. the changed table.
+        """
+        if self.debug:
+            self.logger.debug(f"Restaurant context invalidated: {reason}")
+        self._stale = True
+        if self._context is not None:
+            self._refresh_in_background()
+
+    def refresh(self) -> RestaurantContext:
+        """
+        Rebuild the snapshot now and swap it in.
+
+        The version only changes when the content does. If the builder fails
+        the current snapshot and its version are kept.
+
+        Returns:
+            RestaurantContext: The current snapshot.
+
+        Raises:
+            Exception: Whatever the builder raised.
+        """
+        self._stale = False
+        sections = self._build()
+        with self._lock:
+            current = self._context
+            context = RestaurantContext(sections, version=current.version if current else 1)
+            if current is not None and context.fingerprint != current.fingerprint:
+                context.version = current.version + 1
+            self._context = context
+
+        if self.debug:
+            self.logger.debug(
+                f"Restaurant context rebuilt, version {context.version} ({context.fingerprint})"
+            )
+        return context
+
+    def _build(self) -> Dict[str, str]:
+        sections = self.builder()
+        for name, text in sections.items():
+            if not isinstance(text, str):
+                raise TypeError(f"Context section {name} is {type(text).__name__}, not str")
+        return sections
+
+    def listen(self, connection_factory: Callable) -> bool:
+        """
+        Invalidate the snapshot whenever the database signals a menu change.
+
+        Args:
+            connection_factory (Callable): Returns a new LISTEN capable connection.
+
+        Returns:
+            bool: True if notifications are available.
+        """
+        self.listener = NotificationListener(
+            connection_factory,
+            MENU_CHANNEL,
+            callback=self.invalidate,
+            debug=self.debug,
+        )
+        self.listener.description = "menu change"
+        return self.listener.start()
+
+    def _start_listening(self):
+        with self._lock:
+            connection_factory, self._listen_factory = self._listen_factory, None
+        if connection_factory is not None:
+            self.listen(connection_factory)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error("Failed to rebuild restaurant context", exc_info=e)
+                # Retry after another ttl instead of on every call
+                with self._lock:
+                    if self._context is not None:
+                        self._context.built_at = time.time()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(
+            target=run, name="openwaiterai-context-refresh", daemon=True
+        ).start()
+
+
+def _connect(dsn: str):
+    # psycopg2 is only needed once a Postgres listener starts
+    import psycopg2
+
+    return psycopg2.connect(dsn)
+
+
+# Forked server workers build their own caches, e.g. from a snapshot
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=ContextCache._after_fork)
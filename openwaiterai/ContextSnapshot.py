@@ -0,0 +1,84 @@
+import os
+import json
+import mmap
+import time
+from typing import Dict
+
+from .ContextCache import RestaurantContext
+
+SNAPSHOT_FORMAT = "openwaiterai-context/1"
+
+
+def save_snapshot(context: RestaurantContext, path: str):
+    """
+    Write a restaurant context to a snapshot file.
+
+    The file is one JSON header line with the offset and length of every
+    section, followed by the UTF-8 encoded sections. It is written to a
+    temporary file and renamed, so readers never see a partial snapshot.
+
+    Args:
+        context (RestaurantContext): The context to save.
+        path (str): The snapshot file.
+    """
+    sections: Dict[str, list] = {}
+    body = bytearray()
+    for name, text in sorted(context.sections.items()):
+        encoded = text.encode("utf-8")
+        sections[name] = [len(body), len(encoded)]
+        body += encoded
+
+    header = json.dumps(
+        {
+            "format": SNAPSHOT_FORMAT,
+            "fingerprint": context.fingerprint,
+            "built_at": context.built_at,
+            "sections": sections,
+        },
+        sort_keys=True,
+    ).encode("utf-8")
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(header + b"\n" + bytes(body))
+    os.replace(temporary, path)
+
+
+def load_snapshot(path: str) -> RestaurantContext:
+    """
+    Load a restaurant context from a snapshot file written by ``save_snapshot``.
+
+    The file is memory-mapped, so only the pages of the header and the sections
+    are read, and the page cache is shared by every worker of a host.
+
+    Args:
+        path (str): The snapshot file.
+
+    Returns:
+        RestaurantContext: The context, at version 1 and with the build time
+        of the snapshot.
+
+    Raises:
+        ValueError: If the file is not a snapshot or its content does not match
+            its fingerprint.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        end = data.find(b"\n")
+        try:
+            header = json.loads(data[:end]) if end > 0 else None
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Not a context snapshot: {path}")
+
+        start = end + 1
+        sections = {
+            name: data[start + offset : start + offset + length].decode("utf-8")
+            for name, (offset, length) in header["sections"].items()
+        }
+
+    context = RestaurantContext(sections, version=1)
+    if context.fingerprint != header["fingerprint"]:
+        raise ValueError(f"Context snapshot {path} does not match its fingerprint")
+    context.built_at = min(float(header["built_at"]), time.time())
+    return context
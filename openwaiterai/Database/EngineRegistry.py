@@ -0,0 +1,400 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Async drivers used for the asyncio code path, by sync driver
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def build_connection_string() -> str:
+    """
+    Build the database connection string from environment variables.
+
+    The following environment variables are used:
+    - OPENWAITERAI_DB_HOST: The database host.
+    - OPENWAITERAI_DB_PORT: The database port.
+    - OPENWAITERAI_DB_NAME: The database name.
+    - OPENWAITERAI_DB_USER: The database username.
+    - OPENWAITERAI_DB_PASSWORD: The database password.
+
+    Returns:
+        str: The connection string, for the psycopg2 driver.
+    """
+    db_host = os.getenv("OPENWAITERAI_DB_HOST", "localhost")
+    db_port = os.getenv("OPENWAITERAI_DB_PORT", "5432")
+    db_name = os.getenv("OPENWAITERAI_DB_NAME", "example")
+    db_user = os.getenv("OPENWAITERAI_DB_USER", "user")
+    db_password = os.getenv("OPENWAITERAI_DB_PASSWORD", "password")
+
+    # A bare postgresql:// URL selects psycopg (v3) in SQLAlchemy 2.1
+    return f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+
+class PoolMetrics:
+    """
+    Checkout, wait time and saturation counters of a connection pool.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.checkouts = 0
+        self.checkins = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_checkin(self):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def record_timeout(self, wait: float):
+        with self._lock:
+            self.timeouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    @property
+    def saturation(self) -> float:
+        """
+        The share of the pool capacity (size plus overflow) currently checked out.
+        """
+        return self.checked_out / self.capacity if self.capacity else 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: A copy of the counters.
+        """
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "saturation": self.saturation,
+                "avg_wait": self.total_wait / self.checkouts if self.checkouts else 0.0,
+                "max_wait": self.max_wait,
+                "timeouts": self.timeouts,
+            }
+
+
+class InstrumentedPoolMixin:
+    """
+    Records checkout wait times and saturation of a queue pool.
+    """
+
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics(self.size() + max(self._max_overflow, 0))
+
+    def recreate(self) -> "InstrumentedPoolMixin":
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_timeout(time.perf_counter() - start_time)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start_time)
+        return connection
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self.metrics.record_checkin()
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    """
+    A QueuePool that records checkout wait times and saturation.
+    """
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """
+    An AsyncAdaptedQueuePool that records checkout wait times and saturation.
+    """
+
+
+def to_async_url(dsn: str) -> str:
+    """
+    Rewrite a connection string to use the async driver of its database.
+
+    Args:
+        dsn (str): A sync connection string such as ``postgresql+psycopg2://...``.
+
+    Returns:
+        str: The connection string with the async driver, e.g. ``postgresql+asyncpg://...``.
+    """
+    url = make_url(dsn)
+    if url.drivername not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {url.drivername} connections")
+    return url.set(drivername=ASYNC_DRIVERS[url.drivername]).render_as_string(
+        hide_password=False
+    )
+
+
+class EngineRegistry:
+    """
+    Process-wide registry of pooled SQLAlchemy engines keyed by DSN.
+
+    Every tool of every OpenWaiterAI instance in the process shares the engine
+    of its database, so the number of connections is bounded by the pool
+    settings instead of growing with the number of tables served.
+
+    The following environment variables configure new engines:
+    - OPENWAITERAI_DB_POOL_SIZE: Connections kept open in the pool.
+    - OPENWAITERAI_DB_MAX_OVERFLOW: Extra connections allowed under load.
+    - OPENWAITERAI_DB_POOL_TIMEOUT: Seconds to wait for a free connection.
+    - OPENWAITERAI_DB_POOL_PRE_PING: Set to 0 to skip liveness checks on checkout.
+    - OPENWAITERAI_DB_POOL_RECYCLE: Seconds after which connections are replaced.
+    """
+
+    _engines: Dict[str, Engine] = {}
+    _async_engines: Dict[str, AsyncEngine] = {}
+    _lock = threading.Lock()
+    logger: logging.Logger = logging.getLogger(__name__)
+
+    @classmethod
+    def get_engine(
+        cls,
+        dsn: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        pool_timeout: Optional[float] = None,
+        pool_pre_ping: Optional[bool] = None,
+        pool_recycle: Optional[int] = None,
+    ) -> Engine:
+        """
+        Return the shared engine of a database, creating it on first use.
+
+        Pool settings only apply when the engine is created.
+
+        Args:
+            dsn (str): The connection string. Defaults to the one built from
+                environment variables.
+            pool_size (int): Connections kept open in the pool.
+            max_overflow (int): Extra connections allowed under load.
+            pool_timeout (float): Seconds to wait for a free connection.
+            pool_pre_ping (bool): Check connections for liveness on checkout.
+            pool_recycle (int): Seconds after which connections are replaced.
+
+        Returns:
+            Engine: The shared engine.
+        """
+        dsn = dsn or build_connection_string()
+        with cls._lock:
+            engine = cls._engines.get(dsn)
+            if engine is not None:
+                return engine
+
+            try:
+                engine = create_engine(
+                    dsn,
+                    poolclass=InstrumentedQueuePool,
+                    **cls._pool_settings(
+                        pool_size, max_overflow, pool_timeout, pool_pre_ping, pool_recycle
+                    ),
+                )
+            except Exception as e:
+                cls.logger.error("Failed to create database engine", exc_info=e)
+                raise
+
+            cls._engines[dsn] = engine
+            return engine
+
+    @classmethod
+    def get_async_engine(
+        cls,
+        dsn: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        pool_timeout: Optional[float] = None,
+        pool_pre_ping: Optional[bool] = None,
+        pool_recycle: Optional[int] = None,
+    ) -> AsyncEngine:
+        """
+        Return the shared async engine of a database, creating it on first use.
+
+        The engine uses the async driver of the database (asyncpg for Postgres).
+        Its connections belong to the event loop they were opened on, so all
+        async callers of a process should run on the same loop.
+
+        Args:
+            dsn (str): The sync or async connection string. Defaults to the one
+                built from environment variables.
+            pool_size (int): Connections kept open in the pool.
+            max_overflow (int): Extra connections allowed under load.
+            pool_timeout (float): Seconds to wait for a free connection.
+            pool_pre_ping (bool): Check connections for liveness on checkout.
+            pool_recycle (int): Seconds after which connections are replaced.
+
+        Returns:
+            AsyncEngine: The shared async engine.
+        """
+        dsn = dsn or build_connection_string()
+        if make_url(dsn).drivername in ASYNC_DRIVERS:
+            dsn = to_async_url(dsn)
+        with cls._lock:
+            engine = cls._async_engines.get(dsn)
+            if engine is not None:
+                return engine
+
+            try:
+                engine = create_async_engine(
+                    dsn,
+                    poolclass=InstrumentedAsyncQueuePool,
+                    **cls._pool_settings(
+                        pool_size, max_overflow, pool_timeout, pool_pre_ping, pool_recycle
+                    ),
+                )
+            except Exception as e:
+                cls.logger.error("Failed to create async database engine", exc_info=e)
+                raise
+
+            cls._async_engines[dsn] = engine
+            return engine
+
+    @staticmethod
+    def _pool_settings(
+        pool_size: Optional[int],
+        max_overflow: Optional[int],
+        pool_timeout: Optional[float],
+        pool_pre_ping: Optional[bool],
+        pool_recycle: Optional[int],
+    ) -> Dict:
+        if pool_size is None:
+            pool_size = int(os.getenv("OPENWAITERAI_DB_POOL_SIZE", "5"))
+        if max_overflow is None:
+            max_overflow = int(os.getenv("OPENWAITERAI_DB_MAX_OVERFLOW", "10"))
+        if pool_timeout is None:
+            pool_timeout = float(os.getenv("OPENWAITERAI_DB_POOL_TIMEOUT", "30"))
+        if pool_pre_ping is None:
+            pool_pre_ping = os.getenv("OPENWAITERAI_DB_POOL_PRE_PING", "1") != "0"
+        if pool_recycle is None:
+            pool_recycle = int(os.getenv("OPENWAITERAI_DB_POOL_RECYCLE", "1800"))
+
+        return {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pool_pre_ping": pool_pre_ping,
+            "pool_recycle": pool_recycle,
+        }
+
+    @classmethod
+    def register(cls, dsn: str, engine: Engine):
+        """
+        Register an externally created engine under a DSN.
+
+        Args:
+            dsn (str): The connection string the engine serves.
+            engine (Engine): The engine to share.
+        """
+        with cls._lock:
+            cls._engines[dsn] = engine
+
+    @classmethod
+    def get_metrics(cls, engine: Engine) -> Optional[Dict[str, float]]:
+        """
+        Return the pool metrics of an engine.
+
+        Args:
+            engine (Engine): An engine or async engine created by the registry.
+
+        Returns:
+            Optional[Dict[str, float]]: The pool counters, or None if the engine
+            does not use an instrumented pool.
+        """
+        metrics = getattr(getattr(engine, "sync_engine", engine).pool, "metrics", None)
+        return metrics.snapshot() if metrics is not None else None
+
+    @classmethod
+    def all_metrics(cls) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            Dict[str, Dict[str, float]]: The pool metrics of every registered
+            engine, keyed by the engine URL with the password hidden.
+        """
+        with cls._lock:
+            engines = list(cls._engines.values()) + list(cls._async_engines.values())
+        return {
+            engine.url.render_as_string(hide_password=True): cls.get_metrics(engine)
+            for engine in engines
+            if cls.get_metrics(engine) is not None
+        }
+
+    @classmethod
+    def dispose_all(cls):
+        """
+        Close every pooled connection of the sync engines and forget all engines.
+
+        Async engines are forgotten without closing, use ``adispose_all`` from
+        their event loop to close them.
+        """
+        with cls._lock:
+            engines, cls._engines = list(cls._engines.values()), {}
+            cls._async_engines = {}
+        for engine in engines:
+            engine.dispose()
+
+    @classmethod
+    def _after_fork(cls):
+        """
+        Drop the pooled connections a forked child inherited, without closing
+        them, so the parent keeps using its connections and the child opens
+        its own.
+        """
+        # The lock may have been held by another thread of the parent
+        cls._lock = threading.Lock()
+        for engine in cls._engines.values():
+            engine.dispose(close=False)
+        # Async engines belong to the event loop of the parent
+        cls._async_engines = {}
+
+    @classmethod
+    async def adispose_all(cls):
+        """
+        Close every pooled connection of the async engines and forget them.
+        """
+        with cls._lock:
+            engines, cls._async_engines = list(cls._async_engines.values()), {}
+        for engine in engines:
+            await engine.dispose()
+
+
+# Worker processes forked by the server must not share database connections
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=EngineRegistry._after_fork)
@@ -0,0 +1,150 @@
+import time
+import select
+import logging
+import threading
+from typing import Callable, Optional
+
+
+class NotificationListener:
+    """
+    Listens on a Postgres notification channel from a background thread.
+
+    One dedicated connection runs ``LISTEN`` and every notification payload is
+    passed to ``dispatch``. Listening only starts when the trigger that sends
+    the notifications is installed, so callers can fall back to polling.
+    """
+
+    description: str = "notification"
+
+    def __init__(
+        self,
+        connection_factory: Callable,
+        channel: str,
+        trigger_name: str = None,
+        callback: Callable[[str], None] = None,
+        poll_timeout: float = 1.0,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            connection_factory (Callable): Returns a new DB-API connection that
+                supports LISTEN (``fileno``, ``poll`` and ``notifies``).
+            channel (str): The notification channel to listen on.
+            trigger_name (str): The trigger that must exist for notifications to
+                be sent. Defaults to the channel name.
+            callback (Callable[[str], None]): Called with every payload.
+            poll_timeout (float): How long the listener blocks in ``select``
+                before checking whether it has been closed.
+            debug (bool): Enables debug logging.
+        """
+        self.connection_factory = connection_factory
+        self.channel = channel
+        self.trigger_name = trigger_name or channel
+        self.callback = callback
+        self.poll_timeout = poll_timeout
+        self.debug = debug
+        self.available = False
+        self.started_at = 0.0
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._connection = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """
+        Open the LISTEN connection and start the listener thread.
+
+        Returns:
+            bool: True if notifications are available, False if the trigger is
+            not installed or the connection failed.
+        """
+        self.started_at = time.monotonic()
+        try:
+            connection = self.connection_factory()
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_trigger WHERE tgname = %s;",
+                    (self.trigger_name,),
+                )
+                if cursor.fetchone() is None:
+                    self.logger.warning(
+                        "Trigger %s is not installed, %s events will be polled",
+                        self.trigger_name,
+                        self.description,
+                    )
+                    connection.close()
+                    return False
+                cursor.execute(f'LISTEN "{self.channel}";')
+        except Exception as e:
+            self.logger.error(f"Failed to start {self.description} listener", exc_info=e)
+            return False
+
+        self._connection = connection
+        self._stop.clear()
+        self.available = True
+        self._thread = threading.Thread(
+            target=self._listen,
+            name=f"openwaiterai-{self.channel}-listener",
+            daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def close(self):
+        """
+        Stop the listener thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def dispatch(self, payload: str):
+        """
+        Handle one notification payload.
+
+        Args:
+            payload (str): The notification payload.
+        """
+        if self.callback is not None:
+            self.callback(payload)
+
+    def on_stop(self):
+        """
+        Called from the listener thread once it has stopped listening.
+        """
+
+    def _listen(self):
+        connection = self._connection
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([connection], [], [], self.poll_timeout)
+                if not ready:
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    self.dispatch(notify.payload)
+            except Exception as e:
+                if not self._stop.is_set():
+                    self.logger.error(
+                        f"{self.description.capitalize()} listener failed, "
+                        "falling back to polling",
+                        exc_info=e,
+                    )
+                break
+
+        with self._lock:
+            self.available = False
+        self.on_stop()
+
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._connection = None
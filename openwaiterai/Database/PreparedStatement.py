@@ -0,0 +1,131 @@
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .QueryExecutor import (
+    DEFAULT_FETCH_SIZE,
+    QueryResult,
+    _collect,
+    aexecute_query,
+)
+
+_PARAMETER_PATTERN = re.compile(r"(?<![:\w]):(\w+)")
+_INFO_KEY = "openwaiterai_prepared"
+
+
+class PreparedStatement:
+    """
+    A hot statement that is parsed and planned once per database connection.
+
+    On Postgres with psycopg2 the statement is created with ``PREPARE`` the
+    first time a pooled connection runs it and executed with ``EXECUTE``
+    afterwards, so the server skips parsing and planning on every call. Which
+    statements a connection has prepared is kept in its ``info`` dictionary,
+    which lives exactly as long as the server session.
+
+    Other drivers bind the parameters normally: asyncpg prepares and caches
+    statements itself, and sqlite3 keeps a statement cache per connection.
+    """
+
+    def __init__(self, name: str, sql: str):
+        """
+        Args:
+            name (str): The server-side name of the statement.
+            sql (str): The statement with ``:name`` parameters.
+        """
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", name):
+            raise ValueError(f"Invalid prepared statement name: {name}")
+        self.name = name
+        self.sql = sql.strip().rstrip(";")
+
+        self.parameters: List[str] = []
+        for parameter in _PARAMETER_PATTERN.findall(self.sql):
+            if parameter not in self.parameters:
+                self.parameters.append(parameter)
+        self.server_sql = _PARAMETER_PATTERN.sub(
+            lambda match: f"${self.parameters.index(match.group(1)) + 1}", self.sql
+        )
+
+    def execute(self, engine: Engine, params: Optional[Dict[str, Any]] = None) -> QueryResult:
+        """
+        Execute the statement in its own transaction and return typed rows.
+
+        Args:
+            engine (Engine): The database engine.
+            params (Dict[str, Any]): The parameter values by name.
+
+        Returns:
+            QueryResult: The result.
+        """
+        with engine.begin() as connection:
+            return self.run(connection, params)
+
+    def run(self, connection: Connection, params: Optional[Dict[str, Any]] = None) -> QueryResult:
+        """
+        Execute the statement within the current transaction of a connection.
+
+        Args:
+            connection (Connection): The connection.
+            params (Dict[str, Any]): The parameter values by name.
+
+        Returns:
+            QueryResult: The result.
+        """
+        params = params or {}
+        if connection.dialect.name != "postgresql" or connection.dialect.driver != "psycopg2":
+            return _collect(connection.execute(text(self.sql), params), None, DEFAULT_FETCH_SIZE)
+
+        self.prepare(connection)
+        placeholders = ", ".join(f"%({parameter})s" for parameter in self.parameters)
+        cursor = connection.exec_driver_sql(
+            f"EXECUTE {self.name} ({placeholders})" if self.parameters else f"EXECUTE {self.name}",
+            {parameter: params[parameter] for parameter in self.parameters},
+        )
+        return _collect(cursor, None, DEFAULT_FETCH_SIZE)
+
+    async def aexecute(
+        self, engine: AsyncEngine, params: Optional[Dict[str, Any]] = None
+    ) -> QueryResult:
+        """
+        Asynchronously execute the statement and return typed rows.
+
+        asyncpg prepares the statement itself and caches it per connection.
+
+        Args:
+            engine (AsyncEngine): The async database engine.
+            params (Dict[str, Any]): The parameter values by name.
+
+        Returns:
+            QueryResult: The result.
+        """
+        return await aexecute_query(engine, self.sql, params or {})
+
+    def prepare(self, connection: Connection):
+        """
+        Prepare the statement on a connection unless it already is.
+
+        Args:
+            connection (Connection): A connection to a Postgres database.
+        """
+        prepared = self._prepared(connection)
+        if self.name in prepared:
+            return
+        connection.exec_driver_sql(f"PREPARE {self.name} AS {self.server_sql}")
+        prepared.add(self.name)
+
+    def _prepared(self, connection: Connection) -> Set[str]:
+        info = connection.connection.info
+        prepared = info.get(_INFO_KEY)
+        if prepared is None:
+            # The session may have prepared statements from before the pool knew it
+            prepared = {
+                row[0]
+                for row in connection.exec_driver_sql(
+                    "SELECT name FROM pg_prepared_statements"
+                )
+            }
+            info[_INFO_KEY] = prepared
+        return prepared
@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+
+from .QueryExecutor import QueryResult
+from .SQLNormalizer import (
+    calls_volatile_function,
+    is_read_only,
+    normalize_sql,
+    referenced_tables,
+)
+
+
+class QueryCache:
+    """
+    LRU/TTL cache of read-only query results, keyed on normalized SQL.
+
+    Only single ``SELECT`` statements that read exclusively from the
+    configured tables are cached, so order and waiter call tables are always
+    read from the database. All entries belong to one version of the cached
+    tables, passing a different version to ``get`` or ``put`` clears them.
+
+    The following environment variables are used:
+    - OPENWAITERAI_QUERY_CACHE_SIZE: The maximum number of cached results, 0 disables the cache.
+    - OPENWAITERAI_QUERY_CACHE_TTL: Seconds a cached result is served.
+    """
+
+    _shared: Dict[str, "QueryCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        tables: Iterable[str],
+        max_entries: int = None,
+        ttl: float = None,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            tables (Iterable[str]): The tables whose query results may be cached.
+            max_entries (int): The maximum number of cached results.
+            ttl (float): Seconds a cached result is served.
+            debug (bool): Enables debug logging.
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv("OPENWAITERAI_QUERY_CACHE_SIZE", "256"))
+        if ttl is None:
+            ttl = float(os.getenv("OPENWAITERAI_QUERY_CACHE_TTL", "60"))
+
+        self.tables = {table.lower() for table in tables}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.debug = debug
+        self.version: Optional[Hashable] = None
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries: "OrderedDict[Tuple, Tuple[float, QueryResult]]" = OrderedDict()
+        self._keys: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _after_fork(cls):
+        # A lock of the parent may be held by a thread that does not exist in a forked child
+        cls._shared_lock = threading.Lock()
+        cls._shared = {}
+
+    @classmethod
+    def shared(
+        cls, engine: Engine, tables: Iterable[str], debug: bool = False
+    ) -> "QueryCache":
+        """
+        Return the process-wide query cache of a database.
+
+        Args:
+            engine (Engine): The database engine.
+            tables (Iterable[str]): The tables whose query results may be cached.
+                Only used by the first caller.
+            debug (bool): Enables debug logging.
+
+        Returns:
+            QueryCache: The shared cache.
+        """
+        key = engine.url.render_as_string(hide_password=False)
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls(tables, debug=debug)
+                cls._shared[key] = cache
+        return cache
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, query: str) -> Optional[str]:
+        """
+        Return the cache key of a query, or None if its result must not be cached.
+
+        Args:
+            query (str): The SQL statement.
+
+        Returns:
+            Optional[str]: The normalized SQL.
+        """
+        # The model repeats the exact same text often, skip parsing it again
+        if query in self._keys:
+            return self._keys[query]
+
+        key = None
+        if is_read_only(query) and not calls_volatile_function(query):
+            tables = referenced_tables(query)
+            if tables and tables <= self.tables:
+                key = normalize_sql(query)
+
+        with self._lock:
+            if len(self._keys) >= max(self.max_entries, 1) * 4:
+                self._keys.clear()
+            self._keys[query] = key
+        return key
+
+    def get(
+        self, query: str, max_rows: Optional[int] = None, version: Hashable = None
+    ) -> Optional[QueryResult]:
+        """
+        Return the cached result of a query.
+
+        Args:
+            query (str): The SQL statement.
+            max_rows (int): The row cap the result was fetched with.
+            version (Hashable): The current version of the cached tables.
+
+        Returns:
+            Optional[QueryResult]: The cached result, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        key = self.key(query)
+        if key is None:
+            with self._lock:
+                self.bypasses += 1
+            return None
+
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get((key, max_rows))
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[(key, max_rows)]
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, max_rows))
+            self.hits += 1
+
+        if self.debug:
+            self.logger.debug(f"Query cache hit: {key}")
+        return entry[1]
+
+    def put(
+        self,
+        query: str,
+        result: QueryResult,
+        max_rows: Optional[int] = None,
+        version: Hashable = None,
+    ):
+        """
+        Cache the result of a query if it is cacheable.
+
+        Args:
+            query (str): The SQL statement.
+            result (QueryResult): Its result.
+            max_rows (int): The row cap the result was fetched with.
+            version (Hashable): The version of the cached tables the result was read from.
+        """
+        if not self.enabled:
+            return
+        key = self.key(query)
+        if key is None:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            self._entries[(key, max_rows)] = (time.monotonic(), result)
+            self._entries.move_to_end((key, max_rows))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, reason: str = None):
+        """
+        Drop all cached results.
+
+        Args:
+            reason (str): Why the results are stale.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+        if self.debug:
+            self.logger.debug(f"Query cache invalidated: {reason}")
+
+    def stats(self) -> Dict:
+        """
+        Return the hit, miss and eviction counters of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _check_version(self, version: Hashable):
+        # Called with the lock held
+        if version is not None and version != self.version:
+            if self.version is not None:
+                self._entries.clear()
+                self.invalidations += 1
+                if self.debug:
+                    self.logger.debug(f"Query cache cleared for version {version}")
+            self.version = version
+
+
+# Forked server workers start with empty caches
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=QueryCache._after_fork)
@@ -0,0 +1,312 @@
+import os
+import time
+import datetime
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+DEFAULT_MAX_ROWS = int(os.getenv("OPENWAITERAI_QUERY_MAX_ROWS", "100"))
+DEFAULT_MAX_CELL_CHARS = 300
+DEFAULT_FETCH_SIZE = 500
+
+
+def format_value(value: Any, max_chars: int = DEFAULT_MAX_CELL_CHARS) -> str:
+    """
+    Render a typed database value as compact text.
+
+    Args:
+        value (Any): The value.
+        max_chars (int): The maximum length of the rendered value.
+
+    Returns:
+        str: The rendered value.
+    """
+    if value is None:
+        rendered = "NULL"
+    elif isinstance(value, Decimal):
+        rendered = format(value.normalize(), "f") if value == value.to_integral() else str(value)
+    elif isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        rendered = value.isoformat()
+    elif isinstance(value, float):
+        rendered = f"{value:g}"
+    else:
+        rendered = str(value)
+
+    rendered = rendered.replace("\n", " ").replace("|", "\\|")
+    if len(rendered) > max_chars:
+        rendered = rendered[: max_chars - 3] + "..."
+    return rendered
+
+
+class QueryResult:
+    """
+    The typed rows of a query, without a round trip through strings.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        rows: List[Tuple],
+        truncated: bool = False,
+        rowcount: int = -1,
+    ):
+        """
+        Args:
+            columns (Sequence[str]): The column names.
+            rows (List[Tuple]): The rows, with Python typed values.
+            truncated (bool): True if the query returned more rows than fetched.
+            rowcount (int): The number of affected rows of a statement that
+                returns no rows.
+        """
+        self.columns = list(columns)
+        self.rows = rows
+        self.truncated = truncated
+        self.rowcount = rowcount
+
+    @property
+    def returns_rows(self) -> bool:
+        return bool(self.columns)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def scalar(self) -> Any:
+        """
+        Return the first column of the first row, or None.
+        """
+        return self.rows[0][0] if self.rows else None
+
+    def column(self, name: str) -> List[Any]:
+        """
+        Return all values of one column.
+        """
+        index = self.columns.index(name)
+        return [row[index] for row in self.rows]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def to_markdown(
+        self,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        max_cell_chars: int = DEFAULT_MAX_CELL_CHARS,
+    ) -> str:
+        """
+        Render the result as a markdown table of bounded size for the model.
+
+        Args:
+            max_rows (int): The maximum number of rows rendered.
+            max_cell_chars (int): The maximum length of every cell.
+
+        Returns:
+            str: The rendered table.
+        """
+        if not self.returns_rows:
+            return f"Query executed successfully, {max(self.rowcount, 0)} row(s) affected."
+        if not self.rows:
+            return "Query returned no rows."
+
+        lines = [
+            "| " + " | ".join(self.columns) + " |",
+            "|" + "---|" * len(self.columns),
+        ]
+        for row in self.rows[:max_rows]:
+            lines.append(
+                "| " + " | ".join(format_value(value, max_cell_chars) for value in row) + " |"
+            )
+        if self.truncated or len(self.rows) > max_rows:
+            lines.append(
+                f"(showing the first {min(len(self.rows), max_rows)} rows, "
+                "add conditions or LIMIT to narrow the result)"
+            )
+        return "\n".join(lines)
+
+    def to_csv(
+        self,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        max_cell_chars: int = DEFAULT_MAX_CELL_CHARS,
+    ) -> str:
+        """
+        Render the result as CSV of bounded size for the model.
+
+        Args:
+            max_rows (int): The maximum number of rows rendered.
+            max_cell_chars (int): The maximum length of every cell.
+
+        Returns:
+            str: The rendered rows.
+        """
+        if not self.returns_rows:
+            return f"Query executed successfully, {max(self.rowcount, 0)} row(s) affected."
+
+        def cell(value):
+            rendered = format_value(value, max_cell_chars).replace("\\|", "|")
+            if any(character in rendered for character in ',"'):
+                rendered = '"' + rendered.replace('"', '""') + '"'
+            return rendered
+
+        lines = [",".join(self.columns)]
+        lines += [",".join(cell(value) for value in row) for row in self.rows[:max_rows]]
+        if self.truncated or len(self.rows) > max_rows:
+            lines.append(f"# showing the first {min(len(self.rows), max_rows)} rows")
+        return "\n".join(lines)
+
+
+def execute_query(
+    engine: Engine,
+    query: str,
+    params: Optional[Dict[str, Any]] = None,
+    max_rows: Optional[int] = None,
+    fetch_size: int = DEFAULT_FETCH_SIZE,
+    read_only: bool = False,
+    timeout_ms: Optional[int] = None,
+) -> QueryResult:
+    """
+    Execute a query in its own transaction and return typed rows.
+
+    Rows are streamed through a server-side cursor, so a query with a row cap
+    never transfers more than ``max_rows + 1`` rows.
+
+    Args:
+        engine (Engine): The database engine.
+        query (str): The SQL statement.
+        params (Dict[str, Any]): Bound parameters of the statement.
+        max_rows (int): The maximum number of rows fetched, None for all.
+        fetch_size (int): The number of rows fetched per round trip.
+        read_only (bool): Runs the statement in a read-only transaction.
+        timeout_ms (int): Cancels the statement after this many milliseconds.
+
+    Returns:
+        QueryResult: The result.
+    """
+    with engine.begin() as connection, _transaction_limits(
+        connection, read_only, timeout_ms
+    ):
+        cursor = connection.execution_options(
+            stream_results=True, max_row_buffer=fetch_size
+        ).execute(text(query), params or {})
+        return _collect(cursor, max_rows, fetch_size)
+
+
+async def aexecute_query(
+    engine: AsyncEngine,
+    query: str,
+    params: Optional[Dict[str, Any]] = None,
+    max_rows: Optional[int] = None,
+    fetch_size: int = DEFAULT_FETCH_SIZE,
+    read_only: bool = False,
+    timeout_ms: Optional[int] = None,
+) -> QueryResult:
+    """
+    Asynchronously execute a query in its own transaction and return typed rows.
+
+    Args:
+        engine (AsyncEngine): The async database engine.
+        query (str): The SQL statement.
+        params (Dict[str, Any]): Bound parameters of the statement.
+        max_rows (int): The maximum number of rows fetched, None for all.
+        fetch_size (int): The number of rows fetched per round trip.
+        read_only (bool): Runs the statement in a read-only transaction.
+        timeout_ms (int): Cancels the statement after this many milliseconds.
+            Only supported on Postgres.
+
+    Returns:
+        QueryResult: The result.
+    """
+    async with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            for statement in _postgres_limits(read_only, timeout_ms):
+                await connection.exec_driver_sql(statement)
+        elif engine.dialect.name == "sqlite" and read_only:
+            await connection.exec_driver_sql("PRAGMA query_only = ON")
+        try:
+            return await _acollect(connection, query, params, max_rows, fetch_size)
+        finally:
+            if engine.dialect.name == "sqlite" and read_only:
+                await connection.exec_driver_sql("PRAGMA query_only = OFF")
+
+
+async def _acollect(connection, query, params, max_rows, fetch_size) -> QueryResult:
+    cursor = await connection.stream(text(query), params or {})
+    if not cursor.returns_rows:
+        return QueryResult([], [], rowcount=cursor.rowcount)
+
+    columns = list(cursor.keys())
+    rows: List[Tuple] = []
+    truncated = False
+    while True:
+        batch = await cursor.fetchmany(fetch_size)
+        if not batch:
+            break
+        rows.extend(tuple(row) for row in batch)
+        if max_rows is not None and len(rows) > max_rows:
+            truncated = True
+            del rows[max_rows:]
+            break
+    await cursor.close()
+    return QueryResult(columns, rows, truncated=truncated)
+
+
+def _postgres_limits(read_only: bool, timeout_ms: Optional[int]) -> List[str]:
+    # Both only last until the end of the transaction
+    statements = []
+    if read_only:
+        statements.append("SET TRANSACTION READ ONLY")
+    if timeout_ms:
+        statements.append(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+    return statements
+
+
+@contextmanager
+def _transaction_limits(connection, read_only: bool, timeout_ms: Optional[int]):
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in _postgres_limits(read_only, timeout_ms):
+            connection.exec_driver_sql(statement)
+        yield
+        return
+    if dialect != "sqlite":
+        yield
+        return
+
+    # SQLite has no statement timeout, interrupt the statement from its progress handler
+    driver_connection = connection.connection.driver_connection
+    if read_only:
+        connection.exec_driver_sql("PRAGMA query_only = ON")
+    if timeout_ms:
+        deadline = time.monotonic() + timeout_ms / 1000
+        driver_connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+    try:
+        yield
+    finally:
+        if timeout_ms:
+            driver_connection.set_progress_handler(None, 1000)
+        if read_only:
+            connection.exec_driver_sql("PRAGMA query_only = OFF")
+
+
+def _collect(cursor, max_rows: Optional[int], fetch_size: int) -> QueryResult:
+    if not cursor.returns_rows:
+        return QueryResult([], [], rowcount=cursor.rowcount)
+
+    columns = list(cursor.keys())
+    rows: List[Tuple] = []
+    truncated = False
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
+            break
+        rows.extend(tuple(row) for row in batch)
+        if max_rows is not None and len(rows) > max_rows:
+            truncated = True
+            del rows[max_rows:]
+            break
+    cursor.close()
+    return QueryResult(columns, rows, truncated=truncated)
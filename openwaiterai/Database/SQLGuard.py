@@ -0,0 +1,329 @@
+import os
+import json
+from typing import Dict, Iterable, List, Union
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .QueryExecutor import QueryResult, aexecute_query, execute_query
+from .SQLNormalizer import WRITE_KEYWORDS, Token, is_read_only, statements, tokenize
+
+DEFAULT_WRITABLE_TABLES = "waitercalls"
+
+# Functions that reach outside the query: the file system, other backends, settings
+BLOCKED_FUNCTIONS = {
+    "pg_sleep",
+    "pg_sleep_for",
+    "pg_sleep_until",
+    "pg_read_file",
+    "pg_read_binary_file",
+    "pg_ls_dir",
+    "pg_stat_file",
+    "pg_terminate_backend",
+    "pg_cancel_backend",
+    "pg_reload_conf",
+    "pg_rotate_logfile",
+    "set_config",
+    "lo_import",
+    "lo_export",
+    "dblink",
+    "dblink_exec",
+    "pg_advisory_lock",
+    "pg_advisory_xact_lock",
+    "load_extension",
+}
+
+
+class SQLGuardError(ValueError):
+    """
+    A rejected or failed statement, with a code and a hint the model can act on.
+    """
+
+    def __init__(self, code: str, message: str, hint: str = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.hint = hint
+
+    def to_dict(self) -> Dict[str, str]:
+        error = {"error": self.code, "message": self.message}
+        if self.hint:
+            error["hint"] = self.hint
+        return error
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+class GuardedStatement:
+    """
+    A statement that passed the guard, possibly rewritten.
+    """
+
+    def __init__(self, sql: str, read_only: bool, limit_injected: bool = False):
+        """
+        Args:
+            sql (str): The statement to execute.
+            read_only (bool): True if the statement only reads data.
+            limit_injected (bool): True if a LIMIT was appended to the statement.
+        """
+        self.sql = sql
+        self.read_only = read_only
+        self.limit_injected = limit_injected
+
+
+class SQLGuard:
+    """
+    Checks model-written SQL before it reaches the database.
+
+    - Exactly one statement is allowed.
+    - Reads (``SELECT``, ``WITH``, ``VALUES``, ``TABLE``) run in a read-only
+      transaction with a statement timeout, and get a ``LIMIT`` when they have
+      none at the top level.
+    - Writes are limited to single ``INSERT`` statements into the writable
+      tables, which the system instructions use to call a waiter. Orders are
+      written by SetOrderSlipTool. Everything else, including DDL, is rejected.
+    - Functions that sleep, read files or touch other backends are rejected.
+
+    Rejections raise ``SQLGuardError`` with a code and a hint the model can
+    use to correct the statement.
+
+    The following environment variables are used:
+    - OPENWAITERAI_SQL_TIMEOUT_MS: The statement timeout in milliseconds, 0 for none.
+    - OPENWAITERAI_SQL_WRITABLE_TABLES: Comma separated tables that accept INSERTs, empty for none.
+    - OPENWAITERAI_SQL_MAX_LENGTH: The maximum length of a statement in characters.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = 100,
+        timeout_ms: int = None,
+        writable_tables: Iterable[str] = None,
+        max_length: int = None,
+    ):
+        """
+        Args:
+            max_rows (int): The maximum number of rows a read returns.
+            timeout_ms (int): The statement timeout in milliseconds, 0 for none.
+            writable_tables (Iterable[str]): The tables that accept INSERTs.
+            max_length (int): The maximum length of a statement in characters.
+        """
+        if timeout_ms is None:
+            timeout_ms = int(os.getenv("OPENWAITERAI_SQL_TIMEOUT_MS", "5000"))
+        if writable_tables is None:
+            writable_tables = os.getenv(
+                "OPENWAITERAI_SQL_WRITABLE_TABLES", DEFAULT_WRITABLE_TABLES
+            ).split(",")
+        if max_length is None:
+            max_length = int(os.getenv("OPENWAITERAI_SQL_MAX_LENGTH", "10000"))
+
+        self.max_rows = max_rows
+        self.timeout_ms = timeout_ms
+        self.writable_tables = {
+            table.strip().lower() for table in writable_tables if table.strip()
+        }
+        self.max_length = max_length
+
+    def check(self, sql: str) -> GuardedStatement:
+        """
+        Check a statement and return it ready for execution.
+
+        Args:
+            sql (str): The model-written statement.
+
+        Returns:
+            GuardedStatement: The statement to execute.
+
+        Raises:
+            SQLGuardError: If the statement is rejected.
+        """
+        if len(sql) > self.max_length:
+            raise SQLGuardError(
+                "query_too_long",
+                f"The query has {len(sql)} characters, the limit is {self.max_length}.",
+                "Write a shorter query that selects only the columns and rows you need.",
+            )
+        try:
+            parsed = statements(tokenize(sql))
+        except ValueError as e:
+            raise SQLGuardError(
+                "parse_error", str(e), "Check quotes and comments of the query."
+            ) from None
+        if not parsed:
+            raise SQLGuardError("empty_query", "The query is empty.")
+        if len(parsed) > 1:
+            raise SQLGuardError(
+                "multiple_statements",
+                f"The query contains {len(parsed)} statements.",
+                "Send one statement per tool call.",
+            )
+
+        tokens = parsed[0]
+        blocked = sorted(
+            {
+                token.value
+                for index, token in enumerate(tokens)
+                if token.kind == "word"
+                and token.value in BLOCKED_FUNCTIONS
+                and index + 1 < len(tokens)
+                and tokens[index + 1].value == "("
+            }
+        )
+        if blocked:
+            raise SQLGuardError(
+                "function_not_allowed",
+                f"The query calls {', '.join(blocked)}, which is not allowed.",
+            )
+
+        first = tokens[0].value
+        if first in ("select", "with", "values", "table"):
+            if not is_read_only(sql):
+                raise SQLGuardError(
+                    "write_not_allowed",
+                    "The query modifies data or locks rows (data-modifying WITH, "
+                    "SELECT INTO or FOR UPDATE/SHARE).",
+                    "Use a plain SELECT to read data.",
+                )
+            return self._limit(sql, tokens)
+
+        if first == "insert":
+            return self._check_insert(sql, tokens)
+
+        raise SQLGuardError(
+            "statement_not_allowed",
+            f"{first.upper()} statements are not allowed.",
+            "Only SELECT queries and INSERTs into "
+            f"{', '.join(sorted(self.writable_tables)) or 'no table'} are allowed.",
+        )
+
+    def execute(self, engine: Engine, sql: Union[str, GuardedStatement]) -> QueryResult:
+        """
+        Check a statement and execute it within the guard's limits.
+
+        Args:
+            engine (Engine): The database engine.
+            sql (Union[str, GuardedStatement]): The model-written statement,
+                or a statement that already passed ``check``.
+
+        Returns:
+            QueryResult: The result, at most ``max_rows`` rows.
+
+        Raises:
+            SQLGuardError: If the statement is rejected, times out or fails.
+        """
+        statement = self.check(sql) if isinstance(sql, str) else sql
+        try:
+            return execute_query(
+                engine,
+                statement.sql,
+                max_rows=self.max_rows,
+                read_only=statement.read_only,
+                timeout_ms=self.timeout_ms,
+            )
+        except DBAPIError as e:
+            raise self.database_error(e) from e
+
+    async def aexecute(
+        self, engine: AsyncEngine, sql: Union[str, GuardedStatement]
+    ) -> QueryResult:
+        """
+        Asynchronously check a statement and execute it within the guard's limits.
+
+        Args:
+            engine (AsyncEngine): The async database engine.
+            sql (Union[str, GuardedStatement]): The model-written statement,
+                or a statement that already passed ``check``.
+
+        Returns:
+            QueryResult: The result, at most ``max_rows`` rows.
+
+        Raises:
+            SQLGuardError: If the statement is rejected, times out or fails.
+        """
+        statement = self.check(sql) if isinstance(sql, str) else sql
+        try:
+            return await aexecute_query(
+                engine,
+                statement.sql,
+                max_rows=self.max_rows,
+                read_only=statement.read_only,
+                timeout_ms=self.timeout_ms,
+            )
+        except DBAPIError as e:
+            raise self.database_error(e) from e
+
+    def database_error(self, error: DBAPIError) -> SQLGuardError:
+        """
+        Convert a database error into a structured error.
+        """
+        message = str(error.orig).strip().splitlines()[0] if error.orig else str(error)
+        lowered = message.lower()
+        if "statement timeout" in lowered or "interrupted" in lowered:
+            return SQLGuardError(
+                "statement_timeout",
+                f"The query was cancelled after {self.timeout_ms} ms.",
+                "Add conditions, join on keys and avoid cross joins.",
+            )
+        if "read-only" in lowered or "readonly" in lowered:
+            return SQLGuardError(
+                "write_not_allowed",
+                message,
+                "Use a plain SELECT to read data.",
+            )
+        return SQLGuardError(
+            "database_error",
+            message,
+            "Check table and column names against the schema.",
+        )
+
+    def _limit(self, sql: str, tokens: List[Token]) -> GuardedStatement:
+        depth = 0
+        for token in tokens:
+            if token.value == "(":
+                depth += 1
+            elif token.value == ")":
+                depth -= 1
+            elif depth == 0 and token.value in ("limit", "fetch"):
+                return GuardedStatement(sql, read_only=True)
+
+        # One row more than returned, so truncated results are detected. The
+        # newline keeps the LIMIT out of a trailing line comment.
+        statement = sql.strip().rstrip(";").rstrip()
+        return GuardedStatement(
+            f"{statement}\nLIMIT {self.max_rows + 1}", read_only=True, limit_injected=True
+        )
+
+    def _check_insert(self, sql: str, tokens: List[Token]) -> GuardedStatement:
+        if len(tokens) < 3 or tokens[1].value != "into" or tokens[2].kind not in ("word", "quoted"):
+            raise SQLGuardError("parse_error", "Expected INSERT INTO <table>.")
+
+        index = 2
+        while index + 2 < len(tokens) and tokens[index + 1].value == ".":
+            index += 2
+        table = tokens[index].value
+        if tokens[index].kind == "quoted":
+            table = table[1:-1].replace('""', '"')
+        table = table.lower()
+
+        if table not in self.writable_tables:
+            raise SQLGuardError(
+                "write_not_allowed",
+                f"INSERT into {table} is not allowed.",
+                "INSERTs are only allowed into "
+                f"{', '.join(sorted(self.writable_tables)) or 'no table'}.",
+            )
+        other_writes = sorted(
+            {
+                token.value
+                for token in tokens[1:]
+                if token.kind == "word" and token.value in WRITE_KEYWORDS
+            }
+        )
+        if other_writes:
+            raise SQLGuardError(
+                "write_not_allowed",
+                f"The INSERT also contains {', '.join(word.upper() for word in other_writes)}.",
+                "Send a plain INSERT ... VALUES (...) statement.",
+            )
+        return GuardedStatement(sql, read_only=False)
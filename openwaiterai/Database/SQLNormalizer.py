@@ -0,0 +1,318 @@
+import re
+from typing import List, NamedTuple, Optional, Set
+
+# Keywords that make a statement, or a data-modifying CTE inside it, write
+WRITE_KEYWORDS = {
+    "insert",
+    "update",
+    "delete",
+    "merge",
+    "create",
+    "alter",
+    "drop",
+    "truncate",
+    "grant",
+    "revoke",
+    "copy",
+    "lock",
+}
+
+# Functions whose result changes between calls
+VOLATILE_FUNCTIONS = {
+    "now",
+    "random",
+    "current_date",
+    "current_time",
+    "current_timestamp",
+    "localtime",
+    "localtimestamp",
+    "clock_timestamp",
+    "statement_timestamp",
+    "transaction_timestamp",
+    "timeofday",
+    "nextval",
+    "currval",
+    "setval",
+    "gen_random_uuid",
+    "uuid_generate_v4",
+    "pg_sleep",
+}
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<quoted>"(?:[^"]|"")*")
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+    | (?P<param>[:$]\w+|%\(\w+\)s|\?)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<operator>::|<>|!=|<=|>=|\|\||[-+*/%<>=~!@#^&|`,;().\[\]{}])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+# Clauses that end the table list of a FROM clause
+_FROM_END_WORDS = {
+    "where",
+    "group",
+    "order",
+    "having",
+    "limit",
+    "offset",
+    "union",
+    "intersect",
+    "except",
+    "window",
+    "for",
+    "returning",
+    "fetch",
+    "set",
+    "values",
+    "select",
+}
+
+
+class Token(NamedTuple):
+    kind: str
+    value: str
+
+
+def tokenize(sql: str) -> List[Token]:
+    """
+    Split an SQL statement into tokens, dropping whitespace and comments.
+
+    Unquoted words are lowercased, string literals and quoted identifiers are
+    kept as written.
+
+    Args:
+        sql (str): The SQL statement.
+
+    Returns:
+        List[Token]: The tokens.
+
+    Raises:
+        ValueError: If the statement contains an unterminated literal or an
+        unknown character.
+    """
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            raise ValueError(f"Cannot parse SQL at position {position}: {sql[position:position + 20]!r}")
+        kind = match.lastgroup
+        value = match.group()
+        position = match.end()
+        if kind in ("space", "comment"):
+            continue
+        if kind == "word":
+            value = value.lower()
+        tokens.append(Token(kind, value))
+    return tokens
+
+
+def statements(tokens: List[Token]) -> List[List[Token]]:
+    """
+    Split tokens into statements on ``;``, dropping empty statements.
+    """
+    result: List[List[Token]] = [[]]
+    for token in tokens:
+        if token.value == ";":
+            result.append([])
+        else:
+            result[-1].append(token)
+    return [statement for statement in result if statement]
+
+
+def _is_literal(token: Token) -> bool:
+    return token.kind in ("string", "number")
+
+
+def _sort_literal_lists(tokens: List[Token]) -> List[Token]:
+    # "IN (3, 1, 2)" and "IN (1, 2, 3)" select the same rows
+    result: List[Token] = []
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        result.append(token)
+        index += 1
+        if token.value != "in" or index >= len(tokens) or tokens[index].value != "(":
+            continue
+
+        end = index + 1
+        literals = []
+        while end < len(tokens) and _is_literal(tokens[end]):
+            literals.append(tokens[end])
+            if end + 1 < len(tokens) and tokens[end + 1].value == ",":
+                end += 2
+                continue
+            end += 1
+            break
+        if literals and end < len(tokens) and tokens[end].value == ")":
+            ordered = sorted(
+                set(literals),
+                key=lambda literal: (
+                    literal.kind,
+                    float(literal.value) if literal.kind == "number" else 0,
+                    literal.value,
+                ),
+            )
+            result.append(tokens[index])
+            for position, literal in enumerate(ordered):
+                if position:
+                    result.append(Token("operator", ","))
+                result.append(literal)
+            result.append(tokens[end])
+            index = end + 1
+    return result
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Return a canonical form of an SQL statement.
+
+    Whitespace, comments, keyword and identifier case, trailing semicolons and
+    the order of literal ``IN`` lists do not change the canonical form, so
+    statements that only differ in those produce the same result.
+
+    Args:
+        sql (str): The SQL statement.
+
+    Returns:
+        str: The canonical form.
+    """
+    parts = []
+    for statement in statements(tokenize(sql)):
+        parts.append(" ".join(token.value for token in _sort_literal_lists(statement)))
+    return "; ".join(parts)
+
+
+def is_read_only(sql: str) -> bool:
+    """
+    Return True if an SQL text is a single statement that only reads data.
+
+    Args:
+        sql (str): The SQL text.
+
+    Returns:
+        bool: True for a single ``SELECT`` (or ``WITH ... SELECT``) without
+        data-modifying clauses or row locks.
+    """
+    try:
+        parsed = statements(tokenize(sql))
+    except ValueError:
+        return False
+    if len(parsed) != 1:
+        return False
+
+    tokens = parsed[0]
+    if tokens[0].value not in ("select", "with", "values", "table"):
+        return False
+
+    words = [token.value for token in tokens if token.kind == "word"]
+    if any(word in WRITE_KEYWORDS for word in words):
+        return False
+    # SELECT ... INTO creates a table, FOR UPDATE/SHARE takes row locks
+    if "into" in words:
+        return False
+    for index, word in enumerate(words[:-1]):
+        if word == "for" and words[index + 1] in ("update", "share", "no", "key"):
+            return False
+    return True
+
+
+def calls_volatile_function(sql: str) -> bool:
+    """
+    Return True if an SQL text calls a function whose result changes between calls.
+    """
+    try:
+        tokens = tokenize(sql)
+    except ValueError:
+        return True
+    return any(token.kind == "word" and token.value in VOLATILE_FUNCTIONS for token in tokens)
+
+
+def referenced_tables(sql: str) -> Optional[Set[str]]:
+    """
+    Return the tables an SQL text reads from or writes to.
+
+    Tables are collected after ``FROM``, ``JOIN``, ``INTO``, ``UPDATE`` and
+    ``TABLE``, without schema and in lower case. Names of common table
+    expressions are not included. The result errs on the side of too many
+    names, e.g. the column of ``EXTRACT(YEAR FROM column)`` is reported as a table.
+
+    Args:
+        sql (str): The SQL text.
+
+    Returns:
+        Optional[Set[str]]: The referenced tables, or None if the text could
+        not be parsed.
+    """
+    try:
+        tokens = tokenize(sql)
+    except ValueError:
+        return None
+
+    def name_at(index: int) -> str:
+        # The unqualified name of a possibly schema qualified table
+        name = tokens[index]
+        while (
+            index + 2 < len(tokens)
+            and tokens[index + 1].value == "."
+            and tokens[index + 2].kind in ("word", "quoted")
+        ):
+            index += 2
+            name = tokens[index]
+        if name.kind == "quoted":
+            return name.value[1:-1].replace('""', '"').lower()
+        return name.value
+
+    tables: Set[str] = set()
+    ctes: Set[str] = set()
+    from_depths: Set[int] = set()
+    depth = 0
+    expect_table = False
+    for index, token in enumerate(tokens):
+        value = token.value
+        if value == "(":
+            depth += 1
+            expect_table = False
+            continue
+        if value == ")":
+            from_depths.discard(depth)
+            depth -= 1
+            expect_table = False
+            continue
+
+        if expect_table:
+            expect_table = value in ("only", "lateral")
+            if not expect_table and token.kind in ("word", "quoted"):
+                tables.add(name_at(index))
+            continue
+
+        if value == "," and depth in from_depths:
+            # Every comma of a FROM clause starts another table
+            expect_table = True
+        elif token.kind != "word":
+            continue
+        elif value in ("from", "join", "using"):
+            from_depths.add(depth)
+            expect_table = True
+        elif value in ("into", "update", "table"):
+            expect_table = True
+        elif value in _FROM_END_WORDS:
+            from_depths.discard(depth)
+        elif (
+            # "WITH name AS (" and ", name AS (" define common table expressions
+            value == "as"
+            and index > 1
+            and index + 1 < len(tokens)
+            and tokens[index + 1].value == "("
+            and tokens[index - 1].kind in ("word", "quoted")
+            and tokens[index - 2].value in ("with", ",", "recursive")
+        ):
+            ctes.add(name_at(index - 1))
+
+    return tables - ctes
@@ -0,0 +1,10 @@
+from .EngineRegistry import (
+    EngineRegistry,
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    PoolMetrics,
+    build_connection_string,
+    to_async_url,
+)
+from .QueryExecutor import QueryResult, aexecute_query, execute_query, format_value
+from .PreparedStatement import PreparedStatement
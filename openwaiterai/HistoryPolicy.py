@@ -0,0 +1,325 @@
+import os
+import json
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from .OrderSlip import OrderSlip
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the earlier part of a conversation between restaurant guests and "
+    "their virtual waiter in a few short sentences. Keep guest preferences, "
+    "allergies, dietary needs, open questions and anything promised to the guests. "
+    "Do not list the order slip, it is provided separately."
+)
+
+
+def approximate_token_count(messages: Sequence[BaseMessage]) -> int:
+    """
+    Estimate the prompt tokens of messages, about four characters per token.
+
+    Args:
+        messages (Sequence[BaseMessage]): The messages.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    tokens = 0
+    for message in messages:
+        tokens += 4 + len(str(message.content)) // 4
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            tokens += 4 + len(str(tool_call.get("args"))) // 4
+    return tokens
+
+
+class HistoryReport:
+    """
+    Token accounting of the prompt of one model call.
+    """
+
+    def __init__(
+        self,
+        tokens_before: int,
+        tokens_after: int,
+        messages_before: int,
+        messages_after: int,
+        compacted_tool_messages: int = 0,
+        summarized_messages: int = 0,
+        prompt_bytes: int = 0,
+        shared_prefix_bytes: int = 0,
+    ):
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.messages_before = messages_before
+        self.messages_after = messages_after
+        self.compacted_tool_messages = compacted_tool_messages
+        self.summarized_messages = summarized_messages
+        self.prompt_bytes = prompt_bytes
+        self.shared_prefix_bytes = shared_prefix_bytes
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "messages_before": self.messages_before,
+            "messages_after": self.messages_after,
+            "compacted_tool_messages": self.compacted_tool_messages,
+            "summarized_messages": self.summarized_messages,
+            "prompt_bytes": self.prompt_bytes,
+            "shared_prefix_bytes": self.shared_prefix_bytes,
+        }
+
+    def __repr__(self) -> str:
+        return f"HistoryReport({self.to_dict()})"
+
+
+class HistoryPolicy:
+    """
+    Shapes the prompt sent to the model so its size stays flat over long meals.
+
+    The stored history is never modified, the policy only decides what the
+    model sees on each call:
+    - The SystemMessage is always kept.
+    - Whole turns (a guest message and everything after it) are kept from the
+      newest backwards, within a message window and a token budget. The
+      current turn is always kept.
+    - ToolMessages older than ``keep_tool_turns`` turns are truncated.
+    - The current order slip is pinned before the current turn unless a
+      complete rendering of it (a ``show`` result) is still in the window.
+      Tool results only describe changes, so earlier lines are not visible
+      otherwise.
+    - Optionally, dropped turns are folded into a rolling summary.
+
+    The following environment variables are used:
+    - OPENWAITERAI_HISTORY_TOKEN_BUDGET: The estimated prompt tokens per call, 0 for no limit.
+    - OPENWAITERAI_HISTORY_WINDOW: The maximum number of history messages per call, 0 for no limit.
+    - OPENWAITERAI_TOOL_MESSAGE_CHARS: The characters kept of old ToolMessages.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = None,
+        window: int = None,
+        tool_message_chars: int = None,
+        keep_tool_turns: int = 2,
+        summarizer: BaseChatModel = None,
+        summary_chunk: int = 6,
+        token_counter: Callable[[Sequence[BaseMessage]], int] = None,
+        order_slip_tool: str = "SetOrderSlipTool",
+        debug: bool = False,
+    ):
+        """
+        Args:
+            token_budget (int): The estimated prompt tokens per call, 0 for no limit.
+            window (int): The maximum number of history messages per call, 0 for no limit.
+            tool_message_chars (int): The characters kept of old ToolMessages.
+            keep_tool_turns (int): The number of recent turns whose ToolMessages
+                are kept in full.
+            summarizer (BaseChatModel): A chat model used to summarize dropped
+                turns. Summarization is disabled when None.
+            summary_chunk (int): The number of newly dropped messages that
+                triggers a summary update.
+            token_counter (Callable): Counts the tokens of a list of messages.
+                Defaults to a character based estimate.
+            order_slip_tool (str): The name of the tool that sets the order slip.
+            debug (bool): Enables debug logging.
+        """
+        self.debug = debug
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        if token_budget is None:
+            token_budget = int(os.getenv("OPENWAITERAI_HISTORY_TOKEN_BUDGET", "12000"))
+        if window is None:
+            window = int(os.getenv("OPENWAITERAI_HISTORY_WINDOW", "40"))
+        if tool_message_chars is None:
+            tool_message_chars = int(os.getenv("OPENWAITERAI_TOOL_MESSAGE_CHARS", "600"))
+
+        self.token_budget = token_budget
+        self.window = window
+        self.tool_message_chars = tool_message_chars
+        self.keep_tool_turns = keep_tool_turns
+        self.summarizer = summarizer
+        self.summary_chunk = summary_chunk
+        self.token_counter = token_counter or approximate_token_count
+        self.order_slip_tool = order_slip_tool
+
+    def apply(
+        self,
+        messages: List[BaseMessage],
+        order_slip: Optional[OrderSlip] = None,
+        state: Optional[Dict] = None,
+    ):
+        """
+        Build the prompt of one model call.
+
+        Args:
+            messages (List[BaseMessage]): The stored history plus the new input.
+            order_slip (OrderSlip): The current order slip of the session.
+            state (Dict): Per-session state of the policy, e.g. the rolling summary.
+
+        Returns:
+            Tuple[List[BaseMessage], HistoryReport]: The prompt and its report.
+        """
+        state = state if state is not None else {}
+        tokens_before = self.token_counter(messages)
+
+        system = [messages[0]] if messages and isinstance(messages[0], SystemMessage) else []
+        turns = self._split_turns(messages[len(system) :])
+
+        # Compact the tool results of older turns
+        compacted = 0
+        for index in range(max(len(turns) - self.keep_tool_turns, 0)):
+            turns[index], count = self._compact_turn(turns[index])
+            compacted += count
+
+        # Keep whole turns from the newest backwards
+        kept: List[List[BaseMessage]] = []
+        kept_messages = 0
+        kept_tokens = self.token_counter(system)
+        for turn in reversed(turns):
+            turn_tokens = self.token_counter(turn)
+            if kept and (
+                (self.window and kept_messages + len(turn) > self.window)
+                or (self.token_budget and kept_tokens + turn_tokens > self.token_budget)
+            ):
+                break
+            kept.insert(0, turn)
+            kept_messages += len(turn)
+            kept_tokens += turn_tokens
+
+        dropped = [message for turn in turns[: len(turns) - len(kept)] for message in turn]
+        prompt = list(system)
+
+        # Fold dropped turns into a rolling summary
+        summarized = 0
+        if dropped and self.summarizer is not None:
+            summary = self._update_summary(dropped, state)
+            if summary:
+                summarized = state.get("summarized_messages", 0)
+                prompt.append(
+                    SystemMessage(f"Summary of the earlier conversation: {summary}")
+                )
+
+        for turn in kept[:-1]:
+            prompt.extend(turn)
+
+        # Pin the order slip unless its complete rendering is still visible. It
+        # goes right before the current turn so the prefix before it stays cacheable.
+        if order_slip and not self._shows_order_slip(
+            [message for turn in kept for message in turn]
+        ):
+            prompt.append(SystemMessage(f"Current order slip: {order_slip.render()}"))
+
+        if kept:
+            prompt.extend(kept[-1])
+
+        report = HistoryReport(
+            tokens_before=tokens_before,
+            tokens_after=self.token_counter(prompt),
+            messages_before=len(messages),
+            messages_after=len(prompt),
+            compacted_tool_messages=compacted,
+            summarized_messages=summarized,
+        )
+        if self.debug:
+            self.logger.debug(f"History policy: {report}")
+        return prompt, report
+
+    def _split_turns(self, messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+        # A turn starts at a guest message, so ToolMessages never lose their AIMessage
+        turns: List[List[BaseMessage]] = []
+        for message in messages:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return turns
+
+    def _compact_turn(self, turn: List[BaseMessage]):
+        compacted = 0
+        result = []
+        for message in turn:
+            content = message.content
+            if (
+                isinstance(message, ToolMessage)
+                and isinstance(content, str)
+                and len(content) > self.tool_message_chars
+            ):
+                omitted = len(content) - self.tool_message_chars
+                message = message.model_copy(
+                    update={
+                        "content": content[: self.tool_message_chars]
+                        + f"... [{omitted} characters omitted]"
+                    }
+                )
+                compacted += 1
+            result.append(message)
+        return result, compacted
+
+    def _shows_order_slip(self, messages: Sequence[BaseMessage]) -> bool:
+        # Whether the last successful order slip result renders the whole slip
+        call_ids = {
+            tool_call["id"]
+            for message in messages
+            if isinstance(message, AIMessage)
+            for tool_call in message.tool_calls
+            if tool_call["name"] == self.order_slip_tool
+        }
+        for message in reversed(messages):
+            if not isinstance(message, ToolMessage) or message.tool_call_id not in call_ids:
+                continue
+            try:
+                result = json.loads(message.content)
+            except (TypeError, ValueError):
+                # Truncated or not JSON
+                return False
+            if isinstance(result, dict) and "error" not in result:
+                return "order_slip" in result
+        return False
+
+    def _update_summary(self, dropped: List[BaseMessage], state: Dict) -> str:
+        summary = state.get("summary", "")
+        summarized = state.get("summarized_messages", 0)
+        if len(dropped) - summarized < self.summary_chunk:
+            return summary
+
+        transcript = "\n".join(
+            self._render(message) for message in dropped[summarized:]
+        )
+        if summary:
+            transcript = f"Earlier summary: {summary}\n\n{transcript}"
+        try:
+            response = self.summarizer.invoke(
+                [SystemMessage(SUMMARY_INSTRUCTIONS), HumanMessage(transcript)]
+            )
+        except Exception as e:
+            self.logger.error("Failed to summarize history", exc_info=e)
+            return summary
+
+        state["summary"] = str(response.content).strip()
+        state["summarized_messages"] = len(dropped)
+        return state["summary"]
+
+    def _render(self, message: BaseMessage) -> str:
+        if isinstance(message, HumanMessage):
+            return f"Guest: {message.content}"
+        if isinstance(message, ToolMessage):
+            return f"Tool {message.name}: {str(message.content)[: self.tool_message_chars]}"
+        if isinstance(message, AIMessage) and message.tool_calls and not message.content:
+            names = ", ".join(tool_call["name"] for tool_call in message.tool_calls)
+            return f"Waiter used {names}"
+        return f"Waiter: {message.content}"
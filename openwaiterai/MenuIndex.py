@@ -0,0 +1,281 @@
+import math
+from array import array
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.engine import Engine
+
+from .Database import execute_query
+
+NUTRIENTS = [
+    "calories",
+    "protein",
+    "carbohydrates",
+    "fats",
+    "saturated_fats",
+    "sugar",
+    "salt",
+    "fiber",
+]
+
+ITEMS_SQL = """
+    SELECT m.id, m.name, m.category_id, c.name
+    FROM menuitems m
+    LEFT JOIN categories c ON c.id = m.category_id
+    ORDER BY m.id
+"""
+ALLERGENS_SQL = "SELECT id, name FROM allergens ORDER BY id"
+ITEM_ALLERGENS_SQL = "SELECT menu_item_id, allergen_id FROM menuitemallergens"
+INGREDIENTS_SQL = "SELECT id, name FROM ingredients ORDER BY id"
+ITEM_INGREDIENTS_SQL = "SELECT menu_item_id, ingredient_id FROM menuitemingredients"
+NUTRITION_SQL = f"SELECT menu_item_id, {', '.join(NUTRIENTS)} FROM nutritionalvalues"
+
+
+class Vocabulary:
+    """
+    Maps the names of allergens or ingredients to bit positions.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str]]):
+        """
+        Args:
+            rows (Iterable[Tuple[int, str]]): The ID and name of every entry.
+        """
+        self.names: List[str] = []
+        self.bit_by_id: Dict[int, int] = {}
+        self.bit_by_name: Dict[str, int] = {}
+        for entry_id, name in rows:
+            self.bit_by_id[entry_id] = len(self.names)
+            self.bit_by_name[str(name).strip().lower()] = len(self.names)
+            self.names.append(str(name))
+
+    def resolve(self, names: Sequence[str]) -> Tuple[List[int], List[str], List[str]]:
+        """
+        Resolve names to bitmasks.
+
+        A name matches an entry exactly, ignoring case, or otherwise every
+        entry that contains it, so "nut" matches "Peanuts" and "Tree nuts".
+
+        Args:
+            names (Sequence[str]): The names to resolve.
+
+        Returns:
+            Tuple[List[int], List[str], List[str]]: One mask per known name,
+            the matched entry names and the names that matched nothing.
+        """
+        masks: List[int] = []
+        matched: List[str] = []
+        unknown: List[str] = []
+        for name in names:
+            key = name.strip().lower()
+            bits = (
+                [self.bit_by_name[key]]
+                if key in self.bit_by_name
+                else [bit for entry, bit in self.bit_by_name.items() if key and key in entry]
+            )
+            if not bits:
+                unknown.append(name)
+                continue
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+                matched.append(self.names[bit])
+            masks.append(mask)
+        return masks, matched, unknown
+
+    def decode(self, mask: int) -> List[str]:
+        """
+        Return the names of the bits set in a mask.
+        """
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+
+
+class MenuIndex:
+    """
+    In-memory index of the menu for allergen, ingredient and nutrition lookups.
+
+    Every menu item has a position. Allergens and ingredients are stored as
+    one bitmask per item, nutritional values as one float array per nutrient
+    (NaN when unknown), so a filter over the whole menu is a few integer and
+    float comparisons per item instead of a multi-table join.
+    """
+
+    def __init__(
+        self,
+        items: Iterable[Tuple[int, str, Optional[int], Optional[str]]],
+        allergens: Iterable[Tuple[int, str]] = (),
+        item_allergens: Iterable[Tuple[int, int]] = (),
+        ingredients: Iterable[Tuple[int, str]] = (),
+        item_ingredients: Iterable[Tuple[int, int]] = (),
+        nutrition: Iterable[Sequence] = (),
+        version: Hashable = None,
+    ):
+        """
+        Args:
+            items: ``(id, name, category_id, category_name)`` of every menu item.
+            allergens: ``(id, name)`` of every allergen.
+            item_allergens: ``(menu_item_id, allergen_id)`` pairs.
+            ingredients: ``(id, name)`` of every ingredient.
+            item_ingredients: ``(menu_item_id, ingredient_id)`` pairs.
+            nutrition: ``(menu_item_id, *NUTRIENTS)`` rows.
+            version (Hashable): The menu version the index was built from.
+        """
+        self.version = version
+        self.item_ids = array("q")
+        self.names: List[str] = []
+        self.category_ids = array("q")
+        self.category_names: List[str] = []
+        for item_id, name, category_id, category_name in items:
+            self.item_ids.append(item_id)
+            self.names.append(str(name))
+            self.category_ids.append(category_id if category_id is not None else -1)
+            self.category_names.append(str(category_name) if category_name is not None else "")
+        self.position: Dict[int, int] = {
+            item_id: position for position, item_id in enumerate(self.item_ids)
+        }
+
+        self.allergens = Vocabulary(allergens)
+        self.allergen_masks = self._masks(item_allergens, self.allergens)
+        self.ingredients = Vocabulary(ingredients)
+        self.ingredient_masks = self._masks(item_ingredients, self.ingredients)
+
+        self.nutrition: Dict[str, array] = {
+            nutrient: array("d", [math.nan]) * len(self.item_ids) for nutrient in NUTRIENTS
+        }
+        for row in nutrition:
+            position = self.position.get(row[0])
+            if position is None:
+                continue
+            for nutrient, value in zip(NUTRIENTS, row[1:]):
+                if value is not None:
+                    self.nutrition[nutrient][position] = float(value)
+
+    @classmethod
+    def from_engine(cls, engine: Engine, version: Hashable = None) -> "MenuIndex":
+        """
+        Build the index from the menu tables of a database.
+
+        Args:
+            engine (Engine): The restaurant database engine.
+            version (Hashable): The current menu version.
+
+        Returns:
+            MenuIndex: The index.
+        """
+        return cls(
+            items=execute_query(engine, ITEMS_SQL).rows,
+            allergens=execute_query(engine, ALLERGENS_SQL).rows,
+            item_allergens=execute_query(engine, ITEM_ALLERGENS_SQL).rows,
+            ingredients=execute_query(engine, INGREDIENTS_SQL).rows,
+            item_ingredients=execute_query(engine, ITEM_INGREDIENTS_SQL).rows,
+            nutrition=execute_query(engine, NUTRITION_SQL).rows,
+            version=version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def search(
+        self,
+        exclude_allergens: int = 0,
+        include_ingredients: Sequence[int] = (),
+        exclude_ingredients: int = 0,
+        category: Optional[str] = None,
+        min_nutrients: Optional[Dict[str, float]] = None,
+        max_nutrients: Optional[Dict[str, float]] = None,
+    ) -> List[int]:
+        """
+        Return the positions of the items that pass every filter.
+
+        Args:
+            exclude_allergens (int): Items containing any of these allergen bits are dropped.
+            include_ingredients (Sequence[int]): Items must contain at least one
+                ingredient of every mask.
+            exclude_ingredients (int): Items containing any of these ingredient bits are dropped.
+            category (str): A category name or ID the items must belong to.
+            min_nutrients (Dict[str, float]): Lower bounds per nutrient.
+            max_nutrients (Dict[str, float]): Upper bounds per nutrient.
+
+        Returns:
+            List[int]: The matching positions, in menu order.
+        """
+        bounds = [
+            (self.nutrition[nutrient], low, math.inf)
+            for nutrient, low in (min_nutrients or {}).items()
+        ] + [
+            (self.nutrition[nutrient], -math.inf, high)
+            for nutrient, high in (max_nutrients or {}).items()
+        ]
+        category_id = None
+        if category is not None:
+            category = str(category).strip().lower()
+            category_id = int(category) if category.isdigit() else None
+
+        positions = []
+        allergen_masks = self.allergen_masks
+        ingredient_masks = self.ingredient_masks
+        for position in range(len(self.item_ids)):
+            if allergen_masks[position] & exclude_allergens:
+                continue
+            ingredient_mask = ingredient_masks[position]
+            if ingredient_mask & exclude_ingredients:
+                continue
+            if not all(ingredient_mask & mask for mask in include_ingredients):
+                continue
+            if category is not None and not (
+                self.category_ids[position] == category_id
+                or self.category_names[position].lower() == category
+            ):
+                continue
+            # NaN fails both comparisons, so unknown values never pass a bound
+            if not all(low <= values[position] <= high for values, low, high in bounds):
+                continue
+            positions.append(position)
+        return positions
+
+    def find_item(self, item: str) -> Optional[int]:
+        """
+        Return the position of an item by ID or name.
+
+        Args:
+            item (str): The ID, the exact name or part of the name of the item.
+
+        Returns:
+            Optional[int]: The position, or None if no item matches.
+        """
+        item = str(item).strip()
+        if item.isdigit() and int(item) in self.position:
+            return self.position[int(item)]
+        key = item.lower()
+        lowered = [name.lower() for name in self.names]
+        if key in lowered:
+            return lowered.index(key)
+        for position, name in enumerate(lowered):
+            if key and key in name:
+                return position
+        return None
+
+    def describe(self, position: int) -> Dict:
+        """
+        Return the category, allergens, ingredients and nutrition of one item.
+        """
+        return {
+            "id": self.item_ids[position],
+            "name": self.names[position],
+            "category": self.category_names[position],
+            "allergens": self.allergens.decode(self.allergen_masks[position]),
+            "ingredients": self.ingredients.decode(self.ingredient_masks[position]),
+            "nutrition": {
+                nutrient: values[position]
+                for nutrient, values in self.nutrition.items()
+                if not math.isnan(values[position])
+            },
+        }
+
+    def _masks(self, pairs: Iterable[Tuple[int, int]], vocabulary: Vocabulary) -> List[int]:
+        masks = [0] * len(self.item_ids)
+        for item_id, entry_id in pairs:
+            position = self.position.get(item_id)
+            bit = vocabulary.bit_by_id.get(entry_id)
+            if position is not None and bit is not None:
+                masks[position] |= 1 << bit
+        return masks
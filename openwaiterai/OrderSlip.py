@@ -0,0 +1,209 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .OrderStore import Lines, slip_checksum, slip_lines
+
+# Hex digits of the slip checksum shown to the model
+SHORT_CHECKSUM_LENGTH = 8
+
+
+class SlipLine:
+    """
+    One menu item on an order slip.
+    """
+
+    __slots__ = ("id", "name", "quantity", "notes")
+
+    def __init__(self, id: int, name: str, quantity: int, notes: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.quantity = quantity
+        self.notes = notes
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SlipLine):
+            return NotImplemented
+        return (self.id, self.name, self.quantity, self.notes) == (
+            other.id,
+            other.name,
+            other.quantity,
+            other.notes,
+        )
+
+    def __repr__(self) -> str:
+        return f"SlipLine(id={self.id}, name={self.name!r}, quantity={self.quantity}, notes={self.notes!r})"
+
+    def render(self, quantity: str = None) -> str:
+        text = f"{quantity or self.quantity} x {self.name} (id {self.id})"
+        return f"{text} [{self.notes}]" if self.notes else text
+
+
+class OrderSlip:
+    """
+    The order slip of a session, one line per menu item keyed by its id.
+
+    Lines keep the order in which their items were first added. The slip is
+    changed incrementally with ``add``, ``remove`` and ``update``, and
+    ``delta`` describes the changes between two slips in a few words per
+    changed line, so the model does not get the whole slip back on every
+    change.
+    """
+
+    __slots__ = ("_lines",)
+
+    def __init__(self, lines: Iterable[SlipLine] = ()):
+        self._lines: Dict[int, SlipLine] = {line.id: line for line in lines}
+
+    @classmethod
+    def from_orders(cls, order_slip: Iterable) -> "OrderSlip":
+        """
+        Build a slip from items with ``id``, ``name``, ``quantity`` and
+        optionally ``notes``, merging duplicate items and dropping removed ones.
+        """
+        lines, names = slip_lines(order_slip)
+        return cls.from_lines(lines, names)
+
+    @classmethod
+    def from_lines(cls, lines: Lines, names: Dict[int, str]) -> "OrderSlip":
+        """
+        Build a slip from (quantity, notes) lines and item names by menu item id.
+        """
+        return cls(
+            SlipLine(menu_item_id, names.get(menu_item_id, ""), quantity, notes)
+            for menu_item_id, (quantity, notes) in lines.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __iter__(self) -> Iterator[SlipLine]:
+        return iter(self._lines.values())
+
+    def __contains__(self, menu_item_id: int) -> bool:
+        return menu_item_id in self._lines
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, OrderSlip):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"OrderSlip({self.render()})"
+
+    def get(self, menu_item_id: int) -> Optional[SlipLine]:
+        return self._lines.get(menu_item_id)
+
+    def copy(self) -> "OrderSlip":
+        return OrderSlip(SlipLine(line.id, line.name, line.quantity, line.notes) for line in self)
+
+    @property
+    def items(self) -> int:
+        """
+        The number of ordered items, counting quantities.
+        """
+        return sum(line.quantity for line in self)
+
+    def lines(self) -> Lines:
+        """
+        Return the (quantity, notes) of every line by menu item id.
+        """
+        return {line.id: (line.quantity, line.notes) for line in self}
+
+    @property
+    def checksum(self) -> str:
+        """
+        A short checksum of the slip, the prefix of the one the order store keeps.
+        """
+        return slip_checksum(self.lines())[:SHORT_CHECKSUM_LENGTH]
+
+    def add(self, menu_item_id: int, name: str = None, quantity: int = None, notes: str = None):
+        """
+        Add items, to the existing line of the menu item if there is one.
+
+        Args:
+            menu_item_id (int): The menu item.
+            name (str): The item name, required for items not on the slip.
+            quantity (int): How many to add, 1 by default.
+            notes (str): Preparation notes, replace the notes of the line.
+
+        Raises:
+            ValueError: If the quantity is not positive or a new item has no name.
+        """
+        quantity = 1 if quantity is None else quantity
+        if quantity < 1:
+            raise ValueError(f"Cannot add {quantity} of item {menu_item_id}")
+        line = self._lines.get(menu_item_id)
+        if line is None:
+            if not name:
+                raise ValueError(f"Item {menu_item_id} is not on the slip, its name is required")
+            self._lines[menu_item_id] = SlipLine(menu_item_id, name, quantity, notes or None)
+            return
+        line.quantity += quantity
+        if notes:
+            line.notes = notes
+
+    def remove(self, menu_item_id: int, quantity: int = None):
+        """
+        Remove items, the whole line when no quantity is given or none are left.
+
+        Raises:
+            ValueError: If the item is not on the slip or the quantity is not positive.
+        """
+        line = self._lines.get(menu_item_id)
+        if line is None:
+            raise ValueError(f"Item {menu_item_id} is not on the slip")
+        if quantity is not None and quantity < 1:
+            raise ValueError(f"Cannot remove {quantity} of item {menu_item_id}")
+        if quantity is None or quantity >= line.quantity:
+            del self._lines[menu_item_id]
+        else:
+            line.quantity -= quantity
+
+    def update(self, menu_item_id: int, quantity: int = None, notes: str = None, name: str = None):
+        """
+        Set the quantity or the notes of a line, a quantity of 0 removes it.
+
+        Raises:
+            ValueError: If the item is not on the slip or the quantity is negative.
+        """
+        line = self._lines.get(menu_item_id)
+        if line is None:
+            raise ValueError(f"Item {menu_item_id} is not on the slip")
+        if quantity is not None:
+            if quantity < 0:
+                raise ValueError(f"Cannot set the quantity of item {menu_item_id} to {quantity}")
+            if quantity == 0:
+                del self._lines[menu_item_id]
+                return
+            line.quantity = quantity
+        if notes is not None:
+            line.notes = notes or None
+        if name:
+            line.name = name
+
+    def delta(self, other: "OrderSlip") -> List[str]:
+        """
+        Describe the changes that turn this slip into another one.
+
+        Args:
+            other (OrderSlip): The changed slip.
+
+        Returns:
+            List[str]: One entry per changed line, e.g. ``+1 x Cheesecake (id 5)``,
+            ``-2 x Lemonade (id 1)`` or ``1->2 x House Burger (id 3)``.
+        """
+        changes = [f"-{line.render()}" for line in self if line.id not in other]
+        for line in other:
+            before = self._lines.get(line.id)
+            if before is None:
+                changes.append(f"+{line.render()}")
+            elif before.quantity != line.quantity:
+                changes.append(line.render(f"{before.quantity}->{line.quantity}"))
+            elif before.notes != line.notes or before.name != line.name:
+                changes.append(line.render() if line.notes else f"{line.render()} [no notes]")
+        return changes
+
+    def render(self) -> str:
+        """
+        Render the slip as one compact line.
+        """
+        return "; ".join(line.render() for line in self) or "empty"
@@ -0,0 +1,435 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from .Database import PreparedStatement
+
+# A slip line: (quantity, notes) by menu item id
+Lines = Dict[int, Tuple[int, Optional[str]]]
+
+# SQLSTATE of a unique constraint violation
+UNIQUE_VIOLATION = "23505"
+
+metadata = MetaData()
+
+# The order of every session, the checksum of the slip it was last saved from and when
+order_slips_table = Table(
+    "orderslips",
+    metadata,
+    Column("session_id", String(128), primary_key=True),
+    Column("order_id", Integer, nullable=False),
+    Column("slip_checksum", String(64), nullable=False),
+    Column("updated_at", DateTime, server_default=func.now(), onupdate=func.now()),
+)
+
+INSERT_ORDER = PreparedStatement(
+    "openwaiterai_insert_order",
+    "INSERT INTO Orders (order_date) VALUES (CURRENT_TIMESTAMP) RETURNING id",
+)
+SELECT_ORDER_ITEMS = PreparedStatement(
+    "openwaiterai_select_order_items",
+    "SELECT OrderItems.menu_item_id, MenuItems.name, OrderItems.quantity, OrderItems.notes "
+    "FROM OrderItems LEFT JOIN MenuItems ON MenuItems.id = OrderItems.menu_item_id "
+    "WHERE OrderItems.order_id = :order_id ORDER BY OrderItems.id",
+)
+INSERT_ORDER_ITEM = PreparedStatement(
+    "openwaiterai_insert_order_item",
+    "INSERT INTO OrderItems (order_id, menu_item_id, quantity, notes) "
+    "VALUES (:order_id, :menu_item_id, :quantity, :notes)",
+)
+UPDATE_ORDER_ITEM = PreparedStatement(
+    "openwaiterai_update_order_item",
+    "UPDATE OrderItems SET quantity = :quantity, notes = :notes "
+    "WHERE order_id = :order_id AND menu_item_id = :menu_item_id",
+)
+DELETE_ORDER_ITEM = PreparedStatement(
+    "openwaiterai_delete_order_item",
+    "DELETE FROM OrderItems WHERE order_id = :order_id AND menu_item_id = :menu_item_id",
+)
+
+
+def utcnow() -> datetime:
+    """
+    Return the current time in UTC as a naive datetime, as OrderSlips stores it.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def create_order_tables(engine: Engine):
+    """
+    Create the OrderSlips table if it does not exist.
+
+    Orders and OrderItems are part of the restaurant schema and must exist.
+
+    Args:
+        engine (Engine): The database engine orders are persisted to.
+    """
+    metadata.create_all(engine, checkfirst=True)
+
+
+def slip_lines(order_slip: Iterable) -> Tuple[Lines, Dict[int, str]]:
+    """
+    Merge an order slip into one line per menu item.
+
+    Args:
+        order_slip (Iterable): Items with ``id``, ``name``, ``quantity`` and
+            optionally ``notes``.
+
+    Returns:
+        Tuple[Lines, Dict[int, str]]: The lines and the item names by menu item id.
+    """
+    lines: Lines = {}
+    names: Dict[int, str] = {}
+    for item in order_slip:
+        quantity, notes = lines.get(item.id, (0, None))
+        item_notes = getattr(item, "notes", None) or None
+        if notes and item_notes:
+            item_notes = f"{notes}; {item_notes}"
+        lines[item.id] = (quantity + item.quantity, item_notes or notes)
+        names[item.id] = item.name
+
+    # OrderItems only accepts positive quantities, a removed item is a missing line
+    lines = {menu_item_id: line for menu_item_id, line in lines.items() if line[0] > 0}
+    return lines, names
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    """
+    Tell whether an integrity error is a unique or primary key violation,
+    e.g. of a concurrent insert, rather than a foreign key or check violation.
+    """
+    orig = error.orig
+    # SQLSTATE from psycopg2 (pgcode) or psycopg (sqlstate)
+    sqlstate = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    if sqlstate:
+        return sqlstate == UNIQUE_VIOLATION
+    name = getattr(orig, "sqlite_errorname", None)
+    if name:
+        return name in ("SQLITE_CONSTRAINT_UNIQUE", "SQLITE_CONSTRAINT_PRIMARYKEY")
+    return "unique" in str(orig).lower()
+
+
+def slip_checksum(lines: Lines) -> str:
+    """
+    Return a checksum of slip lines that does not depend on their order.
+    """
+    canonical = json.dumps(sorted([key, *line] for key, line in lines.items()))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class OrderDiff:
+    """
+    The line changes between two versions of an order slip.
+    """
+
+    def __init__(self, inserted: Lines = None, updated: Lines = None, deleted: List[int] = None):
+        self.inserted = inserted or {}
+        self.updated = updated or {}
+        self.deleted = deleted or []
+
+    def __len__(self) -> int:
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+    def __repr__(self) -> str:
+        return (
+            f"OrderDiff(inserted={len(self.inserted)}, updated={len(self.updated)}, "
+            f"deleted={len(self.deleted)})"
+        )
+
+
+def diff_lines(stored: Lines, lines: Lines) -> OrderDiff:
+    """
+    Compute the changes that turn the stored lines into the new lines.
+
+    Args:
+        stored (Lines): The lines in the database.
+        lines (Lines): The lines of the new slip.
+
+    Returns:
+        OrderDiff: The changes.
+    """
+    diff = OrderDiff(deleted=[key for key in stored if key not in lines])
+    for key, line in lines.items():
+        if key not in stored:
+            diff.inserted[key] = line
+        elif stored[key] != line:
+            diff.updated[key] = line
+    return diff
+
+
+class StoredOrder:
+    """
+    An order slip as it is stored in the Orders and OrderItems tables.
+    """
+
+    def __init__(
+        self,
+        order_id: Optional[int],
+        checksum: str,
+        lines: Lines,
+        names: Dict[int, str] = None,
+    ):
+        """
+        Args:
+            order_id (Optional[int]): The ID of the order, None while the slip is empty.
+            checksum (str): The checksum of the lines.
+            lines (Lines): The (quantity, notes) of every menu item on the order.
+            names (Dict[int, str]): The names of the menu items.
+        """
+        self.order_id = order_id
+        self.checksum = checksum
+        self.lines = lines
+        self.names = names or {}
+
+
+class OrderStore:
+    """
+    Persists the order slip of every session into the Orders and OrderItems tables.
+
+    Every session has one order at a time. Saving a slip runs in one
+    transaction and only writes the lines that changed since the stored
+    version, so the writes of a turn grow with the changed items and not with
+    the size of the slip. The checksum of the saved slip is the idempotency
+    key: saving the same slip again, e.g. when a model call is retried, writes
+    nothing and never creates a second order.
+
+    An order that was not saved for ``ttl`` seconds belongs to earlier guests
+    of the session, e.g. of a table or of the default session. It is not
+    loaded anymore and the next save starts a new order, unless the caller
+    still holds it as ``known``.
+
+    The following environment variables are used:
+    - OPENWAITERAI_SESSION_TTL: Seconds after the last save after which a session starts a new order.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        debug: bool = False,
+        create_tables: bool = False,
+        ttl: float = None,
+    ):
+        """
+        Args:
+            engine (Engine): The database engine with the Orders, OrderItems and
+                OrderSlips tables.
+            debug (bool): Enables debug logging.
+            create_tables (bool): Create the OrderSlips table on first use if it
+                does not exist.
+            ttl (float): Seconds after the last save after which a session
+                starts a new order.
+        """
+        if ttl is None:
+            ttl = float(os.getenv("OPENWAITERAI_SESSION_TTL", "7200"))
+        self.engine = engine
+        self.debug = debug
+        self.ttl = ttl
+        self._create_tables = create_tables
+        self._tables_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+    def save(
+        self, session_id: str, order_slip: Iterable, known: StoredOrder = None
+    ) -> Tuple[StoredOrder, OrderDiff]:
+        """
+        Save the order slip of a session.
+
+        Args:
+            session_id (str): The ID of the session.
+            order_slip (Iterable): Items with ``id``, ``name``, ``quantity`` and
+                optionally ``notes``.
+            known (StoredOrder): The order this process saved last for the
+                session. Its lines are diffed against without reading them back
+                if the order was not changed elsewhere in the meantime, and it
+                is continued however long ago it was saved.
+
+        Returns:
+            Tuple[StoredOrder, OrderDiff]: The stored order and the changes written.
+
+        Raises:
+            IntegrityError: If a line violates a constraint, e.g. an unknown menu item.
+        """
+        lines, names = slip_lines(order_slip)
+        checksum = slip_checksum(lines)
+        if known is not None and known.checksum == checksum:
+            return known, OrderDiff()
+        self._ensure_tables()
+
+        for attempt in range(2):
+            try:
+                with self.engine.begin() as connection:
+                    stored, diff = self._save(
+                        connection, session_id, lines, names, checksum, known
+                    )
+                break
+            except IntegrityError as e:
+                # Another worker created the order of the session first, diff against it
+                if attempt or not is_unique_violation(e):
+                    raise
+
+        if self.debug and diff:
+            self.logger.debug(f"Saved order {stored.order_id} of {session_id}: {diff}")
+        return stored, diff
+
+    def load(self, session_id: str) -> Optional[StoredOrder]:
+        """
+        Load the stored order of a session.
+
+        Args:
+            session_id (str): The ID of the session.
+
+        Returns:
+            Optional[StoredOrder]: The order, None if the session has none or
+            its order expired.
+        """
+        self._ensure_tables()
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(
+                    order_slips_table.c.order_id,
+                    order_slips_table.c.slip_checksum,
+                    order_slips_table.c.updated_at,
+                ).where(order_slips_table.c.session_id == session_id)
+            ).first()
+            if row is None or self._expired(row.updated_at):
+                return None
+            lines, names, _ = self._load_lines(connection, row.order_id)
+        return StoredOrder(row.order_id, row.slip_checksum, lines, names)
+
+    def _expired(self, updated_at: Optional[datetime]) -> bool:
+        # Rows are stamped in UTC, see _save
+        if updated_at is None:
+            return False
+        if updated_at.tzinfo is not None:
+            updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return utcnow() - updated_at > timedelta(seconds=self.ttl)
+
+    def _ensure_tables(self):
+        if not self._create_tables:
+            return
+        with self._tables_lock:
+            if self._create_tables:
+                create_order_tables(self.engine)
+                self._create_tables = False
+
+    def _save(
+        self,
+        connection: Connection,
+        session_id: str,
+        lines: Lines,
+        names: Dict[int, str],
+        checksum: str,
+        known: Optional[StoredOrder],
+    ) -> Tuple[StoredOrder, OrderDiff]:
+        # Lock the session's row, so concurrent saves of one session run one after another
+        row = connection.execute(
+            select(
+                order_slips_table.c.order_id,
+                order_slips_table.c.slip_checksum,
+                order_slips_table.c.updated_at,
+            )
+            .where(order_slips_table.c.session_id == session_id)
+            .with_for_update()
+        ).first()
+        # The order of earlier guests is left as it is
+        expired = (
+            row is not None
+            and (known is None or known.order_id != row.order_id)
+            and self._expired(row.updated_at)
+        )
+
+        if row is None or expired:
+            if not lines:
+                return StoredOrder(None, checksum, lines, names), OrderDiff()
+            order_id = INSERT_ORDER.run(connection).scalar()
+            values = {"order_id": order_id, "slip_checksum": checksum, "updated_at": utcnow()}
+            if row is None:
+                connection.execute(
+                    insert(order_slips_table).values(session_id=session_id, **values)
+                )
+            else:
+                connection.execute(
+                    update(order_slips_table)
+                    .where(order_slips_table.c.session_id == session_id)
+                    .values(**values)
+                )
+            stored_lines: Lines = {}
+        else:
+            order_id, stored_checksum, _ = row
+            if stored_checksum == checksum:
+                return StoredOrder(order_id, checksum, lines, names), OrderDiff()
+            if known is not None and (known.order_id, known.checksum) == (order_id, stored_checksum):
+                stored_lines = known.lines
+            else:
+                stored_lines, _, duplicates = self._load_lines(connection, order_id)
+                # Collapse duplicate rows of an item, the diff writes one row per item
+                for menu_item_id in duplicates:
+                    DELETE_ORDER_ITEM.run(
+                        connection, {"order_id": order_id, "menu_item_id": menu_item_id}
+                    )
+                    del stored_lines[menu_item_id]
+            connection.execute(
+                update(order_slips_table)
+                .where(order_slips_table.c.session_id == session_id)
+                .values(slip_checksum=checksum, updated_at=utcnow())
+            )
+
+        diff = diff_lines(stored_lines, lines)
+        for menu_item_id in diff.deleted:
+            DELETE_ORDER_ITEM.run(
+                connection, {"order_id": order_id, "menu_item_id": menu_item_id}
+            )
+        for statement, changed in (
+            (UPDATE_ORDER_ITEM, diff.updated),
+            (INSERT_ORDER_ITEM, diff.inserted),
+        ):
+            for menu_item_id, (quantity, notes) in changed.items():
+                statement.run(
+                    connection,
+                    {
+                        "order_id": order_id,
+                        "menu_item_id": menu_item_id,
+                        "quantity": quantity,
+                        "notes": notes,
+                    },
+                )
+        return StoredOrder(order_id, checksum, lines, names), diff
+
+    def _load_lines(
+        self, connection: Connection, order_id: int
+    ) -> Tuple[Lines, Dict[int, str], List[int]]:
+        # Items with several rows, e.g. written by an older version, are merged
+        lines: Lines = {}
+        names: Dict[int, str] = {}
+        duplicates: List[int] = []
+        for menu_item_id, name, quantity, notes in SELECT_ORDER_ITEMS.run(
+            connection, {"order_id": order_id}
+        ):
+            if menu_item_id in lines:
+                previous, _ = lines[menu_item_id]
+                quantity += previous
+                if menu_item_id not in duplicates:
+                    duplicates.append(menu_item_id)
+            lines[menu_item_id] = (quantity, notes)
+            names[menu_item_id] = name or ""
+        return lines, names, duplicates
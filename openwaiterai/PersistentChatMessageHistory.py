@@ -0,0 +1,177 @@
+import json
+import logging
+import threading
+from typing import List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    BaseMessage,
+    SystemMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    func,
+    insert,
+    select,
+    delete,
+)
+from sqlalchemy.engine import Engine
+
+metadata = MetaData()
+
+chat_messages_table = Table(
+    "chatmessages",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("session_id", String(128), nullable=False),
+    Column("message", Text, nullable=False),
+    Column("created_at", DateTime, server_default=func.now()),
+    Index("chatmessages_session_id_idx", "session_id", "id"),
+)
+
+
+def create_history_table(engine: Engine):
+    """
+    Create the ChatMessages table if it does not exist.
+
+    Args:
+        engine (Engine): The database engine histories are persisted to.
+    """
+    metadata.create_all(engine, checkfirst=True)
+
+
+class PersistentChatMessageHistory(BaseChatMessageHistory):
+    """
+    A chat message history persisted to a SQL database (Postgres or SQLite).
+
+    Messages are buffered in memory and written in one batch by ``flush``, which
+    OpenWaiterAI calls at the end of every turn. Stored messages are loaded
+    lazily the first time the history is read, so a session can resume on any
+    worker. System messages are rebuilt at startup and are never persisted.
+    """
+
+    def __init__(self, session_id: str, engine: Engine, debug: bool = False):
+        """
+        Args:
+            session_id (str): The ID of the session.
+            engine (Engine): The database engine to persist messages to.
+            debug (bool): Enables debug logging.
+        """
+        self.session_id = session_id
+        self.engine = engine
+        self.debug = debug
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.system_message: Optional[SystemMessage] = None
+        self._messages: List[BaseMessage] = []
+        self._flushed = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            system = [self.system_message] if self.system_message else []
+            return system + self._messages
+
+    def add_messages(self, messages: Sequence[BaseMessage]):
+        with self._lock:
+            for message in messages:
+                if isinstance(message, SystemMessage):
+                    self.system_message = message
+                else:
+                    self._messages.append(message)
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of messages not written to the database yet.
+        """
+        return len(self._messages) - self._flushed
+
+    def flush(self):
+        """
+        Write every buffered message to the database in one transaction.
+
+        The stored messages are loaded first if the history was not read yet,
+        so the written messages are not loaded a second time.
+        """
+        with self._lock:
+            if self._flushed == len(self._messages):
+                return
+            if not self._loaded:
+                self._load()
+            pending = self._messages[self._flushed :]
+
+            rows = [
+                {
+                    "session_id": self.session_id,
+                    "message": json.dumps(message_to_dict(message)),
+                }
+                for message in pending
+            ]
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(insert(chat_messages_table), rows)
+            except Exception as e:
+                self.logger.error("Failed to persist chat history", exc_info=e)
+                raise
+
+            self._flushed += len(pending)
+            if self.debug:
+                self.logger.debug(
+                    f"Persisted {len(pending)} message(s) of session {self.session_id}"
+                )
+
+    def clear(self):
+        with self._lock:
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        delete(chat_messages_table).where(
+                            chat_messages_table.c.session_id == self.session_id
+                        )
+                    )
+            except Exception as e:
+                self.logger.error("Failed to clear chat history", exc_info=e)
+                raise
+
+            self._messages = []
+            self._flushed = 0
+            self._loaded = True
+
+    def _load(self):
+        query = (
+            select(chat_messages_table.c.message)
+            .where(chat_messages_table.c.session_id == self.session_id)
+            .order_by(chat_messages_table.c.id)
+        )
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(query).scalars().all()
+        except Exception as e:
+            self.logger.error("Failed to load chat history", exc_info=e)
+            raise
+
+        # Messages added before the first read are newer than the stored ones
+        stored = messages_from_dict([json.loads(row) for row in rows])
+        self._messages = stored + self._messages
+        self._flushed += len(stored)
+        self._loaded = True
+
+        if self.debug and stored:
+            self.logger.debug(
+                f"Loaded {len(stored)} message(s) of session {self.session_id}"
+            )
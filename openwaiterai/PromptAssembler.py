@@ -0,0 +1,174 @@
+import json
+import hashlib
+from typing import Dict, List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+# Sections ordered from most to least stable. Provider prompt caches match on
+# the longest byte-identical prefix, so content that changes more often goes last.
+SECTION_ORDER = ["instructions", "schema", "restaurant", "menu"]
+
+
+def fingerprint(text: str) -> str:
+    """
+    Return a short, stable fingerprint of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The first 12 hex digits of its SHA-256.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+class AssembledPrompt:
+    """
+    A system message assembled from sections, with per-section fingerprints.
+    """
+
+    def __init__(self, text: str, sections: List[Tuple[str, str, int]]):
+        """
+        Args:
+            text (str): The assembled system message.
+            sections (List[Tuple[str, str, int]]): The name, fingerprint and
+                byte length of every section, in prompt order.
+        """
+        self.text = text
+        self.sections = sections
+
+    @property
+    def fingerprints(self) -> Dict[str, str]:
+        """
+        The fingerprint of every section, comparable across turns and deployments.
+        """
+        return {name: section_fingerprint for name, section_fingerprint, _ in self.sections}
+
+    @property
+    def prefix_fingerprints(self) -> Dict[str, str]:
+        """
+        The fingerprint of the prompt prefix ending with each section.
+
+        Two deployments share a cacheable prefix up to the last section whose
+        prefix fingerprint matches.
+        """
+        prefixes = {}
+        digest = hashlib.sha256()
+        for name, section_fingerprint, _ in self.sections:
+            digest.update(section_fingerprint.encode("ascii"))
+            prefixes[name] = digest.hexdigest()[:12]
+        return prefixes
+
+    def stable_prefix_bytes(self, other: "AssembledPrompt") -> int:
+        """
+        Return how many leading bytes this prompt shares with another one,
+        counted in whole sections.
+
+        Args:
+            other (AssembledPrompt): A prompt of another turn or deployment.
+
+        Returns:
+            int: The length of the shared prefix in bytes.
+        """
+        shared = 0
+        for mine, theirs in zip(self.sections, other.sections):
+            if mine != theirs:
+                break
+            shared += mine[2] + len(PromptAssembler.separator)
+        return min(shared, len(self.text.encode("utf-8")))
+
+    def report(self) -> Dict:
+        return {
+            "bytes": len(self.text.encode("utf-8")),
+            "sections": [
+                {"name": name, "fingerprint": section_fingerprint, "bytes": size}
+                for name, section_fingerprint, size in self.sections
+            ],
+            "prefix_fingerprints": self.prefix_fingerprints,
+        }
+
+
+class PromptAssembler:
+    """
+    Assembles the system message from sections in a stable order.
+    """
+
+    separator = "\n\n"
+
+    def __init__(self, order: Sequence[str] = None):
+        """
+        Args:
+            order (Sequence[str]): The section names from most to least stable.
+        """
+        self.order = list(order or SECTION_ORDER)
+
+    def assemble(self, sections: Dict[str, str]) -> AssembledPrompt:
+        """
+        Join the sections in stable order.
+
+        Sections that are not part of the configured order are appended after
+        it in name order.
+
+        Args:
+            sections (Dict[str, str]): The text of every section by name.
+
+        Returns:
+            AssembledPrompt: The system message and its fingerprints.
+        """
+        names = [name for name in self.order if name in sections]
+        names += sorted(name for name in sections if name not in self.order)
+
+        texts = [sections[name].strip() for name in names]
+        parts = [
+            (name, fingerprint(text), len(text.encode("utf-8")))
+            for name, text in zip(names, texts)
+        ]
+        return AssembledPrompt(self.separator.join(texts), parts)
+
+
+def message_signature(messages: Sequence[BaseMessage]) -> List[Tuple[str, int]]:
+    """
+    Return the fingerprint and serialized size of every prompt message.
+
+    Args:
+        messages (Sequence[BaseMessage]): The prompt of one model call.
+
+    Returns:
+        List[Tuple[str, int]]: One ``(fingerprint, bytes)`` pair per message.
+    """
+    signature = []
+    for message in messages:
+        serialized = json.dumps(
+            [
+                message.type,
+                message.content,
+                getattr(message, "tool_calls", None) or [],
+                getattr(message, "tool_call_id", None),
+            ],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        signature.append((fingerprint(serialized), len(serialized.encode("utf-8"))))
+    return signature
+
+
+def shared_prefix_bytes(
+    previous: Sequence[Tuple[str, int]], current: Sequence[Tuple[str, int]]
+) -> int:
+    """
+    Return the bytes of the leading messages two prompts have in common.
+
+    Args:
+        previous (Sequence[Tuple[str, int]]): The signature of the previous prompt.
+        current (Sequence[Tuple[str, int]]): The signature of the current prompt.
+
+    Returns:
+        int: The size of the identical message prefix.
+    """
+    shared = 0
+    for before, after in zip(previous, current):
+        if before != after:
+            break
+        shared += after[1]
+    return shared
@@ -0,0 +1,336 @@
+import os
+import re
+import math
+import time
+import zlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# fmt: off
+# Words that do not change what a question asks about: greetings, politeness,
+# articles, auxiliaries and question words
+STOP_WORDS = {
+    "a", "about", "an", "any", "anything", "are", "at", "be", "can", "contain",
+    "contains", "could", "do", "does", "excuse", "for", "from", "has", "have",
+    "hello", "hey", "hi", "how", "how's", "i", "in", "include", "includes", "is",
+    "just", "kindly", "know", "like", "me", "of", "offer", "ok", "okay", "on",
+    "please", "serve", "should", "so", "some", "sorry", "tell", "thank", "thanks",
+    "the", "there", "there's", "to", "um", "what", "what's", "whats", "when",
+    "when's", "where", "where's", "which", "who", "will", "with", "would", "you",
+    "your", "yours",
+}
+QUESTION_WORDS = {
+    "what", "what's", "when", "where", "which", "who", "how", "is", "are", "do",
+    "does", "can", "could", "have", "has", "will", "would", "tell",
+}
+# fmt: on
+# Questions about the guest's own order or that refer back to the conversation
+ORDER_PATTERN = re.compile(
+    r"\b(order\w*|add|remove|cancel|change|instead|bill|pay|bring|waiter|table|"
+    r"i'll have|i will have|i'd like|i would like|i want|we'd like|we would like|we want|"
+    r"give me|get me)\b"
+)
+CONTEXT_PATTERN = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|one|ones|same|another|other|else|"
+    r"also|too|again|more|above|previous|earlier|before|my|mine|our|ours|we|us)\b"
+)
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def content_words(question: str) -> List[str]:
+    """
+    Return the words of a question that say what it asks about, lowercased
+    and without plural ``s``.
+    """
+    words = WORD_PATTERN.findall(question.lower().replace("’", "'"))
+    return [
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+        for word in words
+        if word not in STOP_WORDS
+    ]
+
+
+def trigrams(word: str) -> List[str]:
+    padded = f" {word} "
+    return [padded[start : start + 3] for start in range(len(padded) - 2)]
+
+
+def word_similarity(first: str, second: str) -> float:
+    """
+    Return the Dice coefficient of the character trigrams of two words.
+    """
+    if first == second:
+        return 1.0
+    first_trigrams, second_trigrams = Counter(trigrams(first)), Counter(trigrams(second))
+    common = sum((first_trigrams & second_trigrams).values())
+    return 2 * common / (sum(first_trigrams.values()) + sum(second_trigrams.values()))
+
+
+def embed_question(words: List[str], dimensions: int = 4096) -> Dict[int, float]:
+    """
+    Embed the content words of a question as a sparse unit vector of hashed
+    words and character trigrams, without a model or network access.
+
+    Args:
+        words (List[str]): The content words of the question.
+        dimensions (int): The number of hash buckets.
+
+    Returns:
+        Dict[int, float]: The non-zero components of the vector.
+    """
+    features = []
+    for word in words:
+        features.append(word)
+        features += [f"#{trigram}" for trigram in trigrams(word)]
+
+    # crc32 is stable across processes, unlike the salted built-in hash
+    counts = Counter(zlib.crc32(feature.encode()) % dimensions for feature in features)
+    norm = math.sqrt(sum(count * count for count in counts.values()))
+    return {bucket: count / norm for bucket, count in counts.items()} if norm else {}
+
+
+def similarity(first: Dict[int, float], second: Dict[int, float]) -> float:
+    """
+    Return the cosine similarity of two embedded questions.
+    """
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(value * second.get(bucket, 0.0) for bucket, value in first.items())
+
+
+class CachedResponse:
+    """
+    A stored answer to a guest question.
+    """
+
+    __slots__ = ("key", "question", "answer", "words", "vector", "stored_at", "hits")
+
+    def __init__(self, key: str, question: str, answer: str, words: List[str]):
+        self.key = key
+        self.question = question
+        self.answer = answer
+        self.words = words
+        self.vector = embed_question(words)
+        self.stored_at = time.monotonic()
+        self.hits = 0
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of answers to standalone questions about the restaurant and
+    the menu, e.g. opening hours, parking or the ingredients of a dish.
+
+    Questions are keyed on their content words, so "Is there parking?" and
+    "Do you have parking?" share an answer. Other questions match a stored one
+    when their hashed word and trigram vectors are similar and every content
+    word has a counterpart that differs at most by a typo, so "Does the salad
+    contain egg?" never matches "Does the salad contain milk?". Only questions
+    that do not concern an order and do not refer back to the conversation are
+    looked up or stored. All entries belong to one menu version, passing a
+    different version to ``get`` or ``put`` clears them.
+
+    The following environment variables are used:
+    - OPENWAITERAI_RESPONSE_CACHE: "1" enables the cache of ``OpenWaiterAI``.
+    - OPENWAITERAI_RESPONSE_CACHE_SIZE: The maximum number of stored answers.
+    - OPENWAITERAI_RESPONSE_CACHE_TTL: Seconds a stored answer is served.
+    - OPENWAITERAI_RESPONSE_CACHE_SIMILARITY: The minimum similarity of a match.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        ttl: float = None,
+        min_similarity: float = None,
+        min_word_similarity: float = 0.7,
+        max_words: int = 25,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            max_entries (int): The maximum number of stored answers.
+            ttl (float): Seconds a stored answer is served.
+            min_similarity (float): The minimum cosine similarity of a match,
+                above 1.0 for exact matches of the content words only.
+            min_word_similarity (float): The minimum trigram similarity of
+                two content words that count as the same word.
+            max_words (int): Longer questions are never cached.
+            debug (bool): Enables debug logging.
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv("OPENWAITERAI_RESPONSE_CACHE_SIZE", "512"))
+        if ttl is None:
+            ttl = float(os.getenv("OPENWAITERAI_RESPONSE_CACHE_TTL", "3600"))
+        if min_similarity is None:
+            min_similarity = float(os.getenv("OPENWAITERAI_RESPONSE_CACHE_SIMILARITY", "0.8"))
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self.min_word_similarity = min_word_similarity
+        self.max_words = max_words
+        self.debug = debug
+        self.version: Optional[Hashable] = None
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def words(self, question: str) -> Optional[List[str]]:
+        """
+        Return the content words of a question, or None if its answer must
+        not be cached.
+
+        Args:
+            question (str): The guest message.
+
+        Returns:
+            Optional[List[str]]: The content words.
+        """
+        lowered = question.lower().replace("’", "'")
+        words = WORD_PATTERN.findall(lowered)
+        if not words or len(words) > self.max_words:
+            return None
+        if "?" not in question and words[0] not in QUESTION_WORDS:
+            return None
+        if ORDER_PATTERN.search(lowered) or CONTEXT_PATTERN.search(lowered):
+            return None
+        return content_words(question) or None
+
+    def get(self, question: str, version: Hashable = None) -> Optional[str]:
+        """
+        Return the stored answer to a question or a similar one.
+
+        Args:
+            question (str): The guest message.
+            version (Hashable): The current menu version.
+
+        Returns:
+            Optional[str]: The answer, or None on a miss.
+        """
+        words = self.words(question)
+        if words is None:
+            with self._lock:
+                self.bypasses += 1
+            return None
+
+        now = time.monotonic()
+        key = " ".join(words)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.stored_at > self.ttl:
+                del self._entries[key]
+                entry = None
+            similar = False
+            if entry is None and self.min_similarity <= 1.0:
+                entry = self._most_similar(words, now)
+                similar = entry is not None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry.key)
+            entry.hits += 1
+            self.hits += 1
+            if similar:
+                self.similar_hits += 1
+
+        if self.debug:
+            self.logger.debug(f"Response cache hit for {question!r}: {entry.question!r}")
+        return entry.answer
+
+    def put(self, question: str, answer: str, version: Hashable = None):
+        """
+        Store the answer to a question if the question is cacheable.
+
+        Args:
+            question (str): The guest message.
+            answer (str): The answer of the model.
+            version (Hashable): The menu version the answer was given for.
+        """
+        words = self.words(question)
+        if words is None or not answer:
+            return
+
+        key = " ".join(words)
+        entry = CachedResponse(key, question, answer, words)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, reason: str = None):
+        """
+        Drop all stored answers.
+
+        Args:
+            reason (str): Why the answers are stale.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+        if self.debug:
+            self.logger.debug(f"Response cache invalidated: {reason}")
+
+    def stats(self) -> Dict:
+        """
+        Return the hit, miss and eviction counters of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _words_match(self, first: List[str], second: List[str]) -> bool:
+        # Every word of each question needs a counterpart in the other one
+        return all(
+            any(word_similarity(word, other) >= self.min_word_similarity for other in others)
+            for words, others in ((first, second), (second, first))
+            for word in words
+        )
+
+    def _most_similar(self, words: List[str], now: float) -> Optional[CachedResponse]:
+        # Called with the lock held, a linear scan is cheap at a few hundred entries
+        vector = embed_question(words)
+        best: Tuple[float, Optional[CachedResponse]] = (self.min_similarity, None)
+        for entry in self._entries.values():
+            if now - entry.stored_at > self.ttl:
+                continue
+            score = similarity(vector, entry.vector)
+            if score >= best[0] and self._words_match(words, entry.words):
+                best = (score, entry)
+        return best[1]
+
+    def _check_version(self, version: Hashable):
+        # Called with the lock held
+        if version is not None and version != self.version:
+            if self.version is not None:
+                self._entries.clear()
+                self.invalidations += 1
+                if self.debug:
+                    self.logger.debug(f"Response cache cleared for menu version {version}")
+            self.version = version
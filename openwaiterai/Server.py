@@ -0,0 +1,547 @@
+import os
+import gc
+import re
+import json
+import zlib
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+import queue
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .ContextSnapshot import load_snapshot
+
+MESSAGES_PATH = re.compile(r"^/v1/sessions/([A-Za-z0-9_.:-]{1,128})/messages$")
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ServerBusy(RuntimeError):
+    """
+    The worker of a session has as many requests in flight as its queue allows.
+    """
+
+
+class WorkerError(RuntimeError):
+    """
+    The worker of a request exited before it answered.
+    """
+
+
+def route_session(session_id: str, workers: int) -> int:
+    """
+    Return the index of the worker that serves a session.
+
+    The same session always goes to the same worker, so its history and order
+    slip stay in the memory of one process.
+
+    Args:
+        session_id (str): The session (table).
+        workers (int): The number of workers.
+
+    Returns:
+        int: The worker index.
+    """
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+
+def _build_snapshot(factory: Callable, path: str):
+    # Runs in a child process, so the parent forks workers without open
+    # connections or background threads
+    factory().save_context_snapshot(path)
+
+
+def _final_answer(messages: List) -> str:
+    for message in reversed(messages):
+        if message.type == "ai" and not getattr(message, "tool_calls", None):
+            return message.content
+    return ""
+
+
+class _Worker:
+    """
+    A worker process of the server and the requests it has not answered yet.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.connection = None
+        self.send_lock = threading.Lock()
+        self.pending: Dict[int, Future] = {}
+        self.served = 0
+        self.restarts = -1
+
+    def snapshot(self) -> Dict:
+        return {
+            "index": self.index,
+            "pid": self.process.pid if self.process is not None else None,
+            "alive": self.process is not None and self.process.is_alive(),
+            "in_flight": len(self.pending),
+            "served": self.served,
+            "restarts": max(self.restarts, 0),
+        }
+
+
+class _WorkerLoop:
+    """
+    Runs the turns of one worker process.
+
+    Turns of different sessions run in parallel on a thread pool, the turns
+    of one session run one after the other in arrival order.
+    """
+
+    def __init__(self, connection, waiter, threads: int):
+        self.connection = connection
+        self.waiter = waiter
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="openwaiterai-turn")
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        # Requests waiting for the running turn of their session
+        self.sessions: Dict[str, Deque[Tuple[int, str]]] = {}
+
+    def run(self):
+        while True:
+            try:
+                request = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            if request is None:
+                break
+            request_id, session_id, message = request
+            with self.lock:
+                queue = self.sessions.get(session_id)
+                if queue is not None:
+                    queue.append((request_id, message))
+                    continue
+                self.sessions[session_id] = deque()
+            self.executor.submit(self._run_session, session_id, request_id, message)
+        self.executor.shutdown(wait=True)
+
+    def _run_session(self, session_id: str, request_id: int, message: str):
+        while True:
+            self._send(request_id, *self._turn(session_id, message))
+            with self.lock:
+                queue = self.sessions[session_id]
+                if not queue:
+                    del self.sessions[session_id]
+                    return
+                request_id, message = queue.popleft()
+
+    def _turn(self, session_id: str, message: str) -> Tuple[int, Dict]:
+        from langchain_core.messages import messages_to_dict
+
+        try:
+            messages = list(self.waiter.invoke(message, session_id=session_id))
+        except Exception as e:
+            self.waiter.logger.error(f"Turn of session {session_id} failed", exc_info=e)
+            return 500, {"error": "turn_failed", "message": str(e)}
+        return 200, {
+            "session_id": session_id,
+            "worker": os.getpid(),
+            "answer": _final_answer(messages),
+            "messages": messages_to_dict(messages),
+        }
+
+    def _send(self, request_id: int, status: int, payload: Dict):
+        try:
+            with self.send_lock:
+                self.connection.send((request_id, status, payload))
+        except (BrokenPipeError, OSError):
+            # The server is gone, the remaining turns have nobody to answer
+            pass
+
+
+def _serve_worker(connection, factory: Callable, context_snapshot: str, threads: int):
+    # Ctrl-C reaches the whole process group, the server stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ["OPENWAITERAI_CONTEXT_SNAPSHOT"] = context_snapshot
+    _WorkerLoop(connection, factory(), threads).run()
+
+
+class WaiterServer:
+    """
+    Serves OpenWaiterAI over HTTP with a pool of pre-forked worker processes.
+
+    The parent process imports LangChain and checks the restaurant context
+    snapshot once, then forks the workers, so they share the imported modules
+    copy-on-write and start without querying the database. Each worker builds
+    its own OpenWaiterAI with the factory, from the snapshot. Every session
+    is routed to the same worker, where its turns run one after the other.
+    Requests beyond the queue depth of a worker are answered with 503 and
+    a Retry-After header. A worker that exits is replaced by a supervisor
+    thread, its pending requests are answered with 502.
+
+    Endpoints:
+    - POST /v1/sessions/<session_id>/messages with {"message": "..."}: Runs
+      one guest turn and returns the answer and all messages of the turn.
+    - GET /health: The workers, their requests in flight and restarts.
+
+    The following environment variables configure the server:
+    - OPENWAITERAI_SERVER_HOST: The address to listen on.
+    - OPENWAITERAI_SERVER_PORT: The port to listen on.
+    - OPENWAITERAI_SERVER_WORKERS: Worker processes, defaults to the CPU count.
+    - OPENWAITERAI_SERVER_THREADS: Turns of different sessions a worker runs at once.
+    - OPENWAITERAI_SERVER_QUEUE_DEPTH: Requests in flight per worker before 503.
+    - OPENWAITERAI_SERVER_TIMEOUT: Seconds to wait for the answer of a turn before 504.
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        workers: int = None,
+        host: str = None,
+        port: int = None,
+        threads: int = None,
+        queue_depth: int = None,
+        request_timeout: float = None,
+        context_snapshot: str = None,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            factory (Callable): Returns the OpenWaiterAI of a worker. Called in
+                the worker process, so it must not reuse objects of the parent.
+            workers (int): Worker processes.
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 picks a free port.
+            threads (int): Turns of different sessions a worker runs at once.
+            queue_depth (int): Requests in flight per worker before requests
+                are rejected.
+            request_timeout (float): Seconds to wait for the answer of a turn.
+            context_snapshot (str): The context snapshot file. It is built
+                when it is missing or invalid. Defaults to a temporary file.
+            debug (bool): Enables debug logging.
+        """
+        if workers is None:
+            workers = int(os.getenv("OPENWAITERAI_SERVER_WORKERS", "0")) or os.cpu_count() or 1
+        if threads is None:
+            threads = int(os.getenv("OPENWAITERAI_SERVER_THREADS", "8"))
+        if queue_depth is None:
+            queue_depth = int(os.getenv("OPENWAITERAI_SERVER_QUEUE_DEPTH", "32"))
+        if request_timeout is None:
+            request_timeout = float(os.getenv("OPENWAITERAI_SERVER_TIMEOUT", "120"))
+        if workers < 1 or threads < 1 or queue_depth < 1:
+            raise ValueError("workers, threads and queue_depth must be at least 1")
+
+        self.factory = factory
+        self.host = host or os.getenv("OPENWAITERAI_SERVER_HOST", "127.0.0.1")
+        self.port = int(port if port is not None else os.getenv("OPENWAITERAI_SERVER_PORT", "8080"))
+        self.threads = threads
+        self.queue_depth = queue_depth
+        self.request_timeout = request_timeout
+        self.context_snapshot = context_snapshot
+        self.debug = debug
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.workers = [_Worker(index) for index in range(workers)]
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._next_request_id = 0
+        self._closing = False
+        # Workers to replace, forked from one thread that holds no other lock
+        self._respawns: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        self._temporary_directory = None
+        self._context = multiprocessing.get_context("fork")
+        self.http_server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """
+        The address the server listens on, once it is started.
+        """
+        return self.http_server.server_address[:2]
+
+    def start(self):
+        """
+        Build the context snapshot, fork the workers and bind the HTTP server.
+        """
+        self._prepare_snapshot()
+
+        # Loaded once here, shared copy-on-write by every worker
+        from .Waiter import OpenWaiterAI  # noqa: F401
+
+        for worker in self.workers:
+            self._spawn(worker)
+        threading.Thread(target=self._supervise, name="openwaiterai-supervisor", daemon=True).start()
+
+        self.http_server = ThreadingHTTPServer((self.host, self.port), _RequestHandler)
+        self.http_server.daemon_threads = True
+        self.http_server.waiter_server = self
+        self.logger.info(
+            f"Serving on http://{self.address[0]}:{self.address[1]} "
+            f"with {len(self.workers)} workers"
+        )
+
+    def serve_forever(self):
+        """
+        Start the server if needed and serve until ``shutdown`` or Ctrl-C.
+        """
+        if self.http_server is None:
+            self.start()
+        try:
+            self.http_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """
+        Stop ``serve_forever`` from another thread.
+        """
+        self.http_server.shutdown()
+
+    def close(self):
+        """
+        Stop the workers after their running turns and release the port.
+        """
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+        self._respawns.put(None)
+        for worker in self.workers:
+            try:
+                with worker.send_lock:
+                    worker.connection.send(None)
+            except (AttributeError, OSError):
+                pass
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            worker.process.join(timeout=self.request_timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        if self.http_server is not None:
+            self.http_server.server_close()
+        if self._temporary_directory is not None:
+            self._temporary_directory.cleanup()
+
+    def _prepare_snapshot(self):
+        if self.context_snapshot is None:
+            self._temporary_directory = tempfile.TemporaryDirectory(prefix="openwaiterai-")
+            self.context_snapshot = os.path.join(self._temporary_directory.name, "context.snapshot")
+        try:
+            context = load_snapshot(self.context_snapshot)
+        except (OSError, ValueError):
+            pass
+        else:
+            if self.debug:
+                self.logger.debug(f"Using context snapshot {self.context_snapshot} ({context.fingerprint})")
+            return
+
+        builder = self._context.Process(
+            target=_build_snapshot, args=(self.factory, self.context_snapshot), name="openwaiterai-snapshot"
+        )
+        builder.start()
+        builder.join()
+        if builder.exitcode != 0:
+            raise RuntimeError(f"Building the context snapshot failed with exit code {builder.exitcode}")
+        if self.debug:
+            self.logger.debug(f"Built context snapshot {self.context_snapshot}")
+
+    def _spawn(self, worker: _Worker):
+        connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_serve_worker,
+            args=(child_connection, self.factory, self.context_snapshot, self.threads),
+            name=f"openwaiterai-worker-{worker.index}",
+            daemon=True,
+        )
+        # Frozen objects are never visited by the garbage collector of the
+        # worker, so the pages it inherits stay shared
+        gc.freeze()
+        try:
+            process.start()
+        finally:
+            gc.unfreeze()
+        child_connection.close()
+        worker.process, worker.connection = process, connection
+        worker.restarts += 1
+        threading.Thread(
+            target=self._read_answers,
+            args=(worker, process, connection),
+            name=f"openwaiterai-answers-{worker.index}",
+            daemon=True,
+        ).start()
+        if self.debug:
+            self.logger.debug(f"Worker {worker.index} started (pid {process.pid})")
+
+    def _read_answers(self, worker: _Worker, process, connection):
+        while True:
+            try:
+                request_id, status, payload = connection.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = worker.pending.pop(request_id, None)
+                worker.served += 1
+            if future is not None:
+                future.set_result((status, payload))
+
+        process.join()
+        connection.close()
+        with self._lock:
+            pending, worker.pending = worker.pending, {}
+            closing = self._closing
+        for future in pending.values():
+            future.set_exception(WorkerError(f"Worker {worker.index} exited"))
+        if closing:
+            return
+        self.logger.error(f"Worker {worker.index} (pid {process.pid}) exited with code {process.exitcode}")
+        self._respawns.put(worker)
+
+    def _supervise(self):
+        while True:
+            worker = self._respawns.get()
+            if worker is None:
+                return
+            # Sends wait for the new connection, close() waits for the fork
+            with worker.send_lock:
+                with self._lock:
+                    closing = self._closing
+                if closing:
+                    return
+                self._spawn(worker)
+
+    def submit(self, session_id: str, message: str) -> Future:
+        """
+        Send a guest message to the worker of its session.
+
+        Args:
+            session_id (str): The session (table).
+            message (str): The guest message.
+
+        Returns:
+            Future: Resolves to the HTTP status and the JSON payload of the turn.
+
+        Raises:
+            ServerBusy: If the worker has ``queue_depth`` requests in flight.
+        """
+        worker = self.workers[route_session(session_id, len(self.workers))]
+        future = Future()
+        with self._lock:
+            if len(worker.pending) >= self.queue_depth:
+                self.rejected += 1
+                raise ServerBusy(f"Worker {worker.index} has {len(worker.pending)} requests in flight")
+            self._next_request_id += 1
+            request_id = self._next_request_id
+            worker.pending[request_id] = future
+        try:
+            with worker.send_lock:
+                worker.connection.send((request_id, session_id, message))
+        except OSError as e:
+            with self._lock:
+                worker.pending.pop(request_id, None)
+            raise WorkerError(f"Worker {worker.index} is not reachable") from e
+        return future
+
+    def health(self) -> Dict:
+        """
+        Return the state of the workers and the number of rejected requests.
+        """
+        with self._lock:
+            workers = [worker.snapshot() for worker in self.workers]
+            rejected = self.rejected
+        return {
+            "status": "ok" if all(worker["alive"] for worker in workers) else "degraded",
+            "queue_depth": self.queue_depth,
+            "rejected": rejected,
+            "workers": workers,
+        }
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "OpenWaiterAI"
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": "not_found"})
+        self._reply(200, self.server.waiter_server.health())
+
+    def do_POST(self):
+        match = MESSAGES_PATH.match(self.path)
+        if match is None:
+            return self._reply(404, {"error": "not_found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._reply(413, {"error": "body_too_large"})
+        try:
+            message = json.loads(self.rfile.read(length))["message"]
+            if not isinstance(message, str) or not message.strip():
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {"error": "invalid_request", "message": 'Expected {"message": "..."}'})
+
+        waiter_server = self.server.waiter_server
+        try:
+            future = waiter_server.submit(match.group(1), message)
+            status, payload = future.result(timeout=waiter_server.request_timeout)
+        except ServerBusy as e:
+            return self._reply(503, {"error": "busy", "message": str(e)}, {"Retry-After": "1"})
+        except WorkerError as e:
+            return self._reply(502, {"error": "worker_exited", "message": str(e)})
+        except FutureTimeoutError:
+            return self._reply(504, {"error": "timeout"})
+        self._reply(status, payload)
+
+    def _reply(self, status: int, payload: Dict, headers: Dict[str, str] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        server = self.server.waiter_server
+        if server.debug:
+            server.logger.debug(f"{self.address_string()} {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve OpenWaiterAI over HTTP with pre-forked workers.")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--system-instructions", default="./system_instructions.txt")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--context-snapshot", help="Reused across restarts when given")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    def factory():
+        from .Waiter import OpenWaiterAI
+
+        return OpenWaiterAI(
+            model_name=args.model, system_instructions=args.system_instructions, debug=args.debug
+        )
+
+    WaiterServer(
+        factory,
+        workers=args.workers,
+        host=args.host,
+        port=args.port,
+        context_snapshot=args.context_snapshot,
+        debug=args.debug,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.chat_history import (
+    BaseChatMessageHistory,
+    InMemoryChatMessageHistory,
+)
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from .OrderSlip import OrderSlip
+
+# Rough per-message bookkeeping cost on top of its content
+MESSAGE_OVERHEAD_BYTES = 512
+
+
+def estimate_message_size(message: BaseMessage) -> int:
+    """
+    Estimate the memory held by a message in bytes.
+
+    System messages are shared between sessions and are not counted.
+
+    Args:
+        message (BaseMessage): The message.
+
+    Returns:
+        int: The estimated size.
+    """
+    if isinstance(message, SystemMessage):
+        return 0
+    size = MESSAGE_OVERHEAD_BYTES + len(str(message.content))
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        size += len(str(tool_call.get("args")))
+    return size
+
+
+class Session:
+    """
+    The state of one guest conversation, i.e. one table.
+    """
+
+    def __init__(self, session_id: str, history: BaseChatMessageHistory):
+        self.session_id = session_id
+        self.history = history
+        self.order_slip = OrderSlip()
+        self.order_lock = threading.Lock()
+        self.stored_order = None
+        self.history_state: Dict = {}
+        self.history_report = None
+        self.turn_report = None
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+        self.size = 0
+        self.measured_messages = 0
+        # Turns in flight, a session is never evicted while it has one
+        self.turns = 0
+
+
+class SessionManager:
+    """
+    Keeps the sessions of many tables with LRU/TTL eviction and a memory budget.
+
+    Sessions held by ``begin_turn`` are never evicted by the limits, they are
+    evicted once their turn ends. Evicted histories are flushed outside the
+    lock, so a slow database does not stall the other tables.
+
+    The following environment variables are used:
+    - OPENWAITERAI_MAX_SESSIONS: The maximum number of sessions kept in memory.
+    - OPENWAITERAI_SESSION_TTL: Seconds of inactivity after which a session is dropped.
+    - OPENWAITERAI_SESSION_MEMORY_BUDGET: The estimated bytes all histories may hold.
+    """
+
+    def __init__(
+        self,
+        history_factory: Callable[[str], BaseChatMessageHistory] = None,
+        max_sessions: int = None,
+        ttl: float = None,
+        memory_budget: int = None,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            history_factory (Callable[[str], BaseChatMessageHistory]): Creates the
+                history of a new session. Defaults to an empty in-memory history.
+            max_sessions (int): The maximum number of sessions kept in memory.
+            ttl (float): Seconds of inactivity after which a session is dropped.
+            memory_budget (int): The estimated bytes all histories may hold.
+            debug (bool): Enables debug logging.
+        """
+        self.debug = debug
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.history_factory = history_factory or (
+            lambda session_id: InMemoryChatMessageHistory()
+        )
+        if max_sessions is None:
+            max_sessions = int(os.getenv("OPENWAITERAI_MAX_SESSIONS", "1000"))
+        if ttl is None:
+            ttl = float(os.getenv("OPENWAITERAI_SESSION_TTL", "7200"))
+        if memory_budget is None:
+            memory_budget = int(
+                os.getenv("OPENWAITERAI_SESSION_MEMORY_BUDGET", str(256 * 1024 * 1024))
+            )
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.memory_budget = memory_budget
+
+        self.total_size = 0
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def get(self, session_id: str) -> Session:
+        """
+        Return a session, creating it if it does not exist, and mark it as used.
+
+        Args:
+            session_id (str): The ID of the session.
+
+        Returns:
+            Session: The session.
+        """
+        return self._get(session_id, turn=False)
+
+    def begin_turn(self, session_id: str) -> Session:
+        """
+        Return a session like ``get`` and keep it in memory until ``end_turn``.
+
+        Args:
+            session_id (str): The ID of the session.
+
+        Returns:
+            Session: The session.
+        """
+        return self._get(session_id, turn=True)
+
+    def end_turn(self, session: Session):
+        """
+        Release a session held by ``begin_turn``, evicting what was kept over
+        the limits while it ran.
+
+        Args:
+            session (Session): The session.
+        """
+        with self._lock:
+            session.turns -= 1
+            evicted = self._evict_over_budget()
+        self._flush(evicted)
+
+    def _get(self, session_id: str, turn: bool) -> Session:
+        with self._lock:
+            now = time.monotonic()
+            evicted = self._evict_expired(now)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, self.history_factory(session_id))
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_access = now
+            if turn:
+                session.turns += 1
+
+            evicted += self._evict_over_budget()
+        self._flush(evicted)
+        return session
+
+    def peek(self, session_id: str) -> Optional[Session]:
+        """
+        Return a session without creating it or changing its LRU position.
+        """
+        return self._sessions.get(session_id)
+
+    def update_size(self, session: Session):
+        """
+        Account the messages added to a session since the last update.
+
+        Args:
+            session (Session): The session whose history has grown.
+        """
+        # A persistent history may load from the database, never under the lock
+        messages = session.history.messages
+        with self._lock:
+            added = sum(
+                estimate_message_size(message)
+                for message in messages[session.measured_messages :]
+            )
+            session.measured_messages = max(session.measured_messages, len(messages))
+            session.size += added
+            evicted = []
+            if session.session_id in self._sessions:
+                self.total_size += added
+                evicted = self._evict_over_budget()
+        self._flush(evicted)
+
+    def evict(self, session_id: str) -> Optional[Session]:
+        """
+        Drop a session from memory.
+
+        Args:
+            session_id (str): The ID of the session.
+
+        Returns:
+            Optional[Session]: The dropped session, if it existed.
+        """
+        with self._lock:
+            session = self._pop(session_id)
+        if session is not None:
+            self._flush([session])
+        return session
+
+    def _pop(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.total_size -= session.size
+            self.evictions += 1
+            if self.debug:
+                self.logger.debug(f"Evicted session {session_id}")
+        return session
+
+    def _flush(self, sessions: List[Session]):
+        # Database I/O, so it never runs under the lock
+        for session in sessions:
+            # Persistent histories may still buffer an unfinished turn
+            flush = getattr(session.history, "flush", None)
+            if flush is None:
+                continue
+            try:
+                flush()
+            except Exception as e:
+                self.logger.error(
+                    f"Failed to flush history of session {session.session_id}",
+                    exc_info=e,
+                )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: The number of sessions, their estimated size and the
+            number of evictions so far.
+        """
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_size": self.total_size,
+                "evictions": self.evictions,
+            }
+
+    def _evict_expired(self, now: float) -> List[Session]:
+        # Least recently used sessions come first, so stop at the first live or busy one
+        evicted = []
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_access <= self.ttl or session.turns:
+                break
+            evicted.append(self._pop(session.session_id))
+        return evicted
+
+    def _evict_over_budget(self) -> List[Session]:
+        # Never evict the most recently used session, stop at one with a turn in flight
+        evicted = []
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self.total_size > self.memory_budget
+        ):
+            session = next(iter(self._sessions.values()))
+            if session.turns:
+                break
+            evicted.append(self._pop(session.session_id))
+        return evicted
@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+from ..Database.NotificationListener import NotificationListener
+
+NOTIFY_CHANNEL = "customer_query_answered"
+NOTIFY_TRIGGER_NAME = "customer_query_answered"
+
+# Install once on the restaurant database to enable push delivery of answers:
+#   python -c "from openwaiterai.Tools.AnswerDispatcher import NOTIFY_TRIGGER_SQL; print(NOTIFY_TRIGGER_SQL)" | psql "$DATABASE_URL"
+NOTIFY_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_customer_query_answered() RETURNS trigger AS $$
+BEGIN
+    IF NEW.answer_text IS NOT NULL
+       AND NEW.answer_text IS DISTINCT FROM OLD.answer_text THEN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', NEW.id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS {NOTIFY_TRIGGER_NAME} ON CustomerManagementQueries;
+CREATE TRIGGER {NOTIFY_TRIGGER_NAME}
+    AFTER UPDATE OF answer_text ON CustomerManagementQueries
+    FOR EACH ROW EXECUTE FUNCTION notify_customer_query_answered();
+"""
+
+
+class AnswerDispatcher(NotificationListener):
+    """
+    Delivers "answer ready" events for CustomerManagementQueries rows.
+
+    One background thread keeps a single LISTEN connection open and resolves
+    the futures registered for a query id when Postgres notifies that the row
+    has been answered. Waiters get ``True`` when notified, or ``False`` when the
+    listener stops and they have to fall back to polling.
+    """
+
+    description: str = "answer"
+    restart_interval: float = 30.0
+
+    _shared: Dict[Tuple[str, str], "AnswerDispatcher"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        connection_factory: Callable,
+        channel: str = NOTIFY_CHANNEL,
+        poll_timeout: float = 1.0,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            connection_factory (Callable): Returns a new DB-API connection that
+                supports LISTEN (``fileno``, ``poll`` and ``notifies``).
+            channel (str): The notification channel to listen on.
+            poll_timeout (float): How long the listener blocks in ``select``
+                before checking whether it has been closed.
+            debug (bool): Enables debug logging.
+        """
+        super().__init__(
+            connection_factory,
+            channel,
+            trigger_name=NOTIFY_TRIGGER_NAME,
+            poll_timeout=poll_timeout,
+            debug=debug,
+        )
+        self._waiters: Dict[str, List[Future]] = {}
+
+    @classmethod
+    def _after_fork(cls):
+        # The listener threads of the parent do not exist in a forked child
+        cls._shared_lock = threading.Lock()
+        cls._shared = {}
+
+    @classmethod
+    def shared(
+        cls, dsn: str, channel: str = NOTIFY_CHANNEL, debug: bool = False
+    ) -> "AnswerDispatcher":
+        """
+        Return the process-wide dispatcher for a database, starting it if needed.
+
+        Args:
+            dsn (str): The libpq connection string of the restaurant database.
+            channel (str): The notification channel to listen on.
+            debug (bool): Enables debug logging.
+
+        Returns:
+            AnswerDispatcher: The shared dispatcher. Check ``available`` before
+            relying on notifications.
+        """
+        with cls._shared_lock:
+            dispatcher = cls._shared.get((dsn, channel))
+            if dispatcher is None:
+                dispatcher = cls(lambda: _connect(dsn), channel, debug=debug)
+                cls._shared[(dsn, channel)] = dispatcher
+                dispatcher.start()
+            elif (
+                not dispatcher.available
+                and time.monotonic() - dispatcher.started_at > cls.restart_interval
+            ):
+                dispatcher.start()
+        return dispatcher
+
+    def register(self, query_id: str) -> Future:
+        """
+        Register interest in the answer of a query.
+
+        Args:
+            query_id (str): The ID of the query.
+
+        Returns:
+            Future: Resolves to True when the answer is ready, or False if the
+            listener stopped.
+        """
+        future = Future()
+        with self._lock:
+            if not self.available:
+                future.set_result(False)
+                return future
+            self._waiters.setdefault(str(query_id), []).append(future)
+        return future
+
+    def unregister(self, query_id: str, future: Future):
+        """
+        Remove a future that is no longer waited on.
+
+        Args:
+            query_id (str): The ID of the query.
+            future (Future): The future returned by ``register``.
+        """
+        with self._lock:
+            waiters = self._waiters.get(str(query_id))
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[str(query_id)]
+
+    def dispatch(self, payload: str):
+        """
+        Wake every waiter of the query named by a notification payload.
+
+        Args:
+            payload (str): The notification payload, i.e. the query ID.
+        """
+        with self._lock:
+            waiters = self._waiters.pop(str(payload).strip(), [])
+        if self.debug:
+            self.logger.debug(
+                "Answer ready for query %s, waking %d waiter(s)", payload, len(waiters)
+            )
+        for future in waiters:
+            if not future.done():
+                future.set_result(True)
+
+    def on_stop(self):
+        # Release every waiter so it falls back to polling
+        with self._lock:
+            waiters, self._waiters = self._waiters, {}
+        for futures in waiters.values():
+            for future in futures:
+                if not future.done():
+                    future.set_result(False)
+
+
+def _connect(dsn: str):
+    # psycopg2 is only needed once a Postgres listener starts
+    import psycopg2
+
+    return psycopg2.connect(dsn)
+
+
+# Forked server workers listen on their own connections
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=AnswerDispatcher._after_fork)
@@ -1,11 +1,14 @@
 import os
-import ast
-import time
 import logging
 from typing import Optional
 
 from langchain.tools import BaseTool
-from langchain_community.utilities import SQLDatabase
+from sqlalchemy.engine import Engine
+
+from ..Database import EngineRegistry
+from ..Tracing import get_tracer
+from .AnswerDispatcher import AnswerDispatcher, NOTIFY_CHANNEL
+from .QuestionCoalescer import QuestionCoalescer
 
 
 class CustomerQueryTool(BaseTool):
@@ -14,51 +17,86 @@ class CustomerQueryTool(BaseTool):
     """
 
     timeout: int = 30
-    interval: int = 1
     debug: bool = False
     logger: logging.Logger = logging.getLogger(__name__)
     name: str = "CustomerQueryTool"
     description: str = (
         "A tool to query restaurant management. Provide a question as input, and it will return the answer of restaurant management."
     )
-    sql_database: Optional[SQLDatabase] = None
-
-    def __init__(self, debug: bool = False):
+    engine: Optional[Engine] = None
+    dispatcher: Optional[AnswerDispatcher] = None
+    coalescer: Optional[QuestionCoalescer] = None
+
+    def __init__(
+        self,
+        debug: bool = False,
+        engine: Engine = None,
+        dispatcher: AnswerDispatcher = None,
+        coalescer: QuestionCoalescer = None,
+    ):
         """
-        Initializes the SQLQueryTool with a database connection string from environment variables.
+        Initializes the CustomerQueryTool on a shared database engine. The
+        answer dispatcher and the question coalescer are resolved on first use.
+
+        Questions are submitted and their answers fetched by the question
+        coalescer of the engine, so guests asking the same question share one
+        row and one answer, and one query fetches the answers of all guests.
 
         The following environment variables are used:
-        - OPENWAITERAI_DB_HOST: The database host.
-        - OPENWAITERAI_DB_PORT: The database port.
-        - OPENWAITERAI_DB_NAME: The database name.
-        - OPENWAITERAI_DB_USER: The database username.
-        - OPENWAITERAI_DB_PASSWORD: The database password.
         - OPENWAITERAI_QUERY_TIMEOUT: The timeout for the query in seconds.
-        - OPENWAITERAI_POLL_INTERVAL: The interval for polling the query result in seconds.
+        - OPENWAITERAI_QUESTION_BATCH_WINDOW: Seconds new questions are collected before they are inserted.
+        - OPENWAITERAI_POLL_INTERVAL: The initial interval for polling an answer in seconds.
+        - OPENWAITERAI_POLL_MAX_INTERVAL: The upper bound of the polling backoff in seconds.
+        - OPENWAITERAI_POLL_NOTIFY_INTERVAL: Seconds between answer fetches while notifications are delivered.
+        - OPENWAITERAI_QUERY_NOTIFY: Set to 0 to disable LISTEN/NOTIFY answer delivery.
+        - OPENWAITERAI_NOTIFY_CHANNEL: The channel answer notifications are sent on.
+
+        Args:
+            debug (bool): Enables debug logging.
+            engine (Engine): The database engine to use. Defaults to the shared
+                engine of the database configured by the OPENWAITERAI_DB_*
+                environment variables.
+            dispatcher (AnswerDispatcher): Delivers answer notifications. Defaults
+                to the process-wide dispatcher of the database.
+            coalescer (QuestionCoalescer): Submits questions and fetches answers.
+                Defaults to the process-wide coalescer of the engine.
         """
         super().__init__()
         self.debug = debug
         self.logger.setLevel(logging.DEBUG)
 
-        # Configurable timeout and polling interval
+        # Configurable timeout
         self.timeout = int(os.getenv("OPENWAITERAI_QUERY_TIMEOUT", "30"))
-        self.interval = int(os.getenv("OPENWAITERAI_POLL_INTERVAL", "1"))
-
-        # Database connection string
-        db_host = os.getenv("OPENWAITERAI_DB_HOST", "localhost")
-        db_port = os.getenv("OPENWAITERAI_DB_PORT", "5432")
-        db_name = os.getenv("OPENWAITERAI_DB_NAME", "example")
-        db_user = os.getenv("OPENWAITERAI_DB_USER", "user")
-        db_password = os.getenv("OPENWAITERAI_DB_PASSWORD", "password")
-
-        connection_string = (
-            f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-        )
-        try:
-            self.sql_database = SQLDatabase.from_uri(connection_string)
-        except Exception as e:
-            self.logger.error("Failed to connect to database", exc_info=e)
-            raise
+
+        self.engine = engine or EngineRegistry.get_engine()
+        self.dispatcher = dispatcher
+        self.coalescer = coalescer
+
+    def connect(self) -> QuestionCoalescer:
+        """
+        Return the question coalescer, connecting the tool on first use.
+
+        Returns:
+            QuestionCoalescer: The coalescer questions are asked through.
+        """
+        if self.coalescer is not None:
+            return self.coalescer
+
+        # Push delivery of answers, polling is used when it is not available
+        engine = self.engine
+        if (
+            self.dispatcher is None
+            and engine.dialect.name == "postgresql"
+            and os.getenv("OPENWAITERAI_QUERY_NOTIFY", "1") != "0"
+        ):
+            channel = os.getenv("OPENWAITERAI_NOTIFY_CHANNEL", NOTIFY_CHANNEL)
+            dsn = engine.url.set(drivername="postgresql").render_as_string(
+                hide_password=False
+            )
+            self.dispatcher = AnswerDispatcher.shared(dsn, channel, debug=self.debug)
+
+        self.coalescer = QuestionCoalescer.shared(engine, self.dispatcher, debug=self.debug)
+        return self.coalescer
 
     def _run(self, query: str) -> str:
         """
@@ -73,33 +111,9 @@ class CustomerQueryTool(BaseTool):
         if self.debug:
             self.logger.debug("Submitting question: %s", query)
 
-        # Submit the question to the SQL database
-        query_id = self._submit_query(query)
-        if self.debug:
-            self.logger.debug("Submitted question ID: %s", query_id)
-
-        # Get the result of the question
-        start_time = time.time()
-
-        query_result = None
-        while True:
-            # Poll for the result
-            query_result = self._get_query_result(query_id)
-
-            # Check if the result is ready
-            if query_result is not None:
-                break
-
-            # Check for timeout
-            if time.time() - start_time > self.timeout:
-                raise TimeoutError(
-                    f"Query {query_id} timed out after {self.timeout} seconds"
-                )
-
-            # Sleep for a while before checking again
-            if self.debug:
-                self.logger.debug("Result for query %s not ready, waiting...", query_id)
-            time.sleep(self.interval)
+        with get_tracer().span("customer_query.wait") as span:
+            query_result = self.connect().ask(query, self.timeout)
+            span.set("mode", self._mode())
 
         if self.debug:
             self.logger.debug("Query result: %s", query_result)
@@ -107,83 +121,29 @@ class CustomerQueryTool(BaseTool):
 
     async def _arun(self, query: str) -> str:
         """
-        Asynchronously execute an SQL query.
+        Asynchronously ask a customer question and return the result as a string.
+
+        The coalescer thread runs the statements on the sync engine, so the
+        event loop only awaits the shared answer.
 
         Args:
-            query (str): The SQL query to execute.
+            query (str): The customer question
 
         Returns:
             str: The query result.
         """
-        raise NotImplementedError("Async query is not supported.")
+        if self.debug:
+            self.logger.debug("Submitting question: %s", query)
 
-    def _submit_query(self, query: str) -> str:
-        """
-        Submit a query to the SQL database and return the result.
+        with get_tracer().span("customer_query.wait") as span:
+            query_result = await self.connect().aask(query, self.timeout)
+            span.set("mode", self._mode())
 
-        Args:
-            query (str): The SQL query to execute.
-
-        Returns:
-            str: The query result.
-        """
-        safe_q = query.replace("'", "''")
-        insert_sql = (
-            f"INSERT INTO CustomerManagementQueries (question_text) "
-            f"VALUES ('{safe_q}') RETURNING id;"
-        )
-        try:
-            result = self.sql_database.run(insert_sql)
-        except Exception as e:
-            self.logger.error("Failed to submit query", exc_info=e)
-            raise
-
-        # Parse string result into Python object if needed
-        if isinstance(result, str):
-            try:
-                result = ast.literal_eval(result)
-            except Exception:
-                pass
-
-        # Extract the ID – `result` may be a list of tuples or a raw value
-        if isinstance(result, list) and result:
-            inserted_id = result[0][0]
-        else:
-            inserted_id = result
-        return str(inserted_id).strip()
-
-    def _get_query_result(self, query_id: str) -> str:
-        """
-        Get the result of a query by its ID.
+        if self.debug:
+            self.logger.debug("Query result: %s", query_result)
+        return query_result
 
-        Args:
-            query_id (str): The ID of the query.
-        Returns:
-            str: The query result.
-        """
-        select_sql = (
-            f"SELECT answer_text FROM CustomerManagementQueries "
-            f"WHERE id = {query_id};"
-        )
-        try:
-            result = self.sql_database.run(select_sql)
-        except Exception as e:
-            self.logger.error("Failed to fetch query result", exc_info=e)
-            raise
-
-        # Parse string result into Python object if needed
-        if isinstance(result, str):
-            try:
-                result = ast.literal_eval(result)
-            except Exception:
-                pass
-
-        if isinstance(result, list) and result:
-            query_result = result[0][0]
-        else:
-            query_result = result
-
-        if query_result is None:
-            return None
-
-        return str(query_result).strip()
+    def _mode(self) -> str:
+        if self.dispatcher is not None and self.dispatcher.available:
+            return "notify"
+        return "poll"
@@ -0,0 +1,213 @@
+import math
+import asyncio
+import logging
+from functools import reduce
+from typing import Callable, Dict, Hashable, List, Optional, Type
+
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field
+from sqlalchemy.engine import Engine
+
+from ..Database import EngineRegistry, format_value
+from ..MenuIndex import NUTRIENTS, MenuIndex
+from ..Tracing import get_tracer
+
+
+class MenuLookupToolInput(BaseModel):
+    item: Optional[str] = Field(
+        default=None,
+        description="ID or name of one menu item to describe. Leave empty to search the menu.",
+    )
+    exclude_allergens: List[str] = Field(
+        default_factory=list,
+        description="Allergens the items must not contain, e.g. ['gluten', 'milk'].",
+    )
+    include_ingredients: List[str] = Field(
+        default_factory=list,
+        description="Ingredients the items must contain.",
+    )
+    exclude_ingredients: List[str] = Field(
+        default_factory=list,
+        description="Ingredients the items must not contain.",
+    )
+    category: Optional[str] = Field(
+        default=None, description="Category name or ID the items must belong to."
+    )
+    min_nutrients: Dict[str, float] = Field(
+        default_factory=dict,
+        description=f"Lower bounds per nutrient ({', '.join(NUTRIENTS)}), e.g. {{'protein': 30}}.",
+    )
+    max_nutrients: Dict[str, float] = Field(
+        default_factory=dict,
+        description=f"Upper bounds per nutrient ({', '.join(NUTRIENTS)}), e.g. {{'calories': 600}}.",
+    )
+    limit: int = Field(default=20, description="Maximum number of items returned.")
+
+
+class MenuLookupTool(BaseTool):
+    """
+    A LangChain tool for allergen, ingredient and nutrition lookups on an
+    in-memory menu index, without writing SQL.
+    """
+
+    debug: bool = False
+    logger: logging.Logger = logging.getLogger(__name__)
+    name: str = "MenuLookupTool"
+    description: str = (
+        "A fast tool to look up the menu without writing SQL. Describe one menu item "
+        "(allergens, ingredients, nutrition), or find menu items by allergens or "
+        "ingredients to avoid, ingredients to include, category and nutrition limits. "
+        "Prefer it over SQLQueryTool for allergen, ingredient and nutrition questions."
+    )
+    args_schema: Type[BaseModel] = MenuLookupToolInput
+    engine: Optional[Engine] = None
+    index: Optional[MenuIndex] = None
+    menu_version: Optional[Callable[[], Hashable]] = None
+
+    def __init__(
+        self,
+        debug: bool = False,
+        engine: Engine = None,
+        menu_version: Callable[[], Hashable] = None,
+    ):
+        """
+        Initializes the MenuLookupTool. The index is built on first use.
+
+        Args:
+            debug (bool): Enables debug logging.
+            engine (Engine): The database engine to build the index from.
+                Defaults to the shared engine of the database configured by the
+                OPENWAITERAI_DB_* environment variables.
+            menu_version (Callable[[], Hashable]): Returns the current menu
+                version, the index is rebuilt whenever it changes.
+        """
+        super().__init__()
+        self.debug = debug
+        self.logger.setLevel(logging.DEBUG)
+        self.engine = engine or EngineRegistry.get_engine()
+        self.menu_version = menu_version
+
+    def get_index(self) -> MenuIndex:
+        """
+        Return the menu index, rebuilding it when the menu version changed.
+        """
+        version = self.menu_version() if self.menu_version else None
+        index = self.index
+        if index is None or index.version != version:
+            with get_tracer().span("db.menu_index"):
+                index = MenuIndex.from_engine(self.engine, version)
+            self.index = index
+            if self.debug:
+                self.logger.debug(f"Menu index built: {len(index)} items, version {version}")
+        return index
+
+    def _run(
+        self,
+        item: Optional[str] = None,
+        exclude_allergens: List[str] = None,
+        include_ingredients: List[str] = None,
+        exclude_ingredients: List[str] = None,
+        category: Optional[str] = None,
+        min_nutrients: Dict[str, float] = None,
+        max_nutrients: Dict[str, float] = None,
+        limit: int = 20,
+    ) -> str:
+        """
+        Describe one menu item or search the menu.
+
+        Returns:
+            str: The lookup result.
+        """
+        if self.debug:
+            self.logger.debug(
+                f"Menu lookup: item={item} exclude_allergens={exclude_allergens} "
+                f"include_ingredients={include_ingredients} exclude_ingredients={exclude_ingredients} "
+                f"category={category} min={min_nutrients} max={max_nutrients}"
+            )
+        try:
+            index = self.get_index()
+        except Exception as e:
+            self.logger.error("Failed to build menu index", exc_info=e)
+            return f"Error reading the menu: {e}"
+
+        if item:
+            position = index.find_item(item)
+            if position is None:
+                return f"No menu item matches '{item}'."
+            return self._render_item(index.describe(position))
+
+        notes = []
+        unknown_nutrients = [
+            nutrient
+            for nutrient in list(min_nutrients or {}) + list(max_nutrients or {})
+            if nutrient not in NUTRIENTS
+        ]
+        if unknown_nutrients:
+            return (
+                f"Unknown nutrients: {', '.join(unknown_nutrients)}. "
+                f"Known nutrients: {', '.join(NUTRIENTS)}."
+            )
+
+        allergen_masks, allergens, unknown = index.allergens.resolve(exclude_allergens or [])
+        if unknown:
+            # Never report an item as safe for an allergen we do not know
+            return (
+                f"Unknown allergens: {', '.join(unknown)}. "
+                f"Known allergens: {', '.join(index.allergens.names)}."
+            )
+        include_masks, included, unknown = index.ingredients.resolve(include_ingredients or [])
+        if unknown:
+            return f"No menu item contains: {', '.join(unknown)}."
+        exclude_masks, excluded, unknown = index.ingredients.resolve(exclude_ingredients or [])
+        if unknown:
+            notes.append(f"no menu item contains {', '.join(unknown)}")
+
+        positions = index.search(
+            exclude_allergens=reduce(int.__or__, allergen_masks, 0),
+            include_ingredients=include_masks,
+            exclude_ingredients=reduce(int.__or__, exclude_masks, 0),
+            category=category,
+            min_nutrients=min_nutrients,
+            max_nutrients=max_nutrients,
+        )
+
+        if allergens:
+            notes.append(f"without allergens {', '.join(allergens)}")
+        if included:
+            notes.append(f"ingredients matched {', '.join(included)}")
+        if excluded:
+            notes.append(f"without ingredients {', '.join(excluded)}")
+        if min_nutrients or max_nutrients:
+            notes.append("items without nutrition data are excluded")
+
+        lines = [f"{len(positions)} matching menu items" + (f" ({'; '.join(notes)})" if notes else "") + ":"]
+        for position in positions[:limit]:
+            calories = index.nutrition["calories"][position]
+            lines.append(
+                f"- {index.item_ids[position]} {index.names[position]}"
+                f" [{index.category_names[position]}]"
+                + ("" if math.isnan(calories) else f", {format_value(calories)} kcal")
+            )
+        if len(positions) > limit:
+            lines.append(f"(showing the first {limit})")
+        return "\n".join(lines)
+
+    async def _arun(self, **kwargs) -> str:
+        """
+        Asynchronously describe one menu item or search the menu.
+        """
+        # Rebuilding the menu index blocks on the database
+        return await asyncio.to_thread(self._run, **kwargs)
+
+    def _render_item(self, description: Dict) -> str:
+        nutrition = ", ".join(
+            f"{nutrient} {format_value(value)}" for nutrient, value in description["nutrition"].items()
+        )
+        return "\n".join(
+            [
+                f"{description['id']} {description['name']} [{description['category']}]",
+                f"allergens: {', '.join(description['allergens']) or 'none listed'}",
+                f"ingredients: {', '.join(description['ingredients']) or 'none listed'}",
+                f"nutrition: {nutrition or 'not available'}",
+            ]
+        )
@@ -0,0 +1,471 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+from ..Database import PreparedStatement
+from ..Tracing import get_tracer
+from .AnswerDispatcher import AnswerDispatcher
+
+# A single question or answer is run as a prepared statement
+SUBMIT_QUESTION = PreparedStatement(
+    "openwaiterai_submit_question",
+    "INSERT INTO CustomerManagementQueries (question_text) "
+    "VALUES (:question_text) RETURNING id",
+)
+GET_ANSWER = PreparedStatement(
+    "openwaiterai_get_answer",
+    "SELECT answer_text FROM CustomerManagementQueries WHERE id = :id",
+)
+# One statement shape for any number of pending questions on Postgres
+GET_ANSWERS = PreparedStatement(
+    "openwaiterai_get_answers",
+    "SELECT id, answer_text FROM CustomerManagementQueries WHERE id = ANY(:ids)",
+)
+GET_ANSWERS_PORTABLE = text(
+    "SELECT id, answer_text FROM CustomerManagementQueries WHERE id IN :ids"
+).bindparams(bindparam("ids", expanding=True))
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase a question and collapse whitespace and trailing punctuation.
+    """
+    return " ".join(question.lower().split()).rstrip(" ?!.")
+
+
+class PendingQuestion:
+    """
+    One management question in flight, shared by every guest who asked it.
+    """
+
+    __slots__ = (
+        "key",
+        "text",
+        "enqueued_at",
+        "query_id",
+        "answer",
+        "waiters",
+        "notification",
+        "delay",
+        "poll_at",
+    )
+
+    def __init__(self, key: str, question: str):
+        self.key = key
+        self.text = question
+        self.enqueued_at = time.monotonic()
+        self.query_id: Optional[int] = None
+        self.answer: Future = Future()
+        self.waiters = 0
+        self.notification: Optional[Future] = None
+        # Polling backoff of the question while notifications are not delivered
+        self.delay = 0.0
+        self.poll_at = math.inf
+
+
+class QuestionCoalescer:
+    """
+    Submits the management questions of all guests of a process and fetches
+    their answers in batches.
+
+    Guests asking the same question (ignoring case, whitespace and trailing
+    punctuation) while it is unanswered share one CustomerManagementQueries
+    row and its answer. New questions are collected for ``batch_window``
+    seconds and inserted with one multi-row INSERT. One background thread
+    fetches the answers of all due questions with a single query, right away
+    when the answer dispatcher is notified that one of them was answered.
+    Without notifications every question is polled with exponential backoff,
+    from ``interval`` up to ``max_interval`` seconds. While notifications are
+    delivered, questions are only polled every ``notify_interval`` seconds
+    to catch missed ones.
+
+    The following environment variables are used:
+    - OPENWAITERAI_QUESTION_BATCH_WINDOW: Seconds new questions are collected before they are inserted.
+    - OPENWAITERAI_POLL_INTERVAL: The initial interval for polling an answer in seconds.
+    - OPENWAITERAI_POLL_MAX_INTERVAL: The upper bound of the polling backoff in seconds.
+    - OPENWAITERAI_POLL_NOTIFY_INTERVAL: Seconds between answer fetches while notifications are delivered.
+    """
+
+    _shared: Dict[Tuple[Engine, Optional[AnswerDispatcher]], "QuestionCoalescer"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        engine: Engine,
+        dispatcher: AnswerDispatcher = None,
+        batch_window: float = None,
+        interval: float = None,
+        max_interval: float = None,
+        notify_interval: float = None,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            engine (Engine): The restaurant database engine.
+            dispatcher (AnswerDispatcher): Delivers answer notifications, None
+                to rely on polling.
+            batch_window (float): Seconds new questions are collected before
+                they are inserted.
+            interval (float): The initial interval for polling an answer.
+            max_interval (float): The upper bound of the polling backoff.
+            notify_interval (float): Seconds between answer fetches while
+                notifications are delivered.
+            debug (bool): Enables debug logging.
+        """
+        if batch_window is None:
+            batch_window = float(os.getenv("OPENWAITERAI_QUESTION_BATCH_WINDOW", "0.02"))
+        if interval is None:
+            interval = float(os.getenv("OPENWAITERAI_POLL_INTERVAL", "1"))
+        if max_interval is None:
+            max_interval = float(os.getenv("OPENWAITERAI_POLL_MAX_INTERVAL", "8"))
+        if notify_interval is None:
+            notify_interval = float(os.getenv("OPENWAITERAI_POLL_NOTIFY_INTERVAL", "8"))
+
+        self.engine = engine
+        self.dispatcher = dispatcher
+        self.batch_window = batch_window
+        self.interval = interval
+        self.max_interval = max_interval
+        self.notify_interval = notify_interval
+        self.debug = debug
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.questions = 0
+        self.coalesced = 0
+        self.inserts = 0
+        self.polls = 0
+
+        # Unanswered questions by normalized text, and the submitted ones by ID
+        self._pending: Dict[str, PendingQuestion] = {}
+        self._unsubmitted: List[PendingQuestion] = []
+        self._waiting: Dict[int, PendingQuestion] = {}
+        self._poll_now = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+
+    @classmethod
+    def _after_fork(cls):
+        # The worker threads of the parent do not exist in a forked child
+        cls._shared_lock = threading.Lock()
+        cls._shared = {}
+
+    @classmethod
+    def shared(
+        cls, engine: Engine, dispatcher: AnswerDispatcher = None, debug: bool = False
+    ) -> "QuestionCoalescer":
+        """
+        Return the process-wide coalescer of a database engine.
+
+        Args:
+            engine (Engine): The restaurant database engine.
+            dispatcher (AnswerDispatcher): Delivers answer notifications.
+            debug (bool): Enables debug logging.
+
+        Returns:
+            QuestionCoalescer: The shared coalescer.
+        """
+        with cls._shared_lock:
+            coalescer = cls._shared.get((engine, dispatcher))
+            if coalescer is None:
+                coalescer = cls(engine, dispatcher, debug=debug)
+                cls._shared[(engine, dispatcher)] = coalescer
+        return coalescer
+
+    def ask(self, question: str, timeout: float) -> str:
+        """
+        Ask management a question and wait for the answer.
+
+        Args:
+            question (str): The customer question.
+            timeout (float): Seconds to wait for the answer.
+
+        Returns:
+            str: The answer.
+        """
+        pending = self._join(question)
+        try:
+            return pending.answer.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise self._timeout_error(pending, timeout) from None
+        finally:
+            self._leave(pending)
+
+    async def aask(self, question: str, timeout: float) -> str:
+        """
+        Asynchronously ask management a question and wait for the answer.
+
+        Args:
+            question (str): The customer question.
+            timeout (float): Seconds to wait for the answer.
+
+        Returns:
+            str: The answer.
+        """
+        pending = self._join(question)
+        try:
+            # Shielded, so a cancelled guest does not cancel the shared answer
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(pending.answer)), timeout
+            )
+        except asyncio.TimeoutError:
+            raise self._timeout_error(pending, timeout) from None
+        finally:
+            self._leave(pending)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the number of questions, coalesced waiters, INSERTs and answer fetches.
+        """
+        with self._lock:
+            return {
+                "questions": self.questions,
+                "coalesced": self.coalesced,
+                "inserts": self.inserts,
+                "polls": self.polls,
+                "pending": len(self._pending),
+            }
+
+    def close(self):
+        """
+        Stop the background thread and fail every pending question.
+        """
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._waiting.clear()
+            self._wake.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        for question in pending:
+            if not question.answer.done():
+                question.answer.set_exception(RuntimeError("Question coalescer closed"))
+
+    def _join(self, question: str) -> PendingQuestion:
+        key = normalize_question(question)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Question coalescer closed")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._work, name="openwaiterai-questions", daemon=True
+                )
+                self._thread.start()
+
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = PendingQuestion(key, question)
+                self._unsubmitted.append(pending)
+                self.questions += 1
+                self._wake.notify()
+            else:
+                self.coalesced += 1
+            pending.waiters += 1
+        if self.debug:
+            self.logger.debug("Question %r has %d waiter(s)", key, pending.waiters)
+        return pending
+
+    def _leave(self, pending: PendingQuestion):
+        # Questions nobody waits for are no longer fetched, but are still submitted
+        # so management sees them. Unsubmitted ones stay joinable until then.
+        with self._lock:
+            pending.waiters -= 1
+            if pending.waiters or pending.answer.done() or pending.query_id is None:
+                return
+            if self._pending.get(pending.key) is pending:
+                del self._pending[pending.key]
+            self._waiting.pop(pending.query_id, None)
+        self._unregister(pending)
+
+    def _timeout_error(self, pending: PendingQuestion, timeout: float) -> TimeoutError:
+        label = f"Query {pending.query_id}" if pending.query_id is not None else "Query"
+        return TimeoutError(f"{label} timed out after {timeout} seconds")
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    submit_at = (
+                        self._unsubmitted[0].enqueued_at + self.batch_window
+                        if self._unsubmitted
+                        else math.inf
+                    )
+                    if not self._waiting:
+                        poll_at = math.inf
+                    elif self._poll_now:
+                        poll_at = now
+                    else:
+                        poll_at = min(pending.poll_at for pending in self._waiting.values())
+                    wake_at = min(submit_at, poll_at)
+                    if wake_at <= now:
+                        break
+                    self._wake.wait(None if wake_at == math.inf else wake_at - now)
+
+                batch = []
+                if submit_at <= now:
+                    batch, self._unsubmitted = self._unsubmitted, []
+                polling = poll_at <= now
+                poll_all = self._poll_now
+                self._poll_now = False
+
+            if batch:
+                self._submit(batch)
+            if polling:
+                self._poll(poll_all)
+
+    def _schedule(self, pending: PendingQuestion, now: float):
+        # Notifications wake the poller, polling then only catches missed ones
+        if self.dispatcher is not None and self.dispatcher.available:
+            pending.poll_at = now + self.notify_interval
+            return
+        pending.delay = min(pending.delay * 2, self.max_interval) if pending.delay else self.interval
+        pending.poll_at = now + pending.delay
+
+    def _submit(self, batch: List[PendingQuestion]):
+        try:
+            with get_tracer().span("db.submit_questions", questions=len(batch)):
+                query_ids = self._insert(batch)
+        except Exception as e:
+            self.logger.error("Failed to submit %d question(s)", len(batch), exc_info=e)
+            with self._lock:
+                for pending in batch:
+                    if self._pending.get(pending.key) is pending:
+                        del self._pending[pending.key]
+            for pending in batch:
+                pending.answer.set_exception(e)
+            return
+
+        registered = []
+        with self._lock:
+            self.inserts += 1
+            now = time.monotonic()
+            for pending, query_id in zip(batch, query_ids):
+                pending.query_id = query_id
+                if pending.waiters and not self._closed:
+                    self._schedule(pending, now)
+                    self._waiting[query_id] = pending
+                    registered.append(pending)
+                elif self._pending.get(pending.key) is pending:
+                    del self._pending[pending.key]
+        if self.debug:
+            self.logger.debug("Submitted question IDs: %s", query_ids)
+
+        if self.dispatcher is not None and self.dispatcher.available:
+            for pending in registered:
+                pending.notification = self.dispatcher.register(str(pending.query_id))
+                pending.notification.add_done_callback(self._notified)
+            # An answer may have been written before we started listening
+            with self._lock:
+                self._poll_now = True
+
+    def _insert(self, batch: List[PendingQuestion]) -> List[int]:
+        if len(batch) == 1:
+            return [int(SUBMIT_QUESTION.execute(self.engine, {"question_text": batch[0].text}).scalar())]
+
+        # Questions in a batch are distinct, so the returned rows are matched by text
+        values = ", ".join(f"(:question_{index})" for index in range(len(batch)))
+        params = {f"question_{index}": pending.text for index, pending in enumerate(batch)}
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                text(
+                    f"INSERT INTO CustomerManagementQueries (question_text) VALUES {values} "
+                    "RETURNING id, question_text"
+                ),
+                params,
+            ).all()
+        query_ids = {question_text: int(query_id) for query_id, question_text in rows}
+        return [query_ids[pending.text] for pending in batch]
+
+    def _notified(self, notification: Future):
+        # Also poll when the listener stopped, to reschedule at the polling interval
+        with self._lock:
+            self._poll_now = True
+            self._wake.notify()
+
+    def _poll(self, poll_all: bool = False):
+        # All waiting questions after a notification, otherwise the due ones
+        with self._lock:
+            now = time.monotonic()
+            query_ids = [
+                query_id
+                for query_id, pending in self._waiting.items()
+                if poll_all or pending.poll_at <= now
+            ]
+            if not query_ids:
+                return
+            self.polls += 1
+
+        try:
+            with get_tracer().span("db.poll_answers", questions=len(query_ids)):
+                rows = self._fetch_answers(query_ids)
+        except Exception as e:
+            self.logger.error("Failed to fetch %d answer(s)", len(query_ids), exc_info=e)
+            with self._lock:
+                failed = [self._waiting.pop(query_id, None) for query_id in query_ids]
+                for pending in failed:
+                    if pending is not None and self._pending.get(pending.key) is pending:
+                        del self._pending[pending.key]
+            for pending in failed:
+                if pending is not None:
+                    self._unregister(pending)
+                    pending.answer.set_exception(e)
+            return
+
+        answered = []
+        with self._lock:
+            for query_id, answer in rows:
+                if answer is None:
+                    continue
+                pending = self._waiting.pop(int(query_id), None)
+                if pending is None:
+                    continue
+                if self._pending.get(pending.key) is pending:
+                    del self._pending[pending.key]
+                answered.append((pending, str(answer).strip()))
+            # Back off the questions that are still unanswered
+            now = time.monotonic()
+            for query_id in query_ids:
+                pending = self._waiting.get(query_id)
+                if pending is not None:
+                    self._schedule(pending, now)
+        for pending, answer in answered:
+            self._unregister(pending)
+            if self.debug:
+                self.logger.debug(
+                    "Answer of query %s for %d waiter(s): %s", pending.query_id, pending.waiters, answer
+                )
+            pending.answer.set_result(answer)
+
+    def _fetch_answers(self, query_ids: List[int]) -> List[Tuple]:
+        if len(query_ids) == 1:
+            return [(query_ids[0], GET_ANSWER.execute(self.engine, {"id": query_ids[0]}).scalar())]
+        if self.engine.dialect.name == "postgresql":
+            return GET_ANSWERS.execute(self.engine, {"ids": query_ids}).rows
+        with self.engine.connect() as connection:
+            return connection.execute(GET_ANSWERS_PORTABLE, {"ids": query_ids}).all()
+
+    def _unregister(self, pending: PendingQuestion):
+        if pending.notification is not None and self.dispatcher is not None:
+            self.dispatcher.unregister(str(pending.query_id), pending.notification)
+
+
+# Forked server workers submit and poll questions on their own
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=QuestionCoalescer._after_fork)
@@ -1,88 +1,20 @@
 import os
-import ast
 import logging
-from typing import Optional
+from typing import Callable, Hashable, Optional
 
 from langchain.tools import BaseTool
-from langchain_community.utilities import SQLDatabase
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
 
+from ..ContextCache import MENU_TABLES
+from ..Database import EngineRegistry, QueryResult, execute_query
+from ..Database.QueryCache import QueryCache
+from ..Database.SQLGuard import SQLGuard, SQLGuardError
+from ..Tracing import get_tracer
 
-class SQLQueryTool(BaseTool):
-    """
-    A LangChain tool for querying a SQL database.
-    """
-
-    debug: bool = False
-    logger: logging.Logger = logging.getLogger(__name__)
-    name: str = "SQLQueryTool"
-    description: str = (
-        "A tool to query a SQL database. Provide an SQL query as input, and it will return the results."
-    )
-    sql_database: Optional[SQLDatabase] = None
-
-    def __init__(self, debug: bool = False):
-        """
-        Initializes the SQLQueryTool with a database connection string from environment variables.
-
-        The following environment variables are used:
-        - OPENWAITERAI_DB_HOST: The database host.
-        - OPENWAITERAI_DB_PORT: The database port.
-        - OPENWAITERAI_DB_NAME: The database name.
-        - OPENWAITERAI_DB_USER: The database username.
-        - OPENWAITERAI_DB_PASSWORD: The database password.
-        """
-        super().__init__()
-        self.debug = debug
-        self.logger.setLevel(logging.DEBUG)
-        db_host = os.getenv("OPENWAITERAI_DB_HOST", "localhost")
-        db_port = os.getenv("OPENWAITERAI_DB_PORT", "5432")
-        db_name = os.getenv("OPENWAITERAI_DB_NAME", "example")
-        db_user = os.getenv("OPENWAITERAI_DB_USER", "user")
-        db_password = os.getenv("OPENWAITERAI_DB_PASSWORD", "password")
-
-        connection_string = (
-            f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-        )
-        self.sql_database = SQLDatabase.from_uri(connection_string)
-
-    def _run(self, query: str) -> str:
-        """
-        Execute an SQL query and return the result as a string.
-
-        Args:
-            query (str): The SQL query to execute.
-
-        Returns:
-            str: The query result.
-        """
-        if self.debug:
-            self.logger.debug(f"Executing Query: {query}")
-        try:
-            result = self.sql_database.run(query)  # Use the run method
-            if self.debug:
-                self.logger.debug(f"Query Result: {result}")
-            return str(result)
-        except Exception as e:
-            if self.debug:
-                self.logger.error(f"Error executing query: {e}")
-            return f"Error executing query: {e}"
-
-    async def _arun(self, query: str) -> str:
-        """
-        Asynchronously execute an SQL query. Not implemented in this tool.
-
-        Args:
-            query (str): The SQL query to execute.
-
-        Returns:
-            str: The query result.
-        """
-        raise NotImplementedError("Async query is not supported.")
 
-    def get_schema_description(self):
-        return """
-You can access to restaurant database. Database is a SQL database. You can find database schema below:
--- == RESTAURANT INFO ==
+# The restaurant database schema, as described to the model
+SCHEMA_SQL = """-- == RESTAURANT INFO ==
 CREATE TABLE RestaurantInfo (
     id SERIAL PRIMARY KEY,
     category VARCHAR(50) NOT NULL,
@@ -171,20 +103,165 @@ CREATE TABLE WaiterCalls (
     call_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     reason TEXT NULL
 );
-
 """
 
-    def get_restaurant_description(self):
-        query = "SELECT category, description FROM restaurantinfo;"
-        rows_string = self.sql_database.run(query)
 
+class SQLQueryTool(BaseTool):
+    """
+    A LangChain tool for querying a SQL database.
+    """
+
+    debug: bool = False
+    logger: logging.Logger = logging.getLogger(__name__)
+    name: str = "SQLQueryTool"
+    description: str = (
+        "A tool to query a SQL database. Provide an SQL query as input, and it will return the results."
+    )
+    engine: Optional[Engine] = None
+    async_engine: Optional[AsyncEngine] = None
+    max_rows: int = 100
+    result_format: str = "markdown"
+    query_cache: Optional[QueryCache] = None
+    guard: Optional[SQLGuard] = None
+    menu_version: Optional[Callable[[], Hashable]] = None
+
+    def __init__(
+        self,
+        debug: bool = False,
+        engine: Engine = None,
+        async_engine: AsyncEngine = None,
+        query_cache: QueryCache = None,
+        guard: SQLGuard = None,
+    ):
+        """
+        Initializes the SQLQueryTool on a shared database engine.
+
+        The following environment variables are used:
+        - OPENWAITERAI_QUERY_MAX_ROWS: The maximum number of rows returned to the model.
+        - OPENWAITERAI_QUERY_FORMAT: The rendering of results, ``markdown`` or ``csv``.
+
+        Args:
+            debug (bool): Enables debug logging.
+            engine (Engine): The database engine to use. Defaults to the shared
+                engine of the database configured by the OPENWAITERAI_DB_*
+                environment variables.
+            async_engine (AsyncEngine): The async database engine used by
+                ``_arun``. Defaults to the shared async engine of the database,
+                created on first use.
+            query_cache (QueryCache): Caches the results of read-only menu
+                queries. Defaults to the process-wide cache of the database.
+            guard (SQLGuard): Checks and limits every query before execution.
+                Defaults to a guard configured by the OPENWAITERAI_SQL_*
+                environment variables.
+        """
+        super().__init__()
+        self.debug = debug
+        self.logger.setLevel(logging.DEBUG)
+
+        self.engine = engine or EngineRegistry.get_engine()
+        self.async_engine = async_engine
+        self.max_rows = int(os.getenv("OPENWAITERAI_QUERY_MAX_ROWS", "100"))
+        self.result_format = os.getenv("OPENWAITERAI_QUERY_FORMAT", "markdown")
+        self.query_cache = query_cache or QueryCache.shared(
+            self.engine, MENU_TABLES, debug=self.debug
+        )
+        self.guard = guard or SQLGuard(max_rows=self.max_rows)
+
+    def _run(self, query: str) -> str:
+        """
+        Execute an SQL query and return the result as a string.
+
+        Args:
+            query (str): The SQL query to execute.
+
+        Returns:
+            str: The query result.
+        """
+        if self.debug:
+            self.logger.debug(f"Executing Query: {query}")
+        try:
+            statement = self.guard.check(query)
+            version = self.menu_version() if self.menu_version else None
+            cached = self.query_cache.get(statement.sql, self.max_rows, version)
+            if cached is None:
+                with get_tracer().span("db.query") as span:
+                    cached = self.guard.execute(self.engine, statement)
+                    span.set("rows", len(cached))
+                self.query_cache.put(statement.sql, cached, self.max_rows, version)
+            result = self.render(cached)
+            if self.debug:
+                self.logger.debug(f"Query Result: {result}")
+            return result
+        except SQLGuardError as e:
+            if self.debug:
+                self.logger.error(f"Query rejected: {e.to_dict()}")
+            return e.to_json()
+        except Exception as e:
+            if self.debug:
+                self.logger.error(f"Error executing query: {e}")
+            return SQLGuardError("database_error", str(e)).to_json()
+
+    async def _arun(self, query: str) -> str:
+        """
+        Asynchronously execute an SQL query and return the result as a string.
+
+        Args:
+            query (str): The SQL query to execute.
+
+        Returns:
+            str: The query result.
+        """
+        if self.debug:
+            self.logger.debug(f"Executing Query: {query}")
         try:
-            # Safely parse the string to a list of tuples.
-            rows = ast.literal_eval(rows_string)
-        except (SyntaxError, ValueError) as e:
+            statement = self.guard.check(query)
+            version = self.menu_version() if self.menu_version else None
+            cached = self.query_cache.get(statement.sql, self.max_rows, version)
+            if cached is None:
+                with get_tracer().span("db.query") as span:
+                    cached = await self.guard.aexecute(self.get_async_engine(), statement)
+                    span.set("rows", len(cached))
+                self.query_cache.put(statement.sql, cached, self.max_rows, version)
+            result = self.render(cached)
+            if self.debug:
+                self.logger.debug(f"Query Result: {result}")
+            return result
+        except SQLGuardError as e:
             if self.debug:
-                self.logger.error(f"Could not parse result: {e}")
-            return "You do not have any information about your restaurant."
+                self.logger.error(f"Query rejected: {e.to_dict()}")
+            return e.to_json()
+        except Exception as e:
+            if self.debug:
+                self.logger.error(f"Error executing query: {e}")
+            return SQLGuardError("database_error", str(e)).to_json()
+
+    def get_async_engine(self) -> AsyncEngine:
+        """
+        Return the async engine of the tool, creating the shared one on first use.
+        """
+        if self.async_engine is None:
+            self.async_engine = EngineRegistry.get_async_engine(
+                self.engine.url.render_as_string(hide_password=False)
+            )
+        return self.async_engine
+
+    def render(self, result: QueryResult) -> str:
+        """
+        Render a query result for the model, bounded to ``max_rows`` rows.
+        """
+        if self.result_format == "csv":
+            return result.to_csv(max_rows=self.max_rows)
+        return result.to_markdown(max_rows=self.max_rows)
+
+    def get_schema_description(self):
+        return f"""
+You can access to restaurant database. Database is a SQL database. You can find database schema below:
+{SCHEMA_SQL}
+"""
+
+    def get_restaurant_description(self) -> str:
+        query = "SELECT category, description FROM restaurantinfo ORDER BY id;"
+        rows = execute_query(self.engine, query).rows
 
         summary = ""
         categories = ""
@@ -200,11 +277,16 @@ CREATE TABLE WaiterCalls (
 
         return restaurant_description
 
-    def get_menu_description(self):
+    def get_menu_description(self) -> str:
         """
-        Returns a dictionary with a "categories" key, mapping to a list of
-        { id, name, items } objects. Each "items" value is a list of { id, name }
-        for the menu items in that category.
+        Returns the menu as one compact line per category, listing the ID and
+        name of every menu item in that category.
+
+        The rendering is deterministic so the system message stays
+        byte-identical while the menu does not change.
+
+        Raises:
+            SQLAlchemyError: If the menu cannot be read.
         """
 
         # SQL to fetch category and related menu item info
@@ -219,16 +301,8 @@ CREATE TABLE WaiterCalls (
                 ORDER BY c.id, m.id;
             """
 
-        # Execute the query
-        rows_string = self.sql_database.run(query)
-
-        try:
-            # Safely parse the string to a list of tuples.
-            rows = ast.literal_eval(rows_string)
-        except (SyntaxError, ValueError) as e:
-            if self.debug:
-                self.logger.error(f"Could not parse result: {e}")
-            return {"categories": []}
+        # Execute the query, errors propagate so the cached context is kept
+        rows = execute_query(self.engine, query).rows
 
         # We'll group them by category_id
         categories_map = {}
@@ -244,9 +318,16 @@ CREATE TABLE WaiterCalls (
                     {"id": item_id, "name": item_name}
                 )
 
-        # Convert to a list
-        categories_list = list(categories_map.values())
+        # One line per category: "- [category id] name: item id=item name; ..."
+        lines = []
+        for category in categories_map.values():
+            items = "; ".join(f"{item['id']}={item['name']}" for item in category["items"])
+            lines.append(f"- [{category['id']}] {category['name']}: {items}")
 
-        menu_description = f"You can find menu categories and contents below:\nmenu categories: {str(categories_list)}"
+        menu_description = (
+            "You can find menu categories and contents below "
+            "(- [category id] category name: menu item id=menu item name; ...):\n"
+            + "\n".join(lines)
+        )
 
         return menu_description
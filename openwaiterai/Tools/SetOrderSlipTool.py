@@ -1,32 +1,81 @@
+import json
+import asyncio
 import logging
-from typing import Type, List
+from typing import Any, Dict, Literal, Type, List, Optional
 
 from langchain.tools import BaseTool
+from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
+from sqlalchemy.exc import IntegrityError
+
+from ..OrderSlip import OrderSlip
+from ..OrderStore import OrderStore
+from ..SessionManager import Session, SessionManager
+from ..Tracing import get_tracer
+from .ToolRegistry import ToolCallError
+
+DEFAULT_SESSION_ID = "openwaiterai"
 
 
 class Order(BaseModel):
     id: int
     name: str
     quantity: int
+    notes: Optional[str] = Field(
+        default=None, description="Preparation notes, e.g. medium-rare or no onions"
+    )
+
+
+class OrderChange(BaseModel):
+    op: Literal["add", "remove", "update"] = Field(
+        description="add items, remove items or update a line of the slip"
+    )
+    id: int = Field(description="The menu item id")
+    name: Optional[str] = Field(
+        default=None, description="The item name, required to add an item that is not on the slip"
+    )
+    quantity: Optional[int] = Field(
+        default=None,
+        description="add: how many to add (default 1), remove: how many to remove "
+        "(default all), update: the new quantity (0 removes the line)",
+    )
+    notes: Optional[str] = Field(
+        default=None, description="Preparation notes of the line, e.g. medium-rare or no onions"
+    )
 
 
 class SetOrderSlipToolInput(BaseModel):
-    order_slip: List[Order] = Field(
-        description="List of ordered items",
-        example=[
-            {
-                "id": 1,
-                "name": "Pizza",
-                "quantity": 2,
-            },
-            {
-                "id": 2,
-                "name": "Pasta",
-                "quantity": 1,
-            },
-        ],
+    changes: Optional[List[OrderChange]] = Field(
+        default=None,
+        description="Changes to the current order slip, applied in order",
+        json_schema_extra={
+            "examples": [
+                [
+                    {"op": "add", "id": 1, "name": "Pizza", "quantity": 2},
+                    {"op": "update", "id": 2, "notes": "no onions"},
+                    {"op": "remove", "id": 3},
+                ]
+            ]
+        },
+    )
+    order_slip: Optional[List[Order]] = Field(
+        default=None,
+        description="The complete order slip, replaces the current one before the changes are applied",
+        json_schema_extra={
+            "examples": [
+                [
+                    {"id": 1, "name": "Pizza", "quantity": 2},
+                    {"id": 2, "name": "Pasta", "quantity": 1},
+                ]
+            ]
+        },
     )
+    checksum: Optional[str] = Field(
+        default=None,
+        description="The checksum of the slip the changes were made for, from the last result. "
+        "Nothing is changed if the slip is different",
+    )
+    show: bool = Field(default=False, description="Also return the complete order slip")
 
 
 class SetOrderSlipTool(BaseTool):
@@ -36,35 +85,202 @@ class SetOrderSlipTool(BaseTool):
 
     debug: bool = False
     logger: logging.Logger = logging.getLogger(__name__)
-    current_order_slip: List[Order] = []
+    session_manager: Optional[SessionManager] = None
+    order_store: Optional[OrderStore] = None
     name: str = "SetOrderSlipTool"
-    description: str = "A tool to set order slips in a restaurant management system."
+    description: str = (
+        "A tool to change the order slip of the table in a restaurant management system. "
+        "Returns the changed lines and a checksum of the slip, and the complete slip with show."
+    )
     args_schema: Type[BaseModel] = SetOrderSlipToolInput
+    # Saves the order, calls are never abandoned on a timeout
+    metadata: Optional[Dict[str, Any]] = {"writes": True}
 
-    def __init__(self, debug: bool = False):
+    def __init__(
+        self,
+        debug: bool = False,
+        session_manager: SessionManager = None,
+        order_store: OrderStore = None,
+    ):
+        """
+        Args:
+            debug (bool): Enables debug logging.
+            session_manager (SessionManager): Holds the order slip of every
+                session. Defaults to a private session manager.
+            order_store (OrderStore): Persists the order slips into the Orders
+                and OrderItems tables. Slips are only kept in memory without it.
+        """
         super().__init__()
         self.debug = debug
         self.logger.setLevel(logging.DEBUG)
+        self.session_manager = session_manager or SessionManager(debug=debug)
+        self.order_store = order_store
 
-    def _run(self, order_slip: List[Order]) -> List[Order]:
+    def _run(
+        self,
+        order_slip: Optional[List[Order]] = None,
+        config: RunnableConfig = None,
+        changes: Optional[List[OrderChange]] = None,
+        checksum: Optional[str] = None,
+        show: bool = False,
+    ) -> str:
         """
-        Set the current order slip and return it.
+        Change the order slip of the calling session and describe the changes.
+
+        The session is taken from ``config["configurable"]["session_id"]``.
+        A complete slip replaces the current one, then the changes are applied
+        in order. With an order store the new slip is saved to the session's
+        order first, so a failed save or an invalid change leaves the previous
+        slip in place. A checksum that does not match the current slip, e.g.
+        of a retried call that was already applied, rejects the call.
 
         Args:
-            order_slip (List[Order]): The list of orders to set.
+            order_slip (List[Order]): The complete order slip.
+            changes (List[OrderChange]): Changes to the current order slip.
+            checksum (str): The short checksum of the slip the changes are for.
+            show (bool): Also return the complete order slip.
 
         Returns:
-            List[Order]: The current order slip.
+            str: JSON with the changed lines, the number of items and the short
+            checksum of the slip, or an error with a hint.
         """
-        self.current_order_slip = order_slip
+        session_id = (config or {}).get("configurable", {}).get("session_id", DEFAULT_SESSION_ID)
+        session = self.session_manager.get(session_id)
+        # Tool calls of one turn may run in parallel, changes of a session must not
+        with session.order_lock:
+            # Changes apply to the stored slip of a session that is not in memory
+            if (
+                order_slip is None
+                and self.order_store is not None
+                and session.stored_order is None
+                and not session.order_slip
+            ):
+                self._restore(session_id, session)
+            current = session.order_slip
+            try:
+                updated = self._apply(current, order_slip, changes, checksum)
+            except ToolCallError as e:
+                if self.debug:
+                    self.logger.error(f"Order slip change of {session_id} rejected: {e.to_dict()}")
+                return e.to_json()
+
+            if self.order_store is not None:
+                with get_tracer().span("db.order_save") as span:
+                    try:
+                        session.stored_order, diff = self.order_store.save(
+                            session_id, updated, known=session.stored_order
+                        )
+                    except IntegrityError as e:
+                        error = ToolCallError(
+                            "invalid_change",
+                            f"The order slip cannot be saved: {e.orig}",
+                            "No change was applied, check the menu item ids. "
+                            f"Current order slip: {current.render()}",
+                        )
+                        if self.debug:
+                            self.logger.error(f"Order slip of {session_id} rejected: {error.to_dict()}")
+                        return error.to_json()
+                    span.set("changed_lines", len(diff))
+            session.order_slip = updated
 
         if self.debug:
-            self.logger.debug(f"Setting Order Slip: {order_slip}")
+            self.logger.debug(f"Setting Order Slip of {session_id}: {updated.render()}")
+
+        result = {
+            "changes": current.delta(updated),
+            "items": updated.items,
+            "checksum": updated.checksum,
+        }
+        if show:
+            result["order_slip"] = updated.render()
+        return json.dumps(result, ensure_ascii=False)
+
+    async def _arun(
+        self,
+        order_slip: Optional[List[Order]] = None,
+        config: RunnableConfig = None,
+        changes: Optional[List[OrderChange]] = None,
+        checksum: Optional[str] = None,
+        show: bool = False,
+    ) -> str:
+        """
+        Asynchronously change the order slip of the calling session.
 
-        return self.current_order_slip
+        Args:
+            order_slip (List[Order]): The complete order slip.
+            changes (List[OrderChange]): Changes to the current order slip.
+            checksum (str): The short checksum of the slip the changes are for.
+            show (bool): Also return the complete order slip.
 
-    async def _arun(self, order_slip: List[Order]) -> List[Order]:
+        Returns:
+            str: JSON with the changed lines, the number of items and the short
+            checksum of the slip.
         """
-        Asynchronously set the current order slip.
+        # Saving the slip blocks on the database
+        return await asyncio.to_thread(self._run, order_slip, config, changes, checksum, show)
+
+    def _apply(
+        self,
+        current: OrderSlip,
+        order_slip: Optional[List[Order]],
+        changes: Optional[List[OrderChange]],
+        checksum: Optional[str],
+    ) -> OrderSlip:
+        if checksum is not None and checksum != current.checksum:
+            raise ToolCallError(
+                "stale_checksum",
+                f"The order slip changed, its checksum is {current.checksum}",
+                f"No change was applied. Current order slip: {current.render()}",
+            )
+        updated = OrderSlip.from_orders(order_slip) if order_slip is not None else current.copy()
+        for change in changes or []:
+            try:
+                if change.op == "add":
+                    updated.add(change.id, change.name, change.quantity, change.notes)
+                elif change.op == "remove":
+                    updated.remove(change.id, change.quantity)
+                else:
+                    updated.update(change.id, change.quantity, change.notes, change.name)
+            except ValueError as e:
+                raise ToolCallError(
+                    "invalid_change",
+                    str(e),
+                    f"No change was applied. Current order slip: {current.render()}",
+                ) from None
+        return updated
+
+    def get_order_slip(self, session_id: str = DEFAULT_SESSION_ID) -> List[Order]:
         """
-        raise NotImplementedError("Async query is not supported.")
+        Return the order slip of a session.
+
+        Sessions that are not in memory, e.g. after a restart, are read from
+        the order store.
+
+        Args:
+            session_id (str): The ID of the session.
+
+        Returns:
+            List[Order]: The order slip, empty if the session is unknown.
+        """
+        session = self.session_manager.peek(session_id)
+        if session is not None and (
+            session.order_slip or session.stored_order is not None or self.order_store is None
+        ):
+            order_slip = session.order_slip
+        elif self.order_store is None:
+            return []
+        else:
+            order_slip = self._restore(session_id, session)
+        return [
+            Order(id=line.id, name=line.name, quantity=line.quantity, notes=line.notes)
+            for line in order_slip
+        ]
+
+    def _restore(self, session_id: str, session: Optional[Session]) -> OrderSlip:
+        stored = self.order_store.load(session_id)
+        if stored is None:
+            return OrderSlip()
+        order_slip = OrderSlip.from_lines(stored.lines, stored.names)
+        if session is not None:
+            session.order_slip, session.stored_order = order_slip, stored
+        return order_slip
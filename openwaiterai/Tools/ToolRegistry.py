@@ -0,0 +1,313 @@
+import json
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Type
+
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain.tools import BaseTool
+from pydantic import BaseModel, ValidationError
+
+from ..Tracing import Histogram
+
+
+class ToolCallError(ValueError):
+    """
+    A tool call that was rejected before it ran, with a code and a hint the
+    model can act on.
+    """
+
+    def __init__(self, code: str, message: str, hint: str = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.hint = hint
+
+    def to_dict(self) -> Dict[str, str]:
+        error = {"error": self.code, "message": self.message}
+        if self.hint:
+            error["hint"] = self.hint
+        return error
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+class ToolStats:
+    """
+    The call count, failures, rejections and latency histogram of one tool.
+    """
+
+    def __init__(self):
+        self.durations = Histogram()
+        self.errors = 0
+        self.rejected = 0
+
+    def snapshot(self) -> Dict[str, float]:
+        durations = self.durations
+        return {
+            "calls": durations.count,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg": durations.total / durations.count if durations.count else 0.0,
+            "p50": durations.percentile(0.5),
+            "p95": durations.percentile(0.95),
+            "p99": durations.percentile(0.99),
+            "max": durations.max,
+        }
+
+
+class RegisteredTool:
+    """
+    A tool with the argument schema the model calls it with, compiled once.
+
+    Tools that change state the model must know about, e.g. the order slip,
+    set ``metadata={"writes": True}``.
+    """
+
+    __slots__ = ("tool", "schema", "parameters", "stats", "writes")
+
+    def __init__(self, tool: BaseTool):
+        self.tool = tool
+        self.writes = bool((tool.metadata or {}).get("writes"))
+        # Tools without an explicit schema infer one from _run on every access.
+        # The full input schema keeps the defaults that tool_call_schema drops.
+        schema = tool.get_input_schema()
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            self.schema: Optional[Type[BaseModel]] = schema
+            # Injected arguments, e.g. the run config, are not passed by the model
+            self.parameters = list(tool.tool_call_schema.model_fields)
+        else:
+            self.schema = None
+            self.parameters = []
+        self.stats = ToolStats()
+
+    def validate(self, args: Dict):
+        """
+        Check the arguments of a call against the schema of the tool.
+
+        Raises:
+            ToolCallError: If the arguments do not match the schema.
+        """
+        if self.schema is None:
+            return
+        try:
+            self.schema.model_validate(args)
+        except ValidationError as e:
+            # Injected arguments are missing from every call of the model
+            errors = [
+                error
+                for error in e.errors(include_url=False)
+                if not (
+                    error["type"] == "missing"
+                    and error["loc"]
+                    and error["loc"][0] not in self.parameters
+                )
+            ]
+            if not errors:
+                return
+            problems = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'arguments'}: {error['msg']}"
+                for error in errors
+            )
+            raise ToolCallError(
+                "invalid_arguments",
+                f"Invalid arguments for {self.tool.name}: {problems}",
+                f"Parameters: {', '.join(self.parameters)}" if self.parameters else None,
+            ) from None
+
+
+class ToolRegistry:
+    """
+    Maps tool names to tools for the tool calls of the model.
+
+    Every tool's argument schema is compiled once at registration, and tool
+    calls are checked against it before they are scheduled. Calls of unknown
+    tools or with invalid arguments are answered right away with an error
+    ToolMessage that tells the model what to fix. Tools of other packages are
+    added with ``register``, or ``OpenWaiterAI.register_tool`` to also bind
+    them to the model. The call count and latency of every tool are tracked.
+    """
+
+    def __init__(self, tools: Iterable[BaseTool] = (), debug: bool = False):
+        """
+        Args:
+            tools (Iterable[BaseTool]): The tools to register.
+            debug (bool): Enables debug logging.
+        """
+        self.debug = debug
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        self.unknown = 0
+        self._tools: Dict[str, RegisteredTool] = {}
+        self._lock = threading.Lock()
+        for tool in tools:
+            self.register(tool)
+
+    @property
+    def tools(self) -> List[BaseTool]:
+        """
+        The registered tools, in registration order.
+        """
+        return [registered.tool for registered in self._tools.values()]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def register(self, tool: BaseTool, replace: bool = False):
+        """
+        Register a tool under its name.
+
+        Args:
+            tool (BaseTool): The tool.
+            replace (bool): Replace a registered tool of the same name instead
+                of raising.
+
+        Raises:
+            ValueError: If a tool of the same name is registered and ``replace``
+                is False.
+        """
+        registered = RegisteredTool(tool)
+        with self._lock:
+            if tool.name in self._tools and not replace:
+                raise ValueError(f"A tool named {tool.name} is already registered")
+            # Copy on write, so lookups never see a dictionary that is being changed
+            tools = dict(self._tools)
+            tools[tool.name] = registered
+            self._tools = tools
+        if self.debug:
+            self.logger.debug(f"Registered tool {tool.name}: {registered.parameters}")
+
+    def unregister(self, name: str) -> BaseTool:
+        """
+        Remove a tool.
+
+        Args:
+            name (str): The name of the tool.
+
+        Returns:
+            BaseTool: The removed tool.
+        """
+        with self._lock:
+            tools = dict(self._tools)
+            registered = tools.pop(name)
+            self._tools = tools
+        return registered.tool
+
+    def get(self, name: str) -> Optional[BaseTool]:
+        """
+        Return the tool of a name, or None if there is none.
+        """
+        registered = self._tools.get(name)
+        return registered.tool if registered is not None else None
+
+    def writes(self, name: str) -> bool:
+        """
+        Return True if the tool of a name changes state, so its calls must not
+        be abandoned while they run.
+        """
+        registered = self._tools.get(name)
+        return registered is not None and registered.writes
+
+    def resolve(self, tool_call: ToolCall) -> BaseTool:
+        """
+        Return the tool of a call after checking its arguments.
+
+        Args:
+            tool_call (ToolCall): The tool call of the model.
+
+        Returns:
+            BaseTool: The tool to run the call with.
+
+        Raises:
+            ToolCallError: If the tool is unknown or the arguments are invalid.
+        """
+        registered = self._tools.get(tool_call["name"])
+        if registered is None:
+            with self._lock:
+                self.unknown += 1
+            raise ToolCallError(
+                "unknown_tool",
+                f"There is no tool named {tool_call['name']}",
+                f"Available tools: {', '.join(self._tools)}",
+            )
+        try:
+            registered.validate(tool_call["args"])
+        except ToolCallError:
+            with self._lock:
+                registered.stats.rejected += 1
+            raise
+        return registered.tool
+
+    def reject(self, tool_call: ToolCall, error: ToolCallError) -> ToolMessage:
+        """
+        Return the error ToolMessage of a rejected call.
+        """
+        if self.debug:
+            self.logger.debug(f"Rejected call of {tool_call['name']}: {error}")
+        return ToolMessage(
+            content=error.to_json(),
+            tool_call_id=tool_call["id"],
+            name=tool_call["name"],
+            status="error",
+        )
+
+    def invoke(
+        self, tool: BaseTool, tool_call: ToolCall, config: RunnableConfig = None
+    ) -> ToolMessage:
+        """
+        Run a tool call and record its latency.
+        """
+        start_time = time.perf_counter()
+        failed = True
+        try:
+            message = tool.invoke(tool_call, config)
+            failed = getattr(message, "status", None) == "error"
+            return message
+        finally:
+            self.record(tool.name, time.perf_counter() - start_time, failed)
+
+    async def ainvoke(
+        self, tool: BaseTool, tool_call: ToolCall, config: RunnableConfig = None
+    ) -> ToolMessage:
+        """
+        Asynchronously run a tool call and record its latency.
+        """
+        start_time = time.perf_counter()
+        failed = True
+        try:
+            message = await tool.ainvoke(tool_call, config)
+            failed = getattr(message, "status", None) == "error"
+            return message
+        finally:
+            self.record(tool.name, time.perf_counter() - start_time, failed)
+
+    def record(self, name: str, duration: float, failed: bool = False):
+        """
+        Record a finished call of a tool.
+
+        Args:
+            name (str): The name of the tool.
+            duration (float): The duration of the call in seconds.
+            failed (bool): True if the call raised or returned an error.
+        """
+        registered = self._tools.get(name)
+        if registered is None:
+            return
+        with self._lock:
+            registered.stats.durations.record(duration)
+            if failed:
+                registered.stats.errors += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return the calls, errors, rejections and latency percentiles in
+        seconds of every tool.
+        """
+        with self._lock:
+            return {name: registered.stats.snapshot() for name, registered in self._tools.items()}
@@ -1,3 +1,5 @@
 from .SQLQueryTool import SQLQueryTool
+from .MenuLookupTool import MenuLookupTool
 from .CustomerQueryTool import CustomerQueryTool
 from .SetOrderSlipTool import SetOrderSlipTool
+from .ToolRegistry import ToolCallError, ToolRegistry
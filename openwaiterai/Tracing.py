@@ -0,0 +1,357 @@
+import os
+import json
+import math
+import time
+import bisect
+import logging
+import itertools
+import threading
+import contextvars
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Histogram buckets from 10 µs to about 20 minutes, four per doubling (at most 19% error)
+BUCKET_BOUNDS = [1e-5 * 2 ** (index / 4) for index in range(0, 4 * 27)]
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar(
+    "openwaiterai_current_span", default=None
+)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """
+    One timed operation, e.g. a model call, a tool call or a database query.
+
+    Spans started while another span is current become its children, also in
+    tool threads and asyncio tasks that inherit the context.
+    """
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "trace_id",
+        "start_time",
+        "duration",
+        "attributes",
+        "error",
+        "_started",
+        "_token",
+    )
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        parent = _current_span.get()
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.start_time = time.time()
+        self.duration = 0.0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._started = 0.0
+        self._token = None
+
+    def set(self, key: str, value: Any):
+        """
+        Set an attribute of the span, e.g. ``tokens`` or ``rows``.
+        """
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "trace_id": self.trace_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def __repr__(self) -> str:
+        return f"Span({self.name}, {self.duration * 1000:.1f} ms, {self.attributes})"
+
+
+class _NoopSpan:
+    # Shared by every span of a disabled tracer, so tracing costs one call
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("tracer", "span")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        span = self.span
+        span._token = _current_span.set(span)
+        span._started = time.perf_counter()
+        return span
+
+    def __exit__(self, exc_type, exc, traceback):
+        span = self.span
+        span.duration = time.perf_counter() - span._started
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # A generator closed in another context, e.g. an abandoned stream
+            pass
+        if exc_type is not None:
+            span.error = exc_type.__name__
+        self.tracer.record(span)
+        return False
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram of durations in seconds with percentile estimates.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, quantile: float) -> float:
+        """
+        Return the upper bound of the bucket that holds the quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(quantile * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+
+class SpanStats:
+    """
+    The duration histogram, token count and errors of all spans of one name.
+    """
+
+    def __init__(self):
+        self.durations = Histogram()
+        self.tokens = 0
+        self.errors = 0
+
+    def record(self, span: Span):
+        self.durations.record(span.duration)
+        self.tokens += span.attributes.get("tokens", 0) or 0
+        if span.error is not None:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        durations = self.durations
+        return {
+            "count": durations.count,
+            "avg": durations.total / durations.count if durations.count else 0.0,
+            "p50": durations.percentile(0.5),
+            "p95": durations.percentile(0.95),
+            "p99": durations.percentile(0.99),
+            "max": durations.max,
+            "tokens": self.tokens,
+            "errors": self.errors,
+        }
+
+
+class SpanExporter:
+    """
+    Receives every finished span. Subclass it to send spans elsewhere.
+    """
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """
+    Keeps the most recent spans in memory.
+    """
+
+    def __init__(self, max_spans: int = None):
+        """
+        Args:
+            max_spans (int): The number of spans kept.
+        """
+        if max_spans is None:
+            max_spans = int(os.getenv("OPENWAITERAI_TRACE_BUFFER", "1000"))
+        self._spans = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self._spans.append(span)
+
+    def spans(self, trace_id: int = None) -> List[Span]:
+        """
+        Return the kept spans, optionally of one trace (e.g. one guest turn).
+        """
+        spans = list(self._spans)
+        if trace_id is not None:
+            spans = [span for span in spans if span.trace_id == trace_id]
+        return spans
+
+    def to_json(self, trace_id: int = None) -> str:
+        return json.dumps([span.to_dict() for span in self.spans(trace_id)], default=str)
+
+
+class JSONLinesExporter(SpanExporter):
+    """
+    Appends every span as one JSON line to a file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+class Tracer:
+    """
+    Records spans of the hot path and keeps p50/p95/p99 durations per span name.
+
+    Span names are dotted by component: ``turn``, ``llm``, ``tool.<name>``,
+    ``db.<operation>``, ``history.<operation>``. A disabled tracer hands out
+    one shared no-op span and records nothing.
+
+    The following environment variables are used:
+    - OPENWAITERAI_TRACING: "memory" keeps recent spans in memory, "jsonl" also
+      appends them to OPENWAITERAI_TRACE_FILE, "off" disables tracing.
+    - OPENWAITERAI_TRACE_FILE: The JSON lines file of the "jsonl" exporter.
+    - OPENWAITERAI_TRACE_BUFFER: The number of spans kept in memory.
+    """
+
+    def __init__(self, exporter: SpanExporter = None, enabled: bool = True):
+        """
+        Args:
+            exporter (SpanExporter): Receives every finished span. Defaults to
+                an in-memory exporter.
+            enabled (bool): Records spans.
+        """
+        self.enabled = enabled
+        self.exporter = exporter if exporter is not None else InMemoryExporter()
+        self.logger = logging.getLogger(__name__)
+        self._stats: Dict[str, SpanStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        mode = os.getenv("OPENWAITERAI_TRACING", "memory")
+        if mode == "off":
+            return cls(enabled=False)
+        if mode == "jsonl":
+            return cls(
+                JSONLinesExporter(
+                    os.getenv("OPENWAITERAI_TRACE_FILE", "openwaiterai_traces.jsonl")
+                )
+            )
+        if mode != "memory":
+            raise ValueError(f"Unknown tracing mode: {mode}")
+        return cls()
+
+    def span(self, name: str, **attributes):
+        """
+        Time a block as a span.
+
+        Args:
+            name (str): The span name, e.g. ``tool.SQLQueryTool``.
+            **attributes: Attributes of the span, e.g. ``session_id``.
+
+        Returns:
+            A context manager that yields the span.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return _ActiveSpan(self, Span(name, attributes))
+
+    def record(self, span: Span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = SpanStats()
+            stats.record(span)
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            self.logger.error(f"Failed to export span {span.name}", exc_info=e)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            Dict[str, Dict[str, float]]: The count, average, p50, p95, p99 and
+            maximum duration in seconds, tokens and errors per span name.
+        """
+        with self._lock:
+            return {name: stats.snapshot() for name, stats in sorted(self._stats.items())}
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Return the tracer of the process, configured from the environment.
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer.from_env()
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """
+    Replace the tracer of the process, e.g. with one that has another exporter.
+
+    Returns:
+        Tracer: The previous tracer.
+    """
+    global _tracer
+    with _tracer_lock:
+        previous, _tracer = _tracer, tracer
+    return previous
@@ -0,0 +1,171 @@
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+DEADLINE_ANSWER = (
+    "I'm sorry, this is taking longer than expected. Could you ask me again in a moment?"
+)
+LIMIT_ANSWER = (
+    "I'm sorry, I couldn't finish looking that up. Could you ask me again, perhaps a bit "
+    "more specifically?"
+)
+
+
+class IterationEvent:
+    """
+    The timing of one iteration of a turn: a model call and the tool calls it made.
+    """
+
+    def __init__(self, iteration: int):
+        self.iteration = iteration
+        self.started_at = time.monotonic()
+        self.model_seconds = 0.0
+        self.tool_seconds = 0.0
+        self.tool_calls = 0
+        self.tokens = 0
+        self.final = False
+
+    def model_finished(self, tokens: int):
+        self.model_seconds = time.monotonic() - self.started_at
+        self.tokens = tokens
+
+    def tools_finished(self, tool_calls: int):
+        self.tool_seconds = time.monotonic() - self.started_at - self.model_seconds
+        self.tool_calls = tool_calls
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "iteration": self.iteration,
+            "model_seconds": round(self.model_seconds, 4),
+            "tool_seconds": round(self.tool_seconds, 4),
+            "tool_calls": self.tool_calls,
+            "tokens": self.tokens,
+            "final": self.final,
+        }
+
+    def __repr__(self) -> str:
+        return f"IterationEvent({self.to_dict()})"
+
+
+class TurnReport:
+    """
+    The iterations of one guest turn and why it stopped.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.iterations: List[IterationEvent] = []
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def tokens(self) -> int:
+        return sum(iteration.tokens for iteration in self.iterations)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def tool_iterations(self) -> int:
+        return sum(1 for iteration in self.iterations if iteration.tool_calls)
+
+    def start_iteration(self) -> IterationEvent:
+        """
+        Start timing the next model call.
+        """
+        iteration = IterationEvent(len(self.iterations) + 1)
+        self.iterations.append(iteration)
+        return iteration
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "elapsed": round(self.elapsed, 4),
+            "tokens": self.tokens,
+            "stop_reason": self.stop_reason,
+            "iterations": [iteration.to_dict() for iteration in self.iterations],
+        }
+
+    def __repr__(self) -> str:
+        return f"TurnReport({self.to_dict()})"
+
+
+class TurnPolicy:
+    """
+    Bounds the model and tool calls of one guest turn.
+
+    A turn calls the model, runs the tool calls of its response and calls the
+    model again with the results until it answers without tool calls. The
+    loop stops early when:
+    - ``max_tool_iterations`` rounds of tool calls have run. The model is
+      called once more without tools to answer from the results it has.
+    - The turn has used ``token_budget`` tokens. The model is called once
+      more without tools.
+    - The turn has run for ``deadline`` seconds. The guest gets a short
+      apology instead of another model call.
+
+    The following environment variables are used:
+    - OPENWAITERAI_MAX_TOOL_ITERATIONS: The rounds of tool calls per turn.
+    - OPENWAITERAI_TURN_DEADLINE: Seconds per turn, 0 for no limit.
+    - OPENWAITERAI_TURN_TOKEN_BUDGET: The tokens per turn, 0 for no limit.
+    """
+
+    def __init__(
+        self,
+        max_tool_iterations: int = None,
+        deadline: float = None,
+        token_budget: int = None,
+        debug: bool = False,
+    ):
+        """
+        Args:
+            max_tool_iterations (int): The rounds of tool calls per turn.
+            deadline (float): Seconds per turn, 0 for no limit.
+            token_budget (int): The tokens per turn, 0 for no limit.
+            debug (bool): Enables debug logging.
+        """
+        if max_tool_iterations is None:
+            max_tool_iterations = int(os.getenv("OPENWAITERAI_MAX_TOOL_ITERATIONS", "8"))
+        if deadline is None:
+            deadline = float(os.getenv("OPENWAITERAI_TURN_DEADLINE", "120"))
+        if token_budget is None:
+            token_budget = int(os.getenv("OPENWAITERAI_TURN_TOKEN_BUDGET", "100000"))
+        self.max_tool_iterations = max_tool_iterations
+        self.deadline = deadline
+        self.token_budget = token_budget
+        self.debug = debug
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+    def limit_reached(self, report: TurnReport) -> Optional[str]:
+        """
+        Return the limit a turn has reached before its next model call.
+
+        Args:
+            report (TurnReport): The turn so far.
+
+        Returns:
+            Optional[str]: ``"deadline"``, ``"max_tool_iterations"`` or
+            ``"token_budget"``, None if the turn may continue.
+        """
+        if not report.iterations:
+            return None
+        if self.deadline and report.elapsed >= self.deadline:
+            return "deadline"
+        if report.tool_iterations >= self.max_tool_iterations:
+            return "max_tool_iterations"
+        if self.token_budget and report.tokens >= self.token_budget:
+            return "token_budget"
+        return None
+
+    def remaining(self, report: TurnReport) -> Optional[float]:
+        """
+        Return the seconds left until the deadline of a turn, None without one.
+        """
+        if not self.deadline:
+            return None
+        return max(self.deadline - report.elapsed, 0.0)
+
+    def log_iteration(self, session_id: str, iteration: IterationEvent):
+        if self.debug:
+            self.logger.debug(f"Turn of {session_id}: {iteration}")
@@ -0,0 +1,1041 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import AsyncIterator, Dict, Generator, Iterator, List, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.chat_history import (
+    BaseChatMessageHistory,
+    InMemoryChatMessageHistory,
+)
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolCall,
+    ToolMessage,
+    message_chunk_to_message,
+)
+from langchain_core.messages.tool import tool_call as create_tool_call
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.tools import BaseTool
+from sqlalchemy.engine import Engine
+
+from .Database import EngineRegistry
+from .SessionManager import Session, SessionManager
+from .OrderStore import OrderStore
+from .HistoryPolicy import HistoryPolicy, HistoryReport, approximate_token_count
+from .TurnPolicy import DEADLINE_ANSWER, LIMIT_ANSWER, TurnPolicy, TurnReport
+from .Tracing import Tracer, get_tracer
+from .ResponseCache import ResponseCache
+from .ContextCache import ContextCache, RestaurantContext
+from .ContextSnapshot import load_snapshot, save_snapshot
+from .PromptAssembler import (
+    AssembledPrompt,
+    PromptAssembler,
+    message_signature,
+    shared_prefix_bytes,
+)
+from .PersistentChatMessageHistory import (
+    PersistentChatMessageHistory,
+    create_history_table,
+)
+from .Tools import (
+    SQLQueryTool,
+    MenuLookupTool,
+    CustomerQueryTool,
+    SetOrderSlipTool,
+    ToolCallError,
+    ToolRegistry,
+)
+
+
+class _TurnClosed(BaseException):
+    # Stands in for the GeneratorExit of a closed turn inside its step generator
+    def __init__(self, closed: GeneratorExit):
+        super().__init__()
+        self.closed = closed
+
+
+class OpenWaiterAI:
+    # Bounded pool shared by all instances to run tool calls of a turn in parallel
+    _tool_executor: ThreadPoolExecutor = None
+    _tool_executor_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_name: str,
+        system_instructions: str,
+        temperature: float = 1.0,
+        max_tokens: int = 4096,
+        debug: bool = False,
+        engine: Engine = None,
+        model: BaseChatModel = None,
+        tool_timeout: float = None,
+        session_manager: SessionManager = None,
+        history_engine: Engine = None,
+        history_policy: HistoryPolicy = None,
+        order_store: OrderStore = None,
+        turn_policy: TurnPolicy = None,
+        response_cache: ResponseCache = None,
+        context_snapshot: str = None,
+        tools: List[BaseTool] = None,
+    ):
+        self.debug = debug
+
+        # Upper bound for the tool calls of one model turn, in seconds
+        if tool_timeout is None:
+            tool_timeout = float(os.getenv("OPENWAITERAI_TOOL_TIMEOUT", "60"))
+        self.tool_timeout = tool_timeout
+
+        # initialize logger
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
+
+        # Shared database engine
+        self.engine = engine or EngineRegistry.get_engine()
+
+        # Chat histories are kept in memory unless a history database is configured
+        if history_engine is None:
+            backend = os.getenv("OPENWAITERAI_HISTORY_BACKEND", "memory")
+            if backend == "database":
+                history_dsn = os.getenv("OPENWAITERAI_HISTORY_DSN")
+                history_engine = (
+                    EngineRegistry.get_engine(history_dsn) if history_dsn else self.engine
+                )
+            elif backend != "memory":
+                raise ValueError(f"Unknown history backend: {backend}")
+        # The history table is created with the first session history
+        self.history_engine = history_engine
+        self._history_table_lock = threading.Lock()
+        self._history_table_created = history_engine is None
+
+        # Order slips are saved to Orders/OrderItems unless they are kept in memory
+        if order_store is None:
+            backend = os.getenv("OPENWAITERAI_ORDER_BACKEND", "database")
+            if backend == "database":
+                order_store = OrderStore(self.engine, debug=self.debug, create_tables=True)
+            elif backend != "memory":
+                raise ValueError(f"Unknown order backend: {backend}")
+        self.order_store = order_store
+
+        # Per-table sessions with bounded memory
+        self.sessions = session_manager or SessionManager(
+            history_factory=self._create_session_history, debug=self.debug
+        )
+        self.session_id = "openwaiterai"
+
+        # Tools
+        sql_tool = SQLQueryTool(debug=self.debug, engine=self.engine)
+        menu_tool = MenuLookupTool(debug=self.debug, engine=self.engine)
+        customer_tool = CustomerQueryTool(debug=self.debug, engine=self.engine)
+        self.set_order_slip_tool = SetOrderSlipTool(
+            debug=self.debug,
+            session_manager=self.sessions,
+            order_store=self.order_store,
+        )
+        # Tools of other packages are registered after the built-in ones
+        self.tool_registry = ToolRegistry(
+            [sql_tool, menu_tool, customer_tool, self.set_order_slip_tool, *(tools or [])],
+            debug=self.debug,
+        )
+
+        # Initialize system message
+        try:
+            with open(system_instructions, "r", encoding="utf-8") as file:
+                self.system_instructions = file.read()
+        except IOError as e:
+            self.logger.error(f"Error reading file {system_instructions}: {e}")
+            raise
+
+        self.schema_description = sql_tool.get_schema_description()
+
+        # Restaurant and menu descriptions are shared by all instances of the process
+        self.context_cache = ContextCache.shared(
+            self.engine,
+            lambda: {
+                "restaurant": sql_tool.get_restaurant_description(),
+                "menu": sql_tool.get_menu_description(),
+            },
+            debug=self.debug,
+        )
+        self.prompt_assembler = PromptAssembler()
+        self._system_prompt = (None, None)
+
+        # Cached menu query results and the menu index follow the menu version
+        self.query_cache = sql_tool.query_cache
+        sql_tool.menu_version = lambda: self.context_cache.version
+        menu_tool.menu_version = lambda: self.context_cache.version
+
+        # Answers to standalone questions about the restaurant and menu, opt-in
+        if response_cache is None and os.getenv("OPENWAITERAI_RESPONSE_CACHE", "0") == "1":
+            response_cache = ResponseCache(debug=self.debug)
+        self.response_cache = response_cache
+
+        # Serve a prebuilt context without the database, or build it now so
+        # startup fails fast without a database
+        if context_snapshot is None:
+            context_snapshot = os.getenv("OPENWAITERAI_CONTEXT_SNAPSHOT") or None
+        snapshot = None
+        if context_snapshot is not None:
+            try:
+                snapshot = load_snapshot(context_snapshot)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Cannot load context snapshot {context_snapshot}: {e}")
+        if snapshot is not None:
+            self.context_cache.seed(snapshot)
+        else:
+            self.context_cache.get()
+
+        # Model settings, the OpenAI client is only imported when it is used
+        if model is None:
+            from langchain_openai import ChatOpenAI
+
+            model = ChatOpenAI(
+                model=model_name,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=None,
+                max_retries=2,
+            )
+        self.base_model = model
+
+        # What the model sees of the history on every call
+        if history_policy is None:
+            summarize = os.getenv("OPENWAITERAI_HISTORY_SUMMARIZE", "0") == "1"
+            history_policy = HistoryPolicy(
+                summarizer=self.base_model if summarize else None, debug=self.debug
+            )
+        self.history_policy = history_policy
+
+        self._bind_tools()
+
+        # Bounds of the tool loop of a turn, the last call of a stopped turn has no tools
+        self.turn_policy = turn_policy or TurnPolicy(debug=self.debug)
+        self.final_chain = RunnableLambda(self._prepare_messages) | self.base_model
+
+    @property
+    def tools(self) -> List[BaseTool]:
+        """
+        The tools the model can call.
+        """
+        return self.tool_registry.tools
+
+    def register_tool(self, tool: BaseTool, replace: bool = False):
+        """
+        Register a tool and bind it to the model, for turns started afterwards.
+
+        Args:
+            tool (BaseTool): The tool.
+            replace (bool): Replace a registered tool of the same name.
+        """
+        self.tool_registry.register(tool, replace=replace)
+        self._bind_tools()
+
+    def get_tool_stats(self):
+        """
+        Return the calls, errors, rejected calls and p50/p95/p99 latencies in
+        seconds of every tool.
+        """
+        return self.tool_registry.stats()
+
+    def _bind_tools(self):
+        self.model = self.base_model.bind_tools(self.tools)
+        self.chain = RunnableLambda(self._prepare_messages) | self.model
+
+    @property
+    def context(self) -> RestaurantContext:
+        """
+        The current restaurant context snapshot.
+        """
+        return self.context_cache.get()
+
+    @property
+    def menu_version(self) -> int:
+        """
+        The version of the restaurant context, incremented on every menu change.
+        """
+        return self.context.version
+
+    @property
+    def restaurant_description(self) -> str:
+        return self.context["restaurant"]
+
+    @property
+    def menu_description(self) -> str:
+        return self.context["menu"]
+
+    @property
+    def system_prompt(self) -> AssembledPrompt:
+        """
+        The system message assembled from the current restaurant context.
+
+        Sections are ordered from most to least stable (instructions, schema,
+        restaurant, menu) so provider prompt caches can reuse the longest prefix.
+        """
+        context = self.context
+        fingerprint, system_prompt = self._system_prompt
+        if fingerprint != context.fingerprint:
+            previous = system_prompt
+            system_prompt = self.prompt_assembler.assemble(
+                {
+                    "instructions": self.system_instructions,
+                    "schema": self.schema_description,
+                    "restaurant": context["restaurant"],
+                    "menu": context["menu"],
+                }
+            )
+            self._system_prompt = (context.fingerprint, system_prompt)
+            if previous is None:
+                self.logger.info(
+                    f"System prompt fingerprints: {system_prompt.prefix_fingerprints}"
+                )
+            else:
+                self.logger.info(
+                    f"System prompt rebuilt, {system_prompt.stable_prefix_bytes(previous)} of "
+                    f"{len(system_prompt.text.encode('utf-8'))} bytes unchanged"
+                )
+        return system_prompt
+
+    @property
+    def system_message(self) -> str:
+        return self.system_prompt.text
+
+    def get_prompt_report(self):
+        """
+        Return the size and fingerprints of every system message section.
+
+        Compare ``prefix_fingerprints`` between deployments to see how much of
+        the prompt prefix they share.
+        """
+        return self.system_prompt.report()
+
+    def save_context_snapshot(self, path: str):
+        """
+        Save the current restaurant context to a snapshot file.
+
+        Pass the file as ``context_snapshot`` (or OPENWAITERAI_CONTEXT_SNAPSHOT)
+        to start later instances without querying the database for it.
+
+        Args:
+            path (str): The snapshot file.
+        """
+        save_snapshot(self.context_cache.refresh(), path)
+
+    def get_pool_metrics(self):
+        """
+        Return checkout, wait time and saturation metrics of the database pool.
+        """
+        return EngineRegistry.get_metrics(self.engine)
+
+    def get_query_cache_stats(self):
+        """
+        Return the hit and miss counters of the SQLQueryTool result cache.
+        """
+        return self.query_cache.stats()
+
+    @property
+    def tracer(self) -> Tracer:
+        return get_tracer()
+
+    def get_trace_stats(self):
+        """
+        Return the count and p50/p95/p99 durations of the traced spans per
+        component, e.g. ``turn``, ``llm``, ``tool.SQLQueryTool`` or ``db.query``.
+        """
+        return self.tracer.stats()
+
+    def _create_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        if self.history_engine is not None:
+            if not self._history_table_created:
+                with self._history_table_lock:
+                    if not self._history_table_created:
+                        create_history_table(self.history_engine)
+                        self._history_table_created = True
+            return PersistentChatMessageHistory(
+                session_id, self.history_engine, debug=self.debug
+            )
+        return InMemoryChatMessageHistory()
+
+    def _end_turn(self, session_id: str):
+        # Persist the messages of the turn in one batch and account their size
+        with self.tracer.span("history.flush"):
+            session = self.sessions.get(session_id)
+            if isinstance(session.history, PersistentChatMessageHistory):
+                session.history.flush()
+            self.sessions.update_size(session)
+
+    async def _aend_turn(self, session_id: str):
+        with self.tracer.span("history.flush"):
+            session = self.sessions.get(session_id)
+            if isinstance(session.history, PersistentChatMessageHistory):
+                await asyncio.to_thread(session.history.flush)
+            self.sessions.update_size(session)
+
+    def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        return self.sessions.get(session_id).history
+
+    def _prepare_messages(
+        self, messages: List[BaseMessage], config: RunnableConfig
+    ) -> List[BaseMessage]:
+        # The system message is not stored, so menu changes reach running sessions
+        if messages and isinstance(messages[0], SystemMessage):
+            messages = messages[1:]
+        messages = [SystemMessage(self.system_message)] + messages
+
+        # Apply the history policy to the stored history plus the new input
+        session = self.sessions.get(config["configurable"]["session_id"])
+        with self.tracer.span("history.prepare") as span:
+            prompt, report = self.history_policy.apply(
+                messages, order_slip=session.order_slip, state=session.history_state
+            )
+            span.set("prompt_tokens", report.tokens_after)
+
+        # Measure how much of the prompt is byte-identical to the previous call
+        signature = message_signature(prompt)
+        report.prompt_bytes = sum(size for _, size in signature)
+        report.shared_prefix_bytes = shared_prefix_bytes(
+            session.history_state.get("prompt_signature", []), signature
+        )
+        session.history_state["prompt_signature"] = signature
+
+        session.history_report = report
+        return prompt
+
+    def get_history_report(self, session_id: str = None) -> HistoryReport:
+        """
+        Return the token report of the last model call of a session.
+        """
+        session = self.sessions.peek(session_id or self.session_id)
+        return session.history_report if session is not None else None
+
+    def get_order_slip(self, session_id: str = None):
+        """
+        Return the order slip of a session.
+        """
+        return self.set_order_slip_tool.get_order_slip(session_id or self.session_id)
+
+    def invoke(
+        self,
+        prompt: str = None,
+        messages: List[BaseMessage] = None,
+        session_id: str = None,
+    ) -> Iterator[BaseMessage]:
+        """
+        Invoke the model for one guest turn, yielding every model and tool message.
+
+        The model is called again with the tool results until it answers
+        without tool calls, within the limits of the turn policy. A turn that
+        reaches a limit ends with a best-effort answer.
+
+        Args:
+            prompt (str): The guest message.
+            messages (List[BaseMessage]): Messages to send instead of a prompt,
+                e.g. tool responses.
+            session_id (str): The session (table) of the conversation. Defaults
+                to a single shared session.
+        """
+        session_id = session_id or self.session_id
+        return self._run_steps(
+            self._turn_steps(prompt, messages, session_id, stream=False), session_id
+        )
+
+    def ainvoke(
+        self,
+        prompt: str = None,
+        messages: List[BaseMessage] = None,
+        session_id: str = None,
+    ) -> AsyncIterator[BaseMessage]:
+        """
+        Asynchronously invoke the model, yielding the same messages as ``invoke``.
+
+        Uses the async chat model and the async implementation of every tool,
+        so many guest conversations can share a single event loop.
+        """
+        session_id = session_id or self.session_id
+        return self._arun_steps(
+            self._turn_steps(prompt, messages, session_id, stream=False), session_id
+        )
+
+    def stream(
+        self,
+        prompt: str = None,
+        messages: List[BaseMessage] = None,
+        session_id: str = None,
+    ) -> Iterator[BaseMessage]:
+        """
+        Invoke the model for one guest turn, yielding text deltas as they arrive.
+
+        Yields an AIMessageChunk per model chunk, then the ToolMessages and the
+        chunks of the following model calls, in the same order as ``invoke``.
+        Every tool call starts on the tool executor as soon as its arguments
+        are complete, while the model is still streaming. The complete model
+        message is committed to the history once, when its stream ends. A
+        stream that is abandoned or fails before that leaves the history
+        unchanged, unless tool calls already started: they may have written,
+        e.g. the order slip, so their results are waited for and committed
+        with the calls and the text streamed so far. Results of a committed
+        model message are always committed too.
+
+        Args:
+            prompt (str): The guest message.
+            messages (List[BaseMessage]): Messages to send instead of a prompt,
+                e.g. tool responses.
+            session_id (str): The session (table) of the conversation. Defaults
+                to a single shared session.
+        """
+        session_id = session_id or self.session_id
+        return self._run_steps(
+            self._turn_steps(prompt, messages, session_id, stream=True), session_id
+        )
+
+    def astream(
+        self,
+        prompt: str = None,
+        messages: List[BaseMessage] = None,
+        session_id: str = None,
+    ) -> AsyncIterator[BaseMessage]:
+        """
+        Asynchronously stream the model, yielding the same messages as ``stream``.
+
+        Tool calls run as tasks on the event loop, each started as soon as its
+        arguments are complete.
+        """
+        session_id = session_id or self.session_id
+        return self._arun_steps(
+            self._turn_steps(prompt, messages, session_id, stream=True), session_id
+        )
+
+    def _turn_steps(
+        self, prompt: str, messages: List[BaseMessage], session_id: str, stream: bool
+    ) -> Generator[tuple, object, None]:
+        """
+        The logic of one turn, shared by the sync and the async entry points.
+
+        Yields steps for ``_run_steps`` or ``_arun_steps`` to carry out and
+        receives their results: ``("emit", message)`` hands a message to the
+        caller, ``("model", messages, final)`` calls the model,
+        ``("stream", messages)`` opens a model stream and ``("chunk", stream)``
+        reads its next chunk, None at the end. ``("start_tool", tool,
+        tool_call, timeout)`` starts a tool call and
+        ``("await_tool", tool_call, handle, deadline, timeout)`` returns its
+        ToolMessage or error. ``("end_turn",)`` persists the history.
+        No message is emitted while an exception unwinds the turn.
+        """
+        session = self.sessions.begin_turn(session_id)
+        try:
+            turn = self._start_turn(session)
+            cached = self._cached_answer(session_id, prompt, turn)
+            if cached is not None:
+                if stream:
+                    cached = AIMessageChunk(
+                        cached.content, response_metadata=cached.response_metadata
+                    )
+                yield ("emit", cached)
+                yield ("end_turn",)
+                return
+            input_messages = [HumanMessage(prompt)] if prompt else messages
+            history = session.history
+
+            with self.tracer.span("turn", session_id=session_id):
+                while True:
+                    stop_reason = self.turn_policy.limit_reached(turn)
+                    if stop_reason:
+                        response = yield from self._stop_steps(
+                            session_id, history, input_messages, turn, stop_reason
+                        )
+                        yield ("emit", AIMessageChunk(response.content) if stream else response)
+                        break
+
+                    iteration = turn.start_iteration()
+                    timeout = self._tool_timeout(turn)
+                    started = {}
+                    with self.tracer.span("llm", iteration=iteration.iteration) as span:
+                        response = yield from self._model_steps(
+                            history, input_messages, started, timeout, stream, iteration, span
+                        )
+                        iteration.model_finished(self._response_tokens(session_id, response))
+                        span.set("tokens", iteration.tokens)
+
+                    if not response.tool_calls:
+                        if not stream:
+                            yield ("emit", response)
+                        self.turn_policy.log_iteration(session_id, iteration)
+                        break
+
+                    input_messages = yield from self._tool_steps(
+                        history, response, started, timeout, None if stream else response
+                    )
+                    iteration.tools_finished(len(response.tool_calls))
+                    self.turn_policy.log_iteration(session_id, iteration)
+
+                self._remember_answer(session_id, prompt, turn)
+                yield ("end_turn",)
+        finally:
+            self.sessions.end_turn(session)
+
+    def _model_steps(
+        self,
+        history: BaseChatMessageHistory,
+        input_messages: List[BaseMessage],
+        started: Dict,
+        timeout: float,
+        stream: bool,
+        iteration,
+        span,
+    ) -> Generator[tuple, object, AIMessage]:
+        # The model message is committed with its input once it is complete
+        prompt = history.messages + input_messages
+        if not stream:
+            response = yield ("model", prompt, False)
+            return self._commit_stream(history, input_messages, response)
+
+        response = None
+        try:
+            chunks = yield ("stream", prompt)
+            while True:
+                chunk = yield ("chunk", chunks)
+                if chunk is None:
+                    break
+                if response is None:
+                    span.set("first_chunk", time.monotonic() - iteration.started_at)
+                response = chunk if response is None else response + chunk
+                yield ("emit", chunk)
+
+                for tool_call, tool in self._complete_tool_calls(response, started):
+                    handle = yield ("start_tool", tool, tool_call, timeout)
+                    started[tool_call["id"]] = (tool_call, handle)
+        except BaseException:
+            # Started tools may have written, commit their calls and results
+            if started:
+                running = list(started.values())
+                tool_responses = yield from self._await_tool_steps(
+                    running, time.monotonic() + timeout, timeout
+                )
+                self._commit_stream(
+                    history,
+                    input_messages,
+                    self._started_message(response, started),
+                    tool_responses,
+                )
+                yield ("end_turn",)
+            raise
+        return self._commit_stream(history, input_messages, response)
+
+    def _tool_steps(
+        self,
+        history: BaseChatMessageHistory,
+        response: AIMessage,
+        started: Dict,
+        timeout: float,
+        emit_first: AIMessage = None,
+    ) -> Generator[tuple, object, List[ToolMessage]]:
+        """
+        Run the tool calls of a committed model message in parallel.
+
+        Results are emitted in the order of the calls. A call that fails or
+        does not finish within ``timeout`` gets an error ToolMessage instead,
+        without holding back the other calls. A timed-out call cannot be
+        stopped and keeps its worker until it returns, so calls of tools that
+        write (see ``ToolRegistry.writes``) are always waited for: their
+        result is what the model must learn about. If the turn is abandoned,
+        the remaining results are still waited for and committed, so every
+        call of the model message is answered in the history.
+        """
+        # Calls whose arguments only completed with the stream start now
+        running = []
+        for tool_call, tool in self._match_tool_calls(response.tool_calls):
+            if tool_call["id"] not in started:
+                handle = yield ("start_tool", tool, tool_call, timeout)
+                started[tool_call["id"]] = (tool_call, handle)
+            running.append(started[tool_call["id"]])
+
+        deadline = time.monotonic() + timeout
+        tool_responses = []
+        try:
+            if emit_first is not None:
+                yield ("emit", emit_first)
+            for tool_call, handle in running:
+                outcome = yield ("await_tool", tool_call, handle, deadline, timeout)
+                tool_responses.append(self._tool_outcome(tool_call, outcome))
+                yield ("emit", tool_responses[-1])
+        except BaseException:
+            tool_responses += yield from self._await_tool_steps(
+                running[len(tool_responses) :], deadline, timeout
+            )
+            history.add_messages(tool_responses)
+            yield ("end_turn",)
+            raise
+        return tool_responses
+
+    def _await_tool_steps(
+        self, running: List, deadline: float, timeout: float
+    ) -> Generator[tuple, object, List[ToolMessage]]:
+        tool_responses = []
+        for tool_call, handle in running:
+            outcome = yield ("await_tool", tool_call, handle, deadline, timeout)
+            tool_responses.append(self._tool_outcome(tool_call, outcome))
+        return tool_responses
+
+    def _stop_steps(
+        self,
+        session_id: str,
+        history: BaseChatMessageHistory,
+        input_messages: List[BaseMessage],
+        turn: TurnReport,
+        stop_reason: str,
+    ) -> Generator[tuple, object, AIMessage]:
+        """
+        End a turn that reached a limit with a best-effort answer.
+
+        Before the deadline, the model is called once more without tools to
+        answer from the tool results it has. The answer is committed to the
+        history together with the pending tool results.
+        """
+        turn.stop_reason = stop_reason
+        if stop_reason == "deadline":
+            response = AIMessage(DEADLINE_ANSWER)
+        else:
+            iteration = turn.start_iteration()
+            iteration.final = True
+            with self.tracer.span("llm", iteration=iteration.iteration, final=True) as span:
+                response = yield ("model", history.messages + input_messages, True)
+                iteration.model_finished(self._response_tokens(session_id, response))
+                span.set("tokens", iteration.tokens)
+            self.turn_policy.log_iteration(session_id, iteration)
+            response = self._final_answer(response)
+        history.add_messages(list(input_messages) + [response])
+        self.logger.warning(f"Turn of {session_id} stopped early: {stop_reason}")
+        return response
+
+    def _run_steps(self, steps: Generator, session_id: str) -> Iterator[BaseMessage]:
+        # Carries out the steps of a turn with blocking calls, tools run on the executor
+        value, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration:
+                return
+            except _TurnClosed as e:
+                raise e.closed from None
+            value, error = None, None
+            try:
+                if step[0] == "emit":
+                    yield step[1]
+                else:
+                    value = self._run_step(step, session_id)
+            except GeneratorExit as e:
+                # Thrown in as is, it would close the turn without its cleanup steps
+                error = _TurnClosed(e)
+            except BaseException as e:
+                error = e
+
+    def _run_step(self, step: tuple, session_id: str):
+        kind = step[0]
+        config = {"configurable": {"session_id": session_id}}
+        if kind == "model":
+            _, messages, final = step
+            return (self.final_chain if final else self.chain).invoke(messages, config=config)
+        if kind == "stream":
+            return iter(self.chain.stream(step[1], config=config))
+        if kind == "chunk":
+            return next(step[1], None)
+        if kind == "start_tool":
+            _, tool, tool_call, _ = step
+            return self._submit_tool(self.get_tool_executor(), tool, tool_call, config)
+        if kind == "await_tool":
+            _, tool_call, future, deadline, timeout = step
+            try:
+                if self.tool_registry.writes(tool_call["name"]):
+                    return future.result()
+                return future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                # Only stops calls that have not started yet
+                future.cancel()
+                return self._tool_timeout_error(timeout)
+            except Exception as e:
+                return e
+        if kind == "end_turn":
+            return self._end_turn(session_id)
+        raise ValueError(f"Unknown turn step: {kind}")
+
+    async def _arun_steps(self, steps: Generator, session_id: str) -> AsyncIterator[BaseMessage]:
+        # Carries out the steps of a turn on the event loop, tools run as tasks
+        value, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration:
+                return
+            except _TurnClosed as e:
+                raise e.closed from None
+            value, error = None, None
+            try:
+                if step[0] == "emit":
+                    yield step[1]
+                else:
+                    value = await self._arun_step(step, session_id)
+            except GeneratorExit as e:
+                error = _TurnClosed(e)
+            except BaseException as e:
+                error = e
+
+    async def _arun_step(self, step: tuple, session_id: str):
+        kind = step[0]
+        config = {"configurable": {"session_id": session_id}}
+        if kind == "model":
+            _, messages, final = step
+            return await (self.final_chain if final else self.chain).ainvoke(
+                messages, config=config
+            )
+        if kind == "stream":
+            return aiter(self.chain.astream(step[1], config=config))
+        if kind == "chunk":
+            return await anext(step[1], None)
+        if kind == "start_tool":
+            _, tool, tool_call, timeout = step
+            return asyncio.ensure_future(self._arun_tool_call(tool, tool_call, config, timeout))
+        if kind == "await_tool":
+            _, tool_call, task, _, timeout = step
+            try:
+                # Shielded, so a cancelled turn does not cancel a write
+                return await asyncio.shield(task)
+            except asyncio.TimeoutError:
+                return self._tool_timeout_error(timeout)
+            except Exception as e:
+                return e
+        if kind == "end_turn":
+            return await self._aend_turn(session_id)
+        raise ValueError(f"Unknown turn step: {kind}")
+
+    def get_turn_report(self, session_id: str = None) -> TurnReport:
+        """
+        Return the iterations, timings and stop reason of the last turn of a session.
+        """
+        session = self.sessions.peek(session_id or self.session_id)
+        return session.turn_report if session is not None else None
+
+    def _start_turn(self, session: Session) -> TurnReport:
+        turn = TurnReport()
+        session.turn_report = turn
+        return turn
+
+    def _cached_answer(self, session_id: str, prompt: str, turn: TurnReport) -> AIMessage:
+        """
+        Answer a guest question from the response cache and commit the
+        question and answer to the history. Returns None on a miss.
+        """
+        if self.response_cache is None or not prompt:
+            return None
+        with self.tracer.span("response_cache") as span:
+            answer = self.response_cache.get(prompt, self.menu_version)
+            span.set("hit", answer is not None)
+        if answer is None:
+            return None
+
+        turn.stop_reason = "response_cache"
+        response = AIMessage(answer, response_metadata={"response_cache": True})
+        self.get_session_history(session_id).add_messages([HumanMessage(prompt), response])
+        return response
+
+    def _remember_answer(self, session_id: str, prompt: str, turn: TurnReport):
+        # Only complete answers that read nothing but menu and restaurant tables are reused
+        if self.response_cache is None or not prompt or turn.stop_reason is not None:
+            return
+        if self.response_cache.words(prompt) is None:
+            return
+
+        messages = self.get_session_history(session_id).messages
+        start = next(
+            (
+                position
+                for position in range(len(messages) - 1, -1, -1)
+                if isinstance(messages[position], HumanMessage)
+            ),
+            None,
+        )
+        if start is None or start == len(messages) - 1:
+            return
+        for message in messages[start + 1 :]:
+            if isinstance(message, ToolMessage) and message.status == "error":
+                return
+            for tool_call in getattr(message, "tool_calls", None) or []:
+                if not self._reads_menu_only(tool_call):
+                    return
+
+        answer = messages[-1]
+        if isinstance(answer, AIMessage) and isinstance(answer.content, str):
+            self.response_cache.put(prompt, answer.content, self.menu_version)
+
+    def _reads_menu_only(self, tool_call: ToolCall) -> bool:
+        if tool_call["name"] == "MenuLookupTool":
+            return True
+        if tool_call["name"] == "SQLQueryTool":
+            return self.query_cache.key(tool_call["args"].get("query", "")) is not None
+        return False
+
+    def get_response_cache_stats(self):
+        """
+        Return the hit and miss counters of the response cache, None without one.
+        """
+        return self.response_cache.stats() if self.response_cache is not None else None
+
+    def _tool_timeout(self, turn: TurnReport) -> float:
+        # Tool calls never run past the deadline of the turn
+        remaining = self.turn_policy.remaining(turn)
+        return self.tool_timeout if remaining is None else min(self.tool_timeout, remaining)
+
+    def _response_tokens(self, session_id: str, response: AIMessage) -> int:
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            return usage["total_tokens"]
+        # Without usage data, estimate the prompt from the history report
+        report = self.sessions.get(session_id).history_report
+        prompt_tokens = report.tokens_after if report is not None else 0
+        return prompt_tokens + approximate_token_count([response])
+
+    def _final_answer(self, response: BaseMessage) -> AIMessage:
+        # Tool calls of the last call are never run, so they are not stored
+        content = response.content if response.content else LIMIT_ANSWER
+        return AIMessage(
+            content,
+            response_metadata=response.response_metadata,
+            usage_metadata=getattr(response, "usage_metadata", None),
+        )
+
+    @classmethod
+    def _after_fork(cls):
+        # The pool threads of the parent do not exist in a forked child
+        cls._tool_executor_lock = threading.Lock()
+        cls._tool_executor = None
+
+    @classmethod
+    def get_tool_executor(cls) -> ThreadPoolExecutor:
+        """
+        Return the thread pool tool calls run on, sized by OPENWAITERAI_TOOL_WORKERS.
+        """
+        with cls._tool_executor_lock:
+            if cls._tool_executor is None:
+                cls._tool_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("OPENWAITERAI_TOOL_WORKERS", "8")),
+                    thread_name_prefix="openwaiterai-tool",
+                )
+        return cls._tool_executor
+
+    def _match_tool_calls(self, tool_calls: List[ToolCall]) -> List:
+        # The tool of every call, or the error of a call that is rejected without running
+        matched = []
+        for tool_call in tool_calls:
+            try:
+                matched.append((tool_call, self.tool_registry.resolve(tool_call)))
+            except ToolCallError as e:
+                matched.append((tool_call, e))
+        return matched
+
+    def _commit_stream(
+        self,
+        history: BaseChatMessageHistory,
+        input_messages: List[BaseMessage],
+        response: Union[AIMessageChunk, AIMessage],
+        tool_responses: List[ToolMessage] = (),
+    ) -> AIMessage:
+        # Store the input and the merged response of one model call
+        if response is None:
+            response = AIMessage("")
+        elif isinstance(response, AIMessageChunk):
+            response = message_chunk_to_message(response)
+        history.add_messages(list(input_messages) + [response] + list(tool_responses))
+        return response
+
+    def _started_message(self, response: AIMessageChunk, started: Dict) -> AIMessage:
+        # The text streamed so far with the calls that started, others never ran
+        return AIMessage(
+            response.content if response is not None else "",
+            tool_calls=[tool_call for tool_call, _ in started.values()],
+        )
+
+    def _complete_tool_calls(self, response: AIMessageChunk, started: Dict) -> List:
+        # A streamed tool call is complete once its arguments parse as a JSON object
+        complete = []
+        for chunk in response.tool_call_chunks:
+            if not chunk.get("id") or not chunk.get("name") or chunk["id"] in started:
+                continue
+            try:
+                args = json.loads(chunk.get("args") or "")
+            except ValueError:
+                continue
+            if isinstance(args, dict):
+                complete.append(
+                    create_tool_call(name=chunk["name"], args=args, id=chunk["id"])
+                )
+        return self._match_tool_calls(complete)
+
+    def _submit_tool(
+        self,
+        executor: ThreadPoolExecutor,
+        tool: Union[BaseTool, ToolCallError],
+        tool_call: ToolCall,
+        config,
+    ) -> Future:
+        if isinstance(tool, ToolCallError):
+            # Rejected calls are answered without waiting for a worker
+            future = Future()
+            future.set_result(self.tool_registry.reject(tool_call, tool))
+            return future
+
+        # The tool thread runs in a copy of the context, so its spans join the turn
+        return executor.submit(
+            contextvars.copy_context().run, self._invoke_tool, tool, tool_call, config
+        )
+
+    def _invoke_tool(self, tool, tool_call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        with self.tracer.span(f"tool.{tool.name}"):
+            return self.tool_registry.invoke(tool, tool_call, config)
+
+    async def _arun_tool_call(
+        self, tool, tool_call: ToolCall, config: RunnableConfig, timeout: float = None
+    ):
+        if isinstance(tool, ToolCallError):
+            return self.tool_registry.reject(tool_call, tool)
+        timeout = self.tool_timeout if timeout is None else timeout
+        with self.tracer.span(f"tool.{tool.name}"):
+            call = self.tool_registry.ainvoke(tool, tool_call, config)
+            # Cancelling does not stop a tool running in a thread, see _tool_steps
+            if self.tool_registry.writes(tool.name):
+                return await call
+            return await asyncio.wait_for(call, timeout)
+
+    def _tool_outcome(self, tool_call: ToolCall, outcome) -> ToolMessage:
+        if isinstance(outcome, BaseException):
+            return self._tool_error_message(tool_call, outcome)
+        return outcome
+
+    def _tool_timeout_error(self, timeout: float) -> TimeoutError:
+        # The call may still finish, so the model must not assume it had no effect
+        return TimeoutError(
+            f"Tool call timed out after {timeout:g} seconds. It may still complete, "
+            "check the current state before calling it again."
+        )
+
+    def _tool_error_message(self, tool_call: ToolCall, error: BaseException) -> ToolMessage:
+        if self.debug:
+            self.logger.error(f"Tool {tool_call['name']} failed: {error}")
+        return ToolMessage(
+            content=f"Error: {error}",
+            tool_call_id=tool_call["id"],
+            name=tool_call["name"],
+            status="error",
+        )
+
+
+# Forked server workers run tool calls on their own pool
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=OpenWaiterAI._after_fork)
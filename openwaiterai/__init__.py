@@ -1,3 +1,14 @@
-from .OpenWaiterAI import OpenWaiterAI
-
 __all__ = ["OpenWaiterAI"]
+
+
+def __getattr__(name):
+    # LangChain is only imported once OpenWaiterAI is used, so the lightweight
+    # modules (snapshots, caches, tracing) import fast
+    if name == "OpenWaiterAI":
+        # The class lives in Waiter, a module named like the class would be
+        # bound over it on import
+        from .Waiter import OpenWaiterAI
+
+        globals()[name] = OpenWaiterAI
+        return OpenWaiterAI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
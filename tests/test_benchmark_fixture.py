@@ -0,0 +1,53 @@
+import os
+import sys
+
+from langchain_core.messages import ToolMessage
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from benchmarks.common import DINNER_SCRIPT, ScriptedChatModel, create_seeded_engine
+from benchmarks.bench_turns import QueryCounter, compare
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+
+
+def test_scripted_dinner_runs_every_tool_against_the_schema():
+    engine = create_seeded_engine()
+    counter = QueryCounter(engine)
+    waiter = OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=engine,
+        model=ScriptedChatModel(latency=0),
+    )
+
+    tool_messages = []
+    for turn in DINNER_SCRIPT:
+        messages = list(waiter.invoke(turn.prompt, session_id="table-1"))
+        tool_messages += [message for message in messages if isinstance(message, ToolMessage)]
+        assert messages[-1].content == turn.answer
+
+    assert {message.name for message in tool_messages} == {
+        "MenuLookupTool",
+        "SQLQueryTool",
+        "SetOrderSlipTool",
+    }
+    assert all(message.status == "success" for message in tool_messages)
+    assert "behind the building" in " ".join(message.content for message in tool_messages)
+    assert [item.id for item in waiter.get_order_slip("table-1")] == [3, 1, 5]
+    assert counter.count > 0
+
+
+def test_compare_reports_regressions_beyond_tolerance():
+    baseline = [{"sessions": 10, "turns_per_sec": 100.0, "p95_ms": 200.0}]
+    results = [{"sessions": 10, "turns_per_sec": 70.0, "p95_ms": 210.0}]
+
+    regressions = compare(results, baseline, tolerance=0.2)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("turns_per_sec at 10 sessions")
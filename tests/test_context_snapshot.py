@@ -0,0 +1,107 @@
+import os
+import sys
+import subprocess
+
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+
+# Dynamically add the project root directory to sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.ContextCache import ContextCache, RestaurantContext
+from openwaiterai.ContextSnapshot import load_snapshot, save_snapshot
+from benchmarks.common import FakeChatModel, create_seeded_engine
+from benchmarks.bench_turns import QueryCounter
+
+SYSTEM_INSTRUCTIONS = os.path.join(ROOT, "system_instructions.txt")
+
+
+@pytest.fixture(autouse=True)
+def fresh_context_caches(monkeypatch):
+    # Every in-memory SQLite engine has the same URL and would share one cache
+    monkeypatch.setattr(ContextCache, "_shared", {})
+
+
+def create_waiter(engine, context_snapshot=None):
+    return OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=engine,
+        model=FakeChatModel(latency=0),
+        context_snapshot=context_snapshot,
+    )
+
+
+def test_snapshot_round_trip_and_corruption(tmp_path):
+    path = str(tmp_path / "context.snapshot")
+    context = RestaurantContext({"restaurant": "Trattoria ☕", "menu": "- [1] Pizza: 1=Margherita"}, 3)
+
+    save_snapshot(context, path)
+    loaded = load_snapshot(path)
+
+    assert loaded.sections == context.sections
+    assert loaded.fingerprint == context.fingerprint
+
+    with open(path, "r+b") as file:
+        file.seek(-3, os.SEEK_END)
+        file.write(b"xyz")
+    with pytest.raises(ValueError):
+        load_snapshot(path)
+
+
+def test_snapshot_startup_runs_no_queries(tmp_path):
+    path = str(tmp_path / "context.snapshot")
+    create_waiter(create_seeded_engine()).save_context_snapshot(path)
+    ContextCache._shared.clear()
+
+    engine = create_seeded_engine()
+    counter = QueryCounter(engine)
+    waiter = create_waiter(engine, context_snapshot=path)
+
+    assert counter.count == 0
+    assert "Caesar Salad" in waiter.system_message
+
+
+def test_missing_snapshot_builds_context_from_database(tmp_path):
+    engine = create_seeded_engine()
+    counter = QueryCounter(engine)
+
+    waiter = create_waiter(engine, context_snapshot=str(tmp_path / "missing.snapshot"))
+
+    assert counter.count == 2
+    assert "Caesar Salad" in waiter.system_message
+
+
+def test_failed_rebuild_keeps_previous_context():
+    engine = create_seeded_engine()
+    waiter = create_waiter(engine)
+    cache = waiter.context_cache
+    context = cache.get()
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE menuitems")
+    with pytest.raises(SQLAlchemyError):
+        cache.refresh()
+
+    assert cache.get() is context
+    assert cache.version == 1
+    assert "Caesar Salad" in waiter.system_message
+
+
+def test_package_import_defers_langchain():
+    code = "import sys, openwaiterai; print(sorted(m for m in ('langchain_core', 'openai') if m in sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+
+    assert output.strip() == "[]"
+
+
+def test_package_attribute_stays_the_class():
+    import openwaiterai
+    import openwaiterai.Waiter
+
+    assert openwaiterai.OpenWaiterAI is openwaiterai.Waiter.OpenWaiterAI
+    assert isinstance(openwaiterai.OpenWaiterAI, type)
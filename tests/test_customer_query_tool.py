@@ -0,0 +1,240 @@
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.Tools import CustomerQueryTool
+from openwaiterai.Tools.AnswerDispatcher import AnswerDispatcher, NOTIFY_CHANNEL
+from openwaiterai.Tools.QuestionCoalescer import QuestionCoalescer
+from benchmarks.bench_turns import QueryCounter
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append(sql)
+        if "pg_trigger" in sql:
+            self.row = (1,) if self.connection.trigger_installed else None
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeListenConnection:
+    """
+    In-process stand-in for a psycopg2 connection in LISTEN mode.
+    """
+
+    def __init__(self, trigger_installed: bool = True):
+        self.autocommit = False
+        self.notifies = []
+        self.executed = []
+        self.trigger_installed = trigger_installed
+        self._read_fd, self._write_fd = os.pipe()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def fileno(self):
+        return self._read_fd
+
+    def poll(self):
+        os.read(self._read_fd, 1024)
+
+    def notify(self, payload: str):
+        self.notifies.append(SimpleNamespace(channel=NOTIFY_CHANNEL, payload=payload))
+        os.write(self._write_fd, b"!")
+
+    def close(self):
+        for fd in (self._read_fd, self._write_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE CustomerManagementQueries ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "question_text TEXT NOT NULL, "
+                "answer_text TEXT)"
+            )
+        )
+    monkeypatch.setenv("OPENWAITERAI_QUERY_TIMEOUT", "5")
+    return engine
+
+
+def answer_later(engine, delay, answer, on_answered=None):
+    def run():
+        time.sleep(delay)
+        with engine.begin() as connection:
+            connection.execute(
+                text("UPDATE CustomerManagementQueries SET answer_text = :answer"),
+                {"answer": answer},
+            )
+        if on_answered is not None:
+            on_answered()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_polling_fallback_returns_answer(engine, monkeypatch):
+    monkeypatch.setenv("OPENWAITERAI_POLL_INTERVAL", "0.05")
+    tool = CustomerQueryTool(engine=engine)
+    assert tool.dispatcher is None
+
+    answer_later(engine, 0.2, "The terrace opens at 6pm.")
+    assert tool.invoke("Is the terrace open?") == "The terrace opens at 6pm."
+
+
+def test_polling_fallback_times_out(engine, monkeypatch):
+    monkeypatch.setenv("OPENWAITERAI_POLL_INTERVAL", "0.05")
+    monkeypatch.setenv("OPENWAITERAI_QUERY_TIMEOUT", "0")
+    tool = CustomerQueryTool(engine=engine)
+
+    with pytest.raises(TimeoutError):
+        tool.invoke("Can we get a high chair?")
+
+
+def test_notification_wakes_waiter(engine, monkeypatch):
+    # Polling alone would not see the answer before the timeout
+    monkeypatch.setenv("OPENWAITERAI_POLL_INTERVAL", "30")
+    connection = FakeListenConnection()
+    dispatcher = AnswerDispatcher(lambda: connection, poll_timeout=0.05)
+    assert dispatcher.start()
+    assert 'LISTEN "customer_query_answered";' in connection.executed
+
+    tool = CustomerQueryTool(engine=engine, dispatcher=dispatcher)
+    answer_later(
+        engine, 0.2, "Yes, dogs are welcome.", on_answered=lambda: connection.notify("1")
+    )
+
+    start_time = time.monotonic()
+    assert tool.invoke("Is the patio dog-friendly?") == "Yes, dogs are welcome."
+    assert time.monotonic() - start_time < 2
+    dispatcher.close()
+
+
+def test_dispatcher_requires_trigger(engine):
+    connection = FakeListenConnection(trigger_installed=False)
+    dispatcher = AnswerDispatcher(lambda: connection)
+
+    assert not dispatcher.start()
+    assert not dispatcher.available
+    assert dispatcher.register("1").result(timeout=0) is False
+
+
+def test_closing_dispatcher_releases_waiters(engine):
+    connection = FakeListenConnection()
+    dispatcher = AnswerDispatcher(lambda: connection, poll_timeout=0.05)
+    assert dispatcher.start()
+
+    future = dispatcher.register("42")
+    dispatcher.close()
+    assert future.result(timeout=1) is False
+    assert not dispatcher.available
+
+
+def ask_concurrently(tool, questions):
+    results = [None] * len(questions)
+
+    def run(index):
+        results[index] = tool.invoke(questions[index])
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(questions))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_identical_questions_share_one_row_and_answer(engine):
+    coalescer = QuestionCoalescer(engine, batch_window=0.05, interval=0.05)
+    tool = CustomerQueryTool(engine=engine, coalescer=coalescer)
+
+    threads, results = ask_concurrently(
+        tool, ["Is the terrace open?", "is the  terrace open", "Is the terrace open?!"]
+    )
+    answer_later(engine, 0.2, "The terrace opens at 6pm.")
+    for thread in threads:
+        thread.join()
+
+    assert results == ["The terrace opens at 6pm."] * 3
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT question_text FROM CustomerManagementQueries"))
+        assert len(rows.all()) == 1
+    assert coalescer.stats()["coalesced"] == 2
+    coalescer.close()
+
+
+def test_questions_are_inserted_and_polled_in_batches(engine):
+    coalescer = QuestionCoalescer(engine, batch_window=0.1, interval=0.05)
+    tool = CustomerQueryTool(engine=engine, coalescer=coalescer)
+    counter = QueryCounter(engine)
+    questions = ["Is there parking?", "Can we bring a cake?", "Is there wifi?"]
+
+    threads, results = ask_concurrently(tool, questions)
+    time.sleep(0.3)
+    answer_later(engine, 0, "Yes.")
+    for thread in threads:
+        thread.join()
+
+    assert results == ["Yes."] * 3
+    stats = coalescer.stats()
+    assert stats["questions"] == 3
+    assert stats["inserts"] == 1
+    # One INSERT and one SELECT per tick however many guests wait, plus the answer
+    assert counter.count == stats["inserts"] + stats["polls"] + 1
+    coalescer.close()
+
+
+def test_abandoned_question_is_still_submitted(engine):
+    coalescer = QuestionCoalescer(engine, batch_window=0.05, interval=0.05)
+
+    with pytest.raises(TimeoutError):
+        coalescer.ask("Can we get a high chair?", timeout=0)
+    time.sleep(0.2)
+
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT question_text FROM CustomerManagementQueries"))
+        assert rows.scalars().all() == ["Can we get a high chair?"]
+    assert coalescer.stats()["pending"] == 0
+    coalescer.close()
+
+
+def test_polling_backs_off_without_notifications(engine):
+    coalescer = QuestionCoalescer(engine, batch_window=0, interval=0.05, max_interval=0.2)
+
+    with pytest.raises(TimeoutError):
+        coalescer.ask("Is the kitchen still open?", timeout=1)
+
+    # 0.05, 0.1, 0.2, 0.2, ... instead of 20 fetches at a fixed interval
+    assert 4 <= coalescer.stats()["polls"] <= 8
+    coalescer.close()
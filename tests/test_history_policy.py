@@ -0,0 +1,117 @@
+import os
+import sys
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.HistoryPolicy import HistoryPolicy
+from openwaiterai.OrderSlip import OrderSlip, SlipLine
+
+
+def make_turn(index, tool_content="", set_slip=False):
+    call_id = f"call_{index}"
+    tool_name = "SetOrderSlipTool" if set_slip else "SQLQueryTool"
+    return [
+        HumanMessage(f"Question {index}"),
+        AIMessage(
+            "",
+            tool_calls=[{"name": tool_name, "args": {}, "id": call_id, "type": "tool_call"}],
+        ),
+        ToolMessage(tool_content or f"Result {index}", tool_call_id=call_id, name=tool_name),
+        AIMessage(f"Answer {index}"),
+    ]
+
+
+def test_window_keeps_system_message_and_whole_turns():
+    policy = HistoryPolicy(token_budget=0, window=8, tool_message_chars=1000)
+    messages = [SystemMessage("You are a waiter.")]
+    for index in range(5):
+        messages += make_turn(index)
+
+    prompt, report = policy.apply(messages)
+
+    assert prompt[0].content == "You are a waiter."
+    assert isinstance(prompt[1], HumanMessage)
+    assert [m.content for m in prompt if isinstance(m, HumanMessage)] == [
+        "Question 3",
+        "Question 4",
+    ]
+    assert report.messages_before == 21
+    assert report.messages_after == 9
+    assert report.tokens_saved > 0
+
+
+def test_old_tool_messages_are_truncated():
+    policy = HistoryPolicy(token_budget=0, window=0, tool_message_chars=10, keep_tool_turns=1)
+    messages = [SystemMessage("You are a waiter.")]
+    messages += make_turn(0, tool_content="x" * 500)
+    messages += make_turn(1, tool_content="y" * 500)
+
+    prompt, report = policy.apply(messages)
+
+    tool_messages = [m for m in prompt if isinstance(m, ToolMessage)]
+    assert tool_messages[0].content.startswith("x" * 10 + "...")
+    assert tool_messages[1].content == "y" * 500
+    assert report.compacted_tool_messages == 1
+    # The stored history is not modified
+    assert messages[3].content == "x" * 500
+
+
+def test_order_slip_is_pinned_when_out_of_window():
+    policy = HistoryPolicy(token_budget=0, window=4)
+    messages = [SystemMessage("You are a waiter.")]
+    messages += make_turn(0, set_slip=True)
+    messages += make_turn(1)
+
+    order_slip = OrderSlip([SlipLine(3, "House Burger", 2)])
+    prompt, _ = policy.apply(messages, order_slip=order_slip)
+
+    # Pinned right before the current turn
+    assert prompt[1].content == "Current order slip: 2 x House Burger (id 3)"
+    assert prompt[2].content == "Question 1"
+
+
+def test_summary_replaces_dropped_turns():
+    class Summarizer:
+        calls = 0
+
+        def invoke(self, messages):
+            Summarizer.calls += 1
+            return AIMessage("The guests are vegetarian.")
+
+    policy = HistoryPolicy(token_budget=0, window=4, summarizer=Summarizer(), summary_chunk=4)
+    state = {}
+    messages = [SystemMessage("You are a waiter.")]
+    for index in range(3):
+        messages += make_turn(index)
+
+    prompt, report = policy.apply(messages, state=state)
+    policy.apply(messages, state=state)
+
+    assert prompt[1].content == "Summary of the earlier conversation: The guests are vegetarian."
+    assert report.summarized_messages == 8
+    # The summary is reused until enough new messages are dropped
+    assert Summarizer.calls == 1
+
+
+def test_order_slip_is_pinned_unless_shown_in_window():
+    policy = HistoryPolicy(token_budget=0, window=8)
+    messages = [SystemMessage("You are a waiter.")]
+    messages += make_turn(0, tool_content='{"changes": ["+2 x House Burger (id 3)"]}', set_slip=True)
+    messages += make_turn(1, tool_content='{"changes": ["+1 x Lemonade (id 1)"]}', set_slip=True)
+    messages += [HumanMessage("Question 2")]
+    order_slip = OrderSlip(
+        [SlipLine(3, "House Burger", 2, "no onions"), SlipLine(1, "Lemonade", 1)]
+    )
+
+    # The kept call only shows the Lemonade, the burger must stay visible
+    prompt, _ = policy.apply(messages, order_slip=order_slip)
+    assert prompt[-2].content == (
+        "Current order slip: 2 x House Burger (id 3) [no onions]; 1 x Lemonade (id 1)"
+    )
+
+    shown = make_turn(2, tool_content='{"changes": [], "order_slip": "..."}', set_slip=True)
+    prompt, _ = policy.apply(messages[:-1] + shown, order_slip=order_slip)
+    assert not any(message.content.startswith("Current order slip") for message in prompt)
@@ -0,0 +1,103 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.MenuIndex import MenuIndex
+from openwaiterai.Tools import MenuLookupTool
+
+MENU_SQL = [
+    "CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT, description TEXT)",
+    "CREATE TABLE menuitems (id INTEGER PRIMARY KEY, category_id INTEGER, name TEXT, description TEXT)",
+    "CREATE TABLE allergens (id INTEGER PRIMARY KEY, name TEXT)",
+    "CREATE TABLE ingredients (id INTEGER PRIMARY KEY, name TEXT)",
+    "CREATE TABLE menuitemallergens (menu_item_id INTEGER, allergen_id INTEGER)",
+    "CREATE TABLE menuitemingredients (menu_item_id INTEGER, ingredient_id INTEGER)",
+    "CREATE TABLE nutritionalvalues (id INTEGER PRIMARY KEY, menu_item_id INTEGER, "
+    "calories NUMERIC, protein NUMERIC, carbohydrates NUMERIC, fats NUMERIC, "
+    "saturated_fats NUMERIC, sugar NUMERIC, salt NUMERIC, fiber NUMERIC)",
+    "INSERT INTO categories VALUES (1, 'Starters', ''), (2, 'Mains', '')",
+    "INSERT INTO menuitems VALUES (1, 1, 'Tomato Soup', ''), (2, 2, 'House Burger', ''), "
+    "(3, 2, 'Mushroom Risotto', ''), (4, 2, 'Grilled Salmon', '')",
+    "INSERT INTO allergens VALUES (1, 'Gluten'), (2, 'Milk'), (3, 'Fish')",
+    "INSERT INTO ingredients VALUES (1, 'Tomato'), (2, 'Beef'), (3, 'Mushroom'), "
+    "(4, 'Parmesan cheese'), (5, 'Salmon'), (6, 'Cheddar cheese')",
+    "INSERT INTO menuitemallergens VALUES (2, 1), (2, 2), (3, 2), (4, 3)",
+    "INSERT INTO menuitemingredients VALUES (1, 1), (2, 2), (2, 6), (3, 3), (3, 4), (4, 5)",
+    "INSERT INTO nutritionalvalues (id, menu_item_id, calories, protein) VALUES "
+    "(1, 1, 180, 4), (2, 2, 850, 40), (3, 3, 620, 14), (4, 4, 520, 38)",
+]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    with engine.begin() as connection:
+        for statement in MENU_SQL:
+            connection.execute(text(statement))
+    return engine
+
+
+def names(index, positions):
+    return [index.names[position] for position in positions]
+
+
+def test_search_combines_allergen_and_nutrient_filters(engine):
+    index = MenuIndex.from_engine(engine)
+    masks, _, unknown = index.allergens.resolve(["gluten", "MILK"])
+
+    positions = index.search(exclude_allergens=masks[0] | masks[1], max_nutrients={"calories": 600})
+
+    assert unknown == []
+    assert names(index, positions) == ["Tomato Soup", "Grilled Salmon"]
+
+
+def test_partial_ingredient_names_match_any_entry(engine):
+    index = MenuIndex.from_engine(engine)
+    masks, matched, _ = index.ingredients.resolve(["cheese"])
+
+    assert sorted(matched) == ["Cheddar cheese", "Parmesan cheese"]
+    assert names(index, index.search(include_ingredients=masks)) == [
+        "House Burger",
+        "Mushroom Risotto",
+    ]
+
+
+def test_describe_item_by_name(engine):
+    index = MenuIndex.from_engine(engine)
+    description = index.describe(index.find_item("house burger"))
+
+    assert description["allergens"] == ["Gluten", "Milk"]
+    assert description["ingredients"] == ["Beef", "Cheddar cheese"]
+    assert description["nutrition"]["calories"] == 850
+
+
+def test_tool_refuses_unknown_allergens(engine):
+    tool = MenuLookupTool(engine=engine)
+
+    result = tool._run(exclude_allergens=["sesame"])
+
+    assert result.startswith("Unknown allergens: sesame")
+    assert "Gluten, Milk, Fish" in result
+
+
+def test_tool_rebuilds_index_when_menu_version_changes(engine):
+    version = [1]
+    tool = MenuLookupTool(engine=engine, menu_version=lambda: version[0])
+    assert "1 matching" in tool._run(category="Starters")
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO menuitems VALUES (5, 1, 'Bruschetta', '')"))
+    assert "1 matching" in tool._run(category="Starters")
+
+    version[0] = 2
+    assert "2 matching" in tool._run(category="Starters")
@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.OrderStore import OrderStore, create_order_tables
+from openwaiterai.Tools import SetOrderSlipTool
+from openwaiterai.Tools.SetOrderSlipTool import Order, OrderChange
+
+CONFIG = {"configurable": {"session_id": "table-7"}}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'orders.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE MenuItems (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(
+            text(
+                "CREATE TABLE Orders (id INTEGER PRIMARY KEY, "
+                "order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE OrderItems (id INTEGER PRIMARY KEY, order_id INTEGER, "
+                "menu_item_id INTEGER, quantity INTEGER NOT NULL CHECK (quantity > 0), notes TEXT)"
+            )
+        )
+        connection.execute(
+            text("INSERT INTO MenuItems VALUES (1, 'Lemonade'), (2, 'Burger'), (3, 'Steak')")
+        )
+    create_order_tables(engine)
+    return engine
+
+
+def slip(*lines):
+    return [
+        Order(id=menu_item_id, name=name, quantity=quantity, notes=notes)
+        for menu_item_id, name, quantity, notes in lines
+    ]
+
+
+def order_items(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT order_id, menu_item_id, quantity, notes FROM OrderItems ORDER BY menu_item_id")
+        ).all()
+
+
+def count_writes(engine):
+    writes = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            writes.append(statement)
+
+    return writes
+
+
+def test_save_writes_only_changed_lines(engine):
+    store = OrderStore(engine)
+    stored, diff = store.save(
+        "table-7", slip((1, "Lemonade", 2, None), (2, "Burger", 1, None), (3, "Steak", 1, "rare"))
+    )
+    assert len(diff.inserted) == 3
+
+    writes = count_writes(engine)
+    stored, diff = store.save(
+        "table-7",
+        slip((1, "Lemonade", 3, None), (3, "Steak", 1, "rare")),
+        known=stored,
+    )
+
+    assert (list(diff.updated), diff.deleted, diff.inserted) == ([1], [2], {})
+    # One line updated, one deleted and the slip checksum updated
+    assert len(writes) == 3
+    assert order_items(engine) == [
+        (stored.order_id, 1, 3, None),
+        (stored.order_id, 3, 1, "rare"),
+    ]
+
+
+def test_retried_save_is_idempotent(engine):
+    order_slip = slip((1, "Lemonade", 2, None))
+    stored, _ = OrderStore(engine).save("table-7", order_slip)
+
+    # Another worker without the stored order in memory retries the same call
+    retried, diff = OrderStore(engine).save("table-7", order_slip)
+
+    assert len(diff) == 0
+    assert retried.order_id == stored.order_id
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM Orders")).scalar() == 1
+    assert len(order_items(engine)) == 1
+
+
+def test_duplicate_and_removed_items_are_merged(engine):
+    store = OrderStore(engine)
+    stored, _ = store.save(
+        "table-7", slip((1, "Lemonade", 1, None), (1, "Lemonade", 1, None), (2, "Burger", 0, None))
+    )
+
+    assert stored.lines == {1: (2, None)}
+    assert len(order_items(engine)) == 1
+
+
+def test_tool_restores_slip_after_restart(engine):
+    tool = SetOrderSlipTool(order_store=OrderStore(engine))
+    tool._run(slip((2, "Burger", 2, "no onions")), CONFIG)
+
+    restarted = SetOrderSlipTool(order_store=OrderStore(engine))
+
+    assert restarted.get_order_slip("table-7") == slip((2, "Burger", 2, "no onions"))
+    assert restarted.get_order_slip("table-8") == []
+
+
+def change(op, menu_item_id, **fields):
+    return OrderChange(op=op, id=menu_item_id, **fields)
+
+
+def test_changes_return_only_the_delta(engine):
+    tool = SetOrderSlipTool(order_store=OrderStore(engine))
+    tool._run(slip((1, "Lemonade", 1, None), (2, "Burger", 1, None)), CONFIG)
+
+    result = json.loads(
+        tool._run(
+            config=CONFIG,
+            changes=[
+                change("add", 1),
+                change("update", 2, notes="no onions"),
+                change("add", 3, name="Steak", notes="medium-rare"),
+            ],
+        )
+    )
+
+    assert result["changes"] == [
+        "1->2 x Lemonade (id 1)",
+        "1 x Burger (id 2) [no onions]",
+        "+1 x Steak (id 3) [medium-rare]",
+    ]
+    assert result["items"] == 4
+    assert "order_slip" not in result
+    assert order_items(engine) == [(1, 1, 2, None), (1, 2, 1, "no onions"), (1, 3, 1, "medium-rare")]
+
+    shown = json.loads(tool._run(config=CONFIG, changes=[change("remove", 1, quantity=2)], show=True))
+    assert shown["changes"] == ["-2 x Lemonade (id 1)"]
+    assert shown["order_slip"] == "1 x Burger (id 2) [no onions]; 1 x Steak (id 3) [medium-rare]"
+
+
+def test_rejected_changes_leave_the_slip_unchanged(engine):
+    tool = SetOrderSlipTool(order_store=OrderStore(engine))
+    checksum = json.loads(tool._run(slip((1, "Lemonade", 1, None)), CONFIG))["checksum"]
+
+    unknown = json.loads(
+        tool._run(config=CONFIG, changes=[change("add", 2, name="Burger"), change("remove", 3)])
+    )
+    assert unknown["error"] == "invalid_change"
+    assert "1 x Lemonade (id 1)" in unknown["hint"]
+
+    applied = json.loads(tool._run(config=CONFIG, changes=[change("add", 1)], checksum=checksum))
+    retried = json.loads(tool._run(config=CONFIG, changes=[change("add", 1)], checksum=checksum))
+    assert retried["error"] == "stale_checksum"
+    assert applied["checksum"] in retried["message"]
+    assert tool.get_order_slip("table-7") == slip((1, "Lemonade", 2, None))
+
+
+def test_changes_apply_to_the_stored_slip_after_restart(engine):
+    SetOrderSlipTool(order_store=OrderStore(engine))._run(slip((2, "Burger", 1, None)), CONFIG)
+
+    restarted = SetOrderSlipTool(order_store=OrderStore(engine))
+    restarted._run(config=CONFIG, changes=[change("add", 1, name="Lemonade")])
+
+    assert restarted.get_order_slip("table-7") == slip((2, "Burger", 1, None), (1, "Lemonade", 1, None))
+
+
+def test_duplicate_rows_are_collapsed(engine):
+    stored, _ = OrderStore(engine).save("table-7", slip((1, "Lemonade", 1, None)))
+    with engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO OrderItems (order_id, menu_item_id, quantity) VALUES (:order_id, 1, 2)"),
+            {"order_id": stored.order_id},
+        )
+
+    OrderStore(engine).save("table-7", slip((1, "Lemonade", 3, None), (2, "Burger", 1, None)))
+
+    assert order_items(engine) == [(stored.order_id, 1, 3, None), (stored.order_id, 2, 1, None)]
+
+
+def test_unknown_menu_item_is_not_retried(engine):
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TRIGGER menu_item_exists BEFORE INSERT ON OrderItems "
+                "WHEN NEW.menu_item_id NOT IN (SELECT id FROM MenuItems) "
+                "BEGIN SELECT RAISE(ABORT, 'FOREIGN KEY constraint failed'); END"
+            )
+        )
+    tool = SetOrderSlipTool(order_store=OrderStore(engine))
+    writes = count_writes(engine)
+
+    result = json.loads(tool._run(slip((9, "Pizza", 1, None)), CONFIG))
+
+    assert result["error"] == "invalid_change"
+    assert len([write for write in writes if "INTO Orders " in write]) == 1
+    assert tool.get_order_slip("table-7") == []
+
+
+def test_expired_order_is_left_to_the_earlier_guests(engine):
+    tool = SetOrderSlipTool(order_store=OrderStore(engine, ttl=3600))
+    tool._run(slip((2, "Burger", 2, None)), CONFIG)
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE orderslips SET updated_at = '2000-01-01 00:00:00'"))
+
+    restarted = SetOrderSlipTool(order_store=OrderStore(engine, ttl=3600))
+    assert restarted.get_order_slip("table-7") == []
+
+    restarted._run(config=CONFIG, changes=[change("add", 1, name="Lemonade")])
+
+    assert restarted.get_order_slip("table-7") == slip((1, "Lemonade", 1, None))
+    assert order_items(engine) == [(2, 1, 1, None), (1, 2, 2, None)]
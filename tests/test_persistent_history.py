@@ -0,0 +1,88 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.PersistentChatMessageHistory import (
+    PersistentChatMessageHistory,
+    chat_messages_table,
+    create_history_table,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    create_history_table(engine)
+    return engine
+
+
+def count_rows(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(chat_messages_table)
+        ).scalar()
+
+
+def test_messages_are_written_in_one_batch_on_flush(engine):
+    history = PersistentChatMessageHistory("table-1", engine)
+    history.add_message(SystemMessage("You are a waiter."))
+    history.add_messages([HumanMessage("Two lemonades"), AIMessage("Coming up!")])
+
+    assert count_rows(engine) == 0
+    assert history.pending == 2
+
+    history.flush()
+    assert count_rows(engine) == 2
+    assert history.pending == 0
+
+
+def test_history_resumes_lazily_on_another_worker(engine):
+    history = PersistentChatMessageHistory("table-1", engine)
+    history.add_messages([HumanMessage("Two lemonades"), AIMessage("Coming up!")])
+    history.flush()
+
+    resumed = PersistentChatMessageHistory("table-1", engine)
+    resumed.add_message(SystemMessage("You are a waiter."))
+    resumed.add_message(HumanMessage("And a burger"))
+
+    assert [message.content for message in resumed.messages] == [
+        "You are a waiter.",
+        "Two lemonades",
+        "Coming up!",
+        "And a burger",
+    ]
+
+    # Only the new message is written, the loaded ones are not duplicated
+    resumed.flush()
+    assert count_rows(engine) == 3
+
+
+def test_sessions_are_isolated_and_clearable(engine):
+    first = PersistentChatMessageHistory("table-1", engine)
+    first.add_message(HumanMessage("Hello"))
+    first.flush()
+
+    second = PersistentChatMessageHistory("table-2", engine)
+    assert second.messages == []
+
+    first.clear()
+    assert PersistentChatMessageHistory("table-1", engine).messages == []
+
+
+def test_flush_before_first_read_keeps_stored_messages_once(engine):
+    history = PersistentChatMessageHistory("table-1", engine)
+    history.add_messages([HumanMessage("a")])
+    history.flush()
+
+    resumed = PersistentChatMessageHistory("table-1", engine)
+    resumed.add_messages([AIMessage("b")])
+    resumed.flush()
+
+    assert [message.content for message in resumed.messages] == ["a", "b"]
+    assert count_rows(engine) == 2
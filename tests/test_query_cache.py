@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.ContextCache import MENU_TABLES
+from openwaiterai.Database.QueryCache import QueryCache
+from openwaiterai.Database.SQLNormalizer import normalize_sql, referenced_tables
+from openwaiterai.Tools import SQLQueryTool
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE menuitems (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("CREATE TABLE waitercalls (id INTEGER PRIMARY KEY, reason TEXT)"))
+        connection.execute(text("INSERT INTO menuitems VALUES (1, 'Burger'), (2, 'Salad')"))
+    return engine
+
+
+def test_normalized_sql_ignores_whitespace_case_and_literal_order():
+    assert normalize_sql("SELECT name\n  FROM MenuItems WHERE id IN (2, 1);") == normalize_sql(
+        "select name from menuitems where id in (1,2)"
+    )
+    assert normalize_sql("SELECT 'Nuts'") != normalize_sql("SELECT 'nuts'")
+
+
+def test_referenced_tables_sees_every_from_item():
+    assert referenced_tables(
+        "SELECT * FROM menuitems m JOIN menuitemallergens a ON a.menu_item_id = m.id, orders o"
+    ) == {"menuitems", "menuitemallergens", "orders"}
+    assert referenced_tables(
+        "WITH vegan AS (SELECT * FROM menuitems) SELECT * FROM vegan"
+    ) == {"menuitems"}
+
+
+def test_only_read_only_menu_queries_are_cached():
+    cache = QueryCache(MENU_TABLES, max_entries=10, ttl=60)
+
+    assert cache.key("SELECT * FROM menuitems") is not None
+    assert cache.key("SELECT * FROM waitercalls") is None
+    assert cache.key("SELECT * FROM menuitems WHERE id IN (SELECT menu_item_id FROM orderitems)") is None
+    assert cache.key("INSERT INTO menuitems VALUES (3, 'Soup')") is None
+    assert cache.key("SELECT now() FROM menuitems") is None
+
+
+def test_tool_serves_repeated_queries_from_cache(engine):
+    cache = QueryCache(MENU_TABLES, max_entries=10, ttl=60)
+    tool = SQLQueryTool(engine=engine, query_cache=cache)
+
+    first = tool._run("SELECT name FROM menuitems WHERE id IN (1, 2)")
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE menuitems SET name = 'Veggie Burger' WHERE id = 1"))
+    second = tool._run("select name  from MENUITEMS where id in (2, 1);")
+
+    assert first == second
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_menu_version_change_invalidates_cache(engine):
+    cache = QueryCache(MENU_TABLES, max_entries=10, ttl=60)
+    tool = SQLQueryTool(engine=engine, query_cache=cache)
+    version = [1]
+    tool.menu_version = lambda: version[0]
+
+    tool._run("SELECT name FROM menuitems WHERE id = 1")
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE menuitems SET name = 'Veggie Burger' WHERE id = 1"))
+    version[0] = 2
+
+    assert "Veggie Burger" in tool._run("SELECT name FROM menuitems WHERE id = 1")
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_non_menu_queries_bypass_cache(engine):
+    cache = QueryCache(MENU_TABLES, max_entries=10, ttl=60)
+    tool = SQLQueryTool(engine=engine, query_cache=cache)
+
+    tool._run("SELECT * FROM waitercalls")
+    tool._run("SELECT * FROM waitercalls")
+
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["bypasses"] == 2
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+
+from langchain_core.messages import AIMessageChunk
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.ResponseCache import ResponseCache
+from benchmarks.common import DINNER_SCRIPT, ScriptedChatModel, ScriptedTurn, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+PARKING = ScriptedTurn(
+    "Is there parking?",
+    [
+        [
+            (
+                "SQLQueryTool",
+                {"query": "SELECT description FROM restaurantinfo WHERE category = 'parking'"},
+            )
+        ]
+    ],
+    "Yes, there is free parking behind the building.",
+)
+
+
+class CountingChatModel(ScriptedChatModel):
+    calls: int = 0
+
+    def _respond(self, messages):
+        self.calls += 1
+        return super()._respond(messages)
+
+
+def create_waiter(model):
+    return OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=model,
+        response_cache=ResponseCache(max_entries=8, ttl=60),
+    )
+
+
+def test_paraphrases_match_but_other_dishes_and_allergens_do_not():
+    cache = ResponseCache(max_entries=8, ttl=60)
+    cache.put("What are your opening hours?", "Every day from 12:00 to 23:00.", version=1)
+    cache.put("Does the Caesar Salad contain egg?", "Yes, it does.", version=1)
+
+    assert cache.get("Hi! What are the opening hours, please?", version=1)
+    assert cache.get("does the caesar salad contain eggs", version=1) == "Yes, it does."
+    assert cache.get("Does the Caesar Salad contain milk?", version=1) is None
+    assert cache.get("When are you open?", version=1) is None
+
+
+def test_order_and_follow_up_questions_are_never_cached():
+    cache = ResponseCache(max_entries=8, ttl=60)
+
+    for question in ("Can I order the House Burger?", "Is it spicy?", "I'd like a soup, please."):
+        cache.put(question, "Sure.", version=1)
+        assert cache.get(question, version=1) is None
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_menu_version_ttl_and_size_bound_entries():
+    cache = ResponseCache(max_entries=2, ttl=0.05)
+    cache.put("Is there parking?", "Yes.", version=1)
+
+    assert cache.get("Is there parking?", version=2) is None
+    assert cache.stats()["invalidations"] == 1
+
+    cache.put("Is there parking?", "Yes.", version=2)
+    time.sleep(0.06)
+    assert cache.get("Is there parking?", version=2) is None
+
+    for question in ("Is there parking?", "Is there wifi?", "Are dogs allowed?"):
+        cache.put(question, "Yes.", version=2)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_repeated_question_skips_the_model_in_another_session():
+    model = CountingChatModel(latency=0, script=[PARKING])
+    waiter = create_waiter(model)
+
+    list(waiter.invoke("Is there parking?", session_id="table-1"))
+    calls = model.calls
+    messages = list(waiter.stream("Do you have parking?", session_id="table-2"))
+
+    assert model.calls == calls
+    assert messages == [AIMessageChunk(PARKING.answer, response_metadata={"response_cache": True})]
+    assert waiter.get_turn_report("table-2").stop_reason == "response_cache"
+    history = waiter.get_session_history("table-2").messages
+    assert [message.type for message in history] == ["human", "ai"]
+    assert waiter.get_response_cache_stats()["hits"] == 1
+
+
+def test_answers_of_turns_that_change_the_order_are_not_stored():
+    sneaky = ScriptedTurn("Is the House Burger good?", DINNER_SCRIPT[3].tool_rounds, "It is!")
+    mains = DINNER_SCRIPT[2]
+    model = CountingChatModel(latency=0, script=[sneaky, mains])
+    waiter = create_waiter(model)
+
+    list(waiter.invoke(sneaky.prompt, session_id="table-1"))
+    list(waiter.invoke(mains.prompt, session_id="table-1"))
+
+    stats = waiter.get_response_cache_stats()
+    assert stats["misses"] == 2
+    assert stats["stores"] == 1
+    assert waiter.response_cache.get(sneaky.prompt) is None
+    assert waiter.response_cache.get(mains.prompt) == mains.answer
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+# Dynamically add the project root directory to sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from openwaiterai.Server import WaiterServer, route_session
+from benchmarks.common import FakeChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(ROOT, "system_instructions.txt")
+
+
+def create_factory(latency=0.0):
+    def factory():
+        from openwaiterai import OpenWaiterAI
+
+        return OpenWaiterAI(
+            model_name="fake",
+            system_instructions=SYSTEM_INSTRUCTIONS,
+            engine=create_seeded_engine(),
+            model=FakeChatModel(latency=latency),
+        )
+
+    return factory
+
+
+@pytest.fixture
+def serve(tmp_path):
+    servers = []
+
+    def serve(**kwargs):
+        server = WaiterServer(
+            port=0, context_snapshot=str(tmp_path / "context.snapshot"), request_timeout=30, **kwargs
+        )
+        server.start()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.close()
+
+
+def request(server, path, payload=None):
+    host, port = server.address
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}{path}", data=data, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_sessions_stay_on_their_worker(serve, tmp_path):
+    server = serve(factory=create_factory(), workers=2)
+
+    answers = [
+        request(server, f"/v1/sessions/{session_id}/messages", {"message": "Hello"})
+        for session_id in ["table-1", "table-2", "table-1", "table-2"]
+    ]
+
+    assert [status for status, _ in answers] == [200] * 4
+    assert answers[0][1]["answer"]
+    assert answers[0][1]["worker"] == answers[2][1]["worker"]
+    assert answers[1][1]["worker"] == answers[3][1]["worker"]
+    pids = [worker["pid"] for worker in server.health()["workers"]]
+    assert answers[0][1]["worker"] == pids[route_session("table-1", 2)]
+    assert os.path.exists(tmp_path / "context.snapshot")
+
+    assert request(server, "/v1/sessions/table-1/messages", {"text": "Hello"})[0] == 400
+    assert request(server, "/v1/sessions/table%201/messages", {"message": "Hello"})[0] == 404
+
+
+def test_full_queue_is_rejected_with_503(serve):
+    server = serve(factory=create_factory(latency=0.5), workers=1, queue_depth=1)
+    results = []
+
+    def send():
+        results.append(request(server, "/v1/sessions/table-1/messages", {"message": "Hello"})[0])
+
+    threads = [threading.Thread(target=send) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [200, 503, 503]
+    assert server.health()["rejected"] == 2
+
+
+def test_exited_worker_is_replaced(serve):
+    server = serve(factory=create_factory(), workers=1)
+    pid = server.health()["workers"][0]["pid"]
+
+    os.kill(pid, signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while server.health()["workers"][0]["restarts"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    status, answer = request(server, "/v1/sessions/table-1/messages", {"message": "Hello"})
+    assert status == 200
+    assert answer["worker"] != pid
+    assert server.health()["status"] == "ok"
@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.SessionManager import SessionManager
+
+
+def test_session_with_turn_in_flight_is_not_evicted():
+    flushed = []
+
+    class FlushingHistory(InMemoryChatMessageHistory):
+        def flush(self):
+            # Other tables must be able to take the manager lock while flushing
+            locked = []
+
+            def lock():
+                locked.append(manager._lock.acquire(blocking=False))
+                if locked[0]:
+                    manager._lock.release()
+
+            thread = threading.Thread(target=lock)
+            thread.start()
+            thread.join()
+            assert locked == [True]
+            flushed.append(self)
+
+    manager = SessionManager(
+        history_factory=lambda session_id: FlushingHistory(),
+        max_sessions=1,
+        ttl=3600,
+        memory_budget=1024,
+    )
+
+    busy = manager.begin_turn("table-1")
+    manager.get("table-2")
+    assert manager.peek("table-1") is busy
+    assert flushed == []
+
+    manager.end_turn(busy)
+    assert manager.peek("table-1") is None
+    assert flushed == [busy.history]
+    assert manager.stats()["evictions"] == 1
+
+
+def test_expired_sessions_wait_for_the_busy_one_before_them():
+    manager = SessionManager(max_sessions=10, ttl=0, memory_budget=1024)
+    busy = manager.begin_turn("table-1")
+    idle = manager.get("table-2")
+    idle.last_access -= 1
+    busy.last_access -= 1
+
+    # Eviction walks from the least recently used session and stops at a busy one
+    manager.get("table-3")
+    assert manager.peek("table-1") is busy
+    assert manager.peek("table-2") is idle
+
+    manager.end_turn(busy)
+    manager.get("table-3")
+    assert manager.peek("table-1") is None
+    assert manager.peek("table-2") is None
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai.ContextCache import MENU_TABLES
+from openwaiterai.Database import execute_query
+from openwaiterai.Database.QueryCache import QueryCache
+from openwaiterai.Database.SQLGuard import SQLGuard, SQLGuardError
+from openwaiterai.Tools import SQLQueryTool
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE menuitems (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, order_date TEXT)"))
+        connection.execute(text("CREATE TABLE waitercalls (id INTEGER PRIMARY KEY, reason TEXT)"))
+        for index in range(1, 301):
+            connection.execute(
+                text("INSERT INTO menuitems VALUES (:id, :name)"),
+                {"id": index, "name": f"Dish {index}"},
+            )
+    return engine
+
+
+@pytest.fixture
+def guard():
+    return SQLGuard(max_rows=100, timeout_ms=200, writable_tables=["orders", "orderitems", "waitercalls"])
+
+
+@pytest.mark.parametrize(
+    "sql, code",
+    [
+        ("DROP TABLE menuitems", "statement_not_allowed"),
+        ("delete from orders", "statement_not_allowed"),
+        ("UPDATE menuitems SET name = 'x'", "statement_not_allowed"),
+        ("TRUNCATE orders", "statement_not_allowed"),
+        ("ALTER TABLE menuitems ADD COLUMN x INT", "statement_not_allowed"),
+        ("GRANT ALL ON menuitems TO public", "statement_not_allowed"),
+        ("COPY menuitems TO '/tmp/menu.csv'", "statement_not_allowed"),
+        ("SET statement_timeout = 0", "statement_not_allowed"),
+        ("SELECT 1; DROP TABLE menuitems", "multiple_statements"),
+        ("SELECT 1 -- harmless\n; DELETE FROM orders", "multiple_statements"),
+        ("WITH gone AS (DELETE FROM orders RETURNING *) SELECT * FROM gone", "write_not_allowed"),
+        ("SELECT * INTO backup FROM menuitems", "write_not_allowed"),
+        ("SELECT * FROM orders FOR UPDATE", "write_not_allowed"),
+        ("SELECT pg_sleep(100)", "function_not_allowed"),
+        ("SELECT pg_read_file('/etc/passwd')", "function_not_allowed"),
+        ("SELECT set_config('statement_timeout', '0', false)", "function_not_allowed"),
+        ("INSERT INTO menuitems VALUES (999, 'Free lunch')", "write_not_allowed"),
+        (
+            "INSERT INTO orders (id) VALUES (1) ON CONFLICT (id) DO UPDATE SET order_date = NULL",
+            "write_not_allowed",
+        ),
+        ("SELECT 'unterminated", "parse_error"),
+        ("  ;  ", "empty_query"),
+    ],
+)
+def test_rejects_writes_ddl_and_unsafe_shapes(guard, sql, code):
+    with pytest.raises(SQLGuardError) as error:
+        guard.check(sql)
+    assert error.value.code == code
+
+
+def test_injects_limit_when_missing(guard):
+    statement = guard.check("SELECT * FROM menuitems;")
+    assert statement.limit_injected
+    assert statement.sql == "SELECT * FROM menuitems\nLIMIT 101"
+
+    # A LIMIT in a subquery or a string does not bound the outer query
+    assert guard.check(
+        "SELECT * FROM menuitems WHERE id IN (SELECT id FROM menuitems LIMIT 5)"
+    ).limit_injected
+    assert guard.check("SELECT 'no limit' FROM menuitems -- LIMIT 5").sql.endswith("\nLIMIT 101")
+
+    assert not guard.check("SELECT * FROM menuitems LIMIT 5").limit_injected
+
+
+def test_allows_order_and_waiter_call_inserts(guard, engine):
+    result = guard.execute(
+        engine, "INSERT INTO WaiterCalls (reason) VALUES ('Needs cutlery; urgent')"
+    )
+    assert result.rowcount == 1
+
+
+def test_caps_result_rows(guard, engine):
+    result = guard.execute(engine, "SELECT * FROM menuitems")
+    assert len(result) == 100
+    assert result.truncated
+
+
+def test_runaway_query_hits_statement_timeout(guard, engine):
+    runaway = (
+        "WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM counter) "
+        "SELECT count(*) FROM counter"
+    )
+    with pytest.raises(SQLGuardError) as error:
+        guard.execute(engine, runaway)
+    assert error.value.code == "statement_timeout"
+
+    # The connection is usable again afterwards
+    assert guard.execute(engine, "SELECT count(*) FROM menuitems").scalar() == 300
+
+
+def test_cross_join_hits_statement_timeout(guard, engine):
+    with pytest.raises(SQLGuardError) as error:
+        guard.execute(
+            engine,
+            "SELECT count(*) FROM menuitems a, menuitems b, menuitems c, menuitems d",
+        )
+    assert error.value.code == "statement_timeout"
+
+
+def test_reads_run_in_read_only_transaction(engine):
+    with pytest.raises(Exception):
+        execute_query(engine, "INSERT INTO orders (order_date) VALUES ('now')", read_only=True)
+    assert execute_query(engine, "SELECT count(*) FROM orders").scalar() == 0
+
+
+def test_tool_returns_structured_errors(engine, guard):
+    tool = SQLQueryTool(
+        engine=engine, guard=guard, query_cache=QueryCache(MENU_TABLES, max_entries=0)
+    )
+
+    error = json.loads(tool._run("DROP TABLE menuitems"))
+    assert error["error"] == "statement_not_allowed"
+    assert "hint" in error
+
+    error = json.loads(tool._run("SELECT missing FROM menuitems"))
+    assert error["error"] == "database_error"
+    assert "missing" in error["message"]
+
+    assert "showing the first 100 rows" in tool._run("SELECT * FROM menuitems")
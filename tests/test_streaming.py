@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.OrderStore import OrderDiff
+from benchmarks.common import FakeChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+
+
+class TalkativeChatModel(FakeChatModel):
+    """
+    Calls SetOrderSlipTool and keeps talking while the tool runs.
+    """
+
+    def _respond(self, messages):
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage("Your House Burger is on the order slip.")
+        return AIMessage(
+            "One House Burger coming up, let me put that on your order slip right away.",
+            tool_calls=[
+                {
+                    "name": "SetOrderSlipTool",
+                    "args": {"order_slip": [{"id": 3, "name": "House Burger", "quantity": 1}]},
+                    "id": f"call_{uuid.uuid4().hex}",
+                    "type": "tool_call",
+                }
+            ],
+        )
+
+
+class RecordingOrderStore:
+    def __init__(self):
+        self.saved_at = []
+
+    def save(self, session_id, order_slip, known=None):
+        self.saved_at.append(time.monotonic())
+        return None, OrderDiff()
+
+
+def create_waiter(model, order_store=None):
+    return OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=model,
+        order_store=order_store or RecordingOrderStore(),
+    )
+
+
+def text_of(messages):
+    return "".join(
+        message.content
+        for message in messages
+        if isinstance(message, AIMessageChunk) and isinstance(message.content, str)
+    )
+
+
+def test_stream_yields_deltas_and_commits_history_once():
+    waiter = create_waiter(FakeChatModel(latency=0))
+
+    messages = list(waiter.stream("I'd like the House Burger, please.", session_id="table-1"))
+
+    chunks = [message for message in messages if isinstance(message, AIMessageChunk)]
+    assert len(chunks) > 2
+    assert text_of(messages) == "Your House Burger is on the order slip."
+    assert [type(message) for message in messages if not isinstance(message, AIMessageChunk)] == [
+        ToolMessage
+    ]
+
+    history = waiter.get_session_history("table-1").messages
+    assert [message.type for message in history] == ["human", "ai", "tool", "ai"]
+    assert history[1].tool_calls[0]["name"] == "SetOrderSlipTool"
+    assert history[3].content == "Your House Burger is on the order slip."
+
+
+def test_tool_starts_before_stream_ends():
+    order_store = RecordingOrderStore()
+    waiter = create_waiter(TalkativeChatModel(latency=0, token_latency=0.02), order_store)
+
+    last_chunk_at = None
+    for message in waiter.stream("I'd like the House Burger, please."):
+        if isinstance(message, ToolMessage):
+            break
+        last_chunk_at = time.monotonic()
+
+    assert len(order_store.saved_at) == 1
+    assert order_store.saved_at[0] < last_chunk_at
+
+
+def test_astream_matches_stream():
+    waiter = create_waiter(TalkativeChatModel(latency=0))
+
+    async def collect():
+        return [message async for message in waiter.astream("A burger, please.", session_id="t")]
+
+    messages = asyncio.run(collect())
+
+    assert text_of(messages).endswith("Your House Burger is on the order slip.")
+    assert sum(isinstance(message, ToolMessage) for message in messages) == 1
+    assert len(waiter.get_session_history("t").messages) == 4
+
+
+def test_abandoned_stream_commits_started_tool_calls():
+    order_store = RecordingOrderStore()
+    waiter = create_waiter(TalkativeChatModel(latency=0, token_latency=0.02), order_store)
+
+    stream = waiter.stream("I'd like the House Burger, please.", session_id="table-1")
+    for message in stream:
+        if order_store.saved_at:
+            break
+    stream.close()
+
+    history = waiter.get_session_history("table-1").messages
+    assert [message.type for message in history] == ["human", "ai", "tool"]
+    assert history[1].tool_calls[0]["id"] == history[2].tool_call_id
+    assert "One House Burger".startswith(history[1].content)
+
+
+def test_abandoned_astream_commits_started_tool_calls():
+    order_store = RecordingOrderStore()
+    waiter = create_waiter(TalkativeChatModel(latency=0, token_latency=0.02), order_store)
+
+    async def abandon():
+        stream = waiter.astream("I'd like the House Burger, please.", session_id="table-1")
+        async for message in stream:
+            if order_store.saved_at:
+                break
+        await stream.aclose()
+
+    asyncio.run(abandon())
+
+    history = waiter.get_session_history("table-1").messages
+    assert [message.type for message in history] == ["human", "ai", "tool"]
+    assert history[1].tool_calls[0]["id"] == history[2].tool_call_id
@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import time
+import asyncio
+
+import pytest
+from langchain.tools import BaseTool
+from langchain_core.messages import ToolMessage
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.Tools import SQLQueryTool, ToolRegistry
+from benchmarks.common import ScriptedChatModel, ScriptedTurn, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+BAD_CALLS = ScriptedTurn(
+    "Two burgers, please.",
+    [
+        [
+            ("KitchenTool", {"dish": "House Burger"}),
+            ("SetOrderSlipTool", {"order_slip": "two burgers"}),
+            ("MenuLookupTool", {"item": "House Burger"}),
+        ]
+    ],
+    "Which burger would you like?",
+)
+
+
+class WaitTimeTool(BaseTool):
+    name: str = "WaitTimeTool"
+    description: str = "Returns the current kitchen wait time in minutes."
+
+    def _run(self, dish: str) -> str:
+        return f"{dish}: 15 minutes"
+
+
+class SlowTool(BaseTool):
+    name: str = "SlowTool"
+    description: str = "Takes a while."
+
+    def _run(self, dish: str) -> str:
+        time.sleep(0.3)
+        return f"{dish}: done"
+
+
+class SlowWriteTool(SlowTool):
+    name: str = "SlowWriteTool"
+    metadata: dict = {"writes": True}
+
+
+def create_waiter(script, tools=None, tool_timeout=None):
+    return OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=ScriptedChatModel(latency=0, script=script),
+        tools=tools,
+        tool_timeout=tool_timeout,
+    )
+
+
+def tool_messages(messages):
+    return [message for message in messages if isinstance(message, ToolMessage)]
+
+
+def test_unknown_and_invalid_calls_are_answered_with_errors():
+    waiter = create_waiter([BAD_CALLS])
+
+    messages = tool_messages(waiter.invoke(BAD_CALLS.prompt, session_id="table-1"))
+
+    assert [message.status for message in messages] == ["error", "error", "success"]
+    unknown, invalid = (json.loads(message.content) for message in messages[:2])
+    assert unknown["error"] == "unknown_tool"
+    assert "SetOrderSlipTool" in unknown["hint"]
+    assert invalid["error"] == "invalid_arguments"
+    assert "order_slip" in invalid["message"]
+    assert waiter.get_order_slip("table-1") == []
+
+    stats = waiter.get_tool_stats()
+    assert stats["SetOrderSlipTool"]["rejected"] == 1
+    assert stats["SetOrderSlipTool"]["calls"] == 0
+    assert stats["MenuLookupTool"]["calls"] == 1
+    assert waiter.tool_registry.unknown == 1
+
+
+def test_async_turns_answer_rejected_calls():
+    waiter = create_waiter([BAD_CALLS])
+
+    async def run():
+        return [message async for message in waiter.astream(BAD_CALLS.prompt, session_id="table-1")]
+
+    messages = tool_messages(asyncio.run(run()))
+
+    assert [message.status for message in messages] == ["error", "error", "success"]
+
+
+def test_third_party_tools_are_bound_and_tracked():
+    turn = ScriptedTurn(
+        "How long for the salmon?",
+        [[("WaitTimeTool", {"dish": "Grilled Salmon"})]],
+        "About 15 minutes.",
+    )
+    waiter = create_waiter([turn], tools=[WaitTimeTool()])
+
+    messages = tool_messages(waiter.invoke(turn.prompt, session_id="table-1"))
+
+    assert messages[0].content == "Grilled Salmon: 15 minutes"
+    assert "WaitTimeTool" in [tool.name for tool in waiter.tools]
+    assert waiter.get_tool_stats()["WaitTimeTool"]["calls"] == 1
+
+
+def test_registry_rejects_duplicate_names():
+    engine = create_seeded_engine()
+    registry = ToolRegistry([SQLQueryTool(engine=engine)])
+
+    with pytest.raises(ValueError):
+        registry.register(SQLQueryTool(engine=engine))
+
+    replacement = SQLQueryTool(engine=engine)
+    registry.register(replacement, replace=True)
+    assert registry.get("SQLQueryTool") is replacement
+    assert len(registry) == 1
+
+
+def test_timeout_abandons_reads_but_waits_for_writes():
+    turn = ScriptedTurn(
+        "Two soups, please.",
+        [[("SlowTool", {"dish": "Tomato Soup"}), ("SlowWriteTool", {"dish": "Tomato Soup"})]],
+        "Done.",
+    )
+    waiter = create_waiter([turn], tools=[SlowTool(), SlowWriteTool()], tool_timeout=0.1)
+
+    read, write = tool_messages(waiter.invoke(turn.prompt, session_id="table-1"))
+
+    assert read.status == "error"
+    assert "check the current state" in read.content
+    assert write.status == "success"
+    assert write.content == "Tomato Soup: done"
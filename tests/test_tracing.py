@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.Tracing import (
+    NOOP_SPAN,
+    Histogram,
+    InMemoryExporter,
+    JSONLinesExporter,
+    Tracer,
+    set_tracer,
+)
+from benchmarks.common import FakeChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemoryExporter()
+    previous = set_tracer(Tracer(exporter))
+    yield exporter
+    set_tracer(previous)
+
+
+def create_waiter():
+    return OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=FakeChatModel(latency=0),
+    )
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for millis in range(1, 101):
+        histogram.record(millis / 1000)
+
+    assert histogram.percentile(0.5) == pytest.approx(0.05, rel=0.2)
+    assert histogram.percentile(0.99) == pytest.approx(0.099, rel=0.2)
+    assert histogram.percentile(1.0) == 0.1
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+
+    with tracer.span("llm") as span:
+        span.set("tokens", 10)
+
+    assert span is NOOP_SPAN
+    assert tracer.stats() == {}
+
+
+def test_turn_records_nested_spans(exporter):
+    waiter = create_waiter()
+
+    list(waiter.invoke("I'd like the House Burger, please.", session_id="table-1"))
+
+    spans = exporter.spans()
+    turn = next(span for span in spans if span.name == "turn")
+    names = {span.name for span in exporter.spans(turn.trace_id)}
+    assert {"llm", "history.prepare", "history.flush", "tool.SetOrderSlipTool"} <= names
+    assert "db.order_save" in names
+
+    by_id = {span.span_id: span for span in spans}
+    tool = next(span for span in spans if span.name == "tool.SetOrderSlipTool")
+    assert tool.parent_id == turn.span_id
+    save = next(span for span in spans if span.name == "db.order_save")
+    assert by_id[save.parent_id] is tool
+
+    stats = waiter.get_trace_stats()
+    assert stats["llm"]["count"] == 2
+    assert stats["llm"]["tokens"] > 0
+    assert stats["turn"]["p99"] >= stats["llm"]["p50"]
+
+
+def test_async_turn_spans_join_trace(exporter):
+    waiter = create_waiter()
+
+    async def collect():
+        return [message async for message in waiter.astream("A burger, please.")]
+
+    asyncio.run(collect())
+
+    turn = next(span for span in exporter.spans() if span.name == "turn")
+    names = [span.name for span in exporter.spans(turn.trace_id)]
+    assert names.count("llm") == 2
+    assert "tool.SetOrderSlipTool" in names
+
+
+def test_jsonl_exporter_writes_spans(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(JSONLinesExporter(str(path)))
+
+    with tracer.span("db.query", rows=3):
+        with tracer.span("db.connect"):
+            pass
+    tracer.exporter.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["db.connect", "db.query"]
+    assert lines[0]["parent_id"] == lines[1]["span_id"]
+    assert lines[1]["attributes"] == {"rows": 3}
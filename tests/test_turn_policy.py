@@ -0,0 +1,112 @@
+import os
+import sys
+import uuid
+import asyncio
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+# Dynamically add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openwaiterai import OpenWaiterAI
+from openwaiterai.TurnPolicy import DEADLINE_ANSWER, TurnPolicy
+from benchmarks.common import FakeChatModel, create_seeded_engine
+
+SYSTEM_INSTRUCTIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "system_instructions.txt",
+)
+
+
+class LoopingChatModel(FakeChatModel):
+    """
+    Never stops calling tools.
+    """
+
+    calls: int = 0
+
+    def _respond(self, messages):
+        self.calls += 1
+        return AIMessage(
+            "Let me check the menu once more.",
+            tool_calls=[
+                {
+                    "name": "SQLQueryTool",
+                    "args": {"query": "SELECT name FROM menuitems"},
+                    "id": f"call_{uuid.uuid4().hex}",
+                    "type": "tool_call",
+                }
+            ],
+        )
+
+
+def create_waiter(model, turn_policy):
+    return OpenWaiterAI(
+        model_name="fake",
+        system_instructions=SYSTEM_INSTRUCTIONS,
+        engine=create_seeded_engine(),
+        model=model,
+        turn_policy=turn_policy,
+    )
+
+
+def assert_tool_calls_answered(history):
+    answered = {message.tool_call_id for message in history if isinstance(message, ToolMessage)}
+    for message in history:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            assert tool_call["id"] in answered
+
+
+def test_turn_without_limits_reports_iterations():
+    waiter = create_waiter(FakeChatModel(latency=0), TurnPolicy(max_tool_iterations=3))
+
+    list(waiter.invoke("A burger, please.", session_id="table-1"))
+
+    report = waiter.get_turn_report("table-1")
+    assert report.stop_reason is None
+    assert [iteration.tool_calls for iteration in report.iterations] == [1, 0]
+    assert all(iteration.model_seconds >= 0 for iteration in report.iterations)
+
+
+def test_max_tool_iterations_ends_with_answer_without_tools():
+    model = LoopingChatModel(latency=0)
+    waiter = create_waiter(model, TurnPolicy(max_tool_iterations=2, deadline=0, token_budget=0))
+
+    messages = list(waiter.invoke("What's on the menu?", session_id="table-1"))
+
+    report = waiter.get_turn_report("table-1")
+    assert report.stop_reason == "max_tool_iterations"
+    assert model.calls == 3
+    assert report.iterations[-1].final
+    assert isinstance(messages[-1], AIMessage) and not messages[-1].tool_calls
+    assert messages[-1].content == "Let me check the menu once more."
+
+    history = waiter.get_session_history("table-1").messages
+    assert history[-1].content == messages[-1].content
+    assert_tool_calls_answered(history)
+
+
+def test_deadline_ends_turn_without_another_model_call():
+    model = LoopingChatModel(latency=0.05)
+    waiter = create_waiter(model, TurnPolicy(max_tool_iterations=10, deadline=0.03))
+
+    messages = list(waiter.invoke("What's on the menu?"))
+
+    assert waiter.get_turn_report().stop_reason == "deadline"
+    assert model.calls == 1
+    assert messages[-1].content == DEADLINE_ANSWER
+    assert_tool_calls_answered(waiter.get_session_history(waiter.session_id).messages)
+
+
+def test_token_budget_stops_async_turn():
+    model = LoopingChatModel(latency=0)
+    waiter = create_waiter(model, TurnPolicy(max_tool_iterations=10, token_budget=1))
+
+    async def collect():
+        return [message async for message in waiter.ainvoke("What's on the menu?")]
+
+    messages = asyncio.run(collect())
+
+    assert waiter.get_turn_report().stop_reason == "token_budget"
+    assert model.calls == 2
+    assert not messages[-1].tool_calls